@@ -0,0 +1,8 @@
+echo off
+
+REM ### Point to the correct folder and script file
+SET "SolutionDir=E:\Code\IMERG_Accumulations_ETL\IMERG_Accumulations_Benchmark.py"
+
+REM ### Run the benchmark and compare against the stored baseline (add --save-baseline to create or replace the baseline)
+C:\Python27\ArcGIS10.4\python.exe "%SolutionDir%" -o "E:\Code\IMERG_Accumulations_ETL\Log\IMERG_Benchmark_Results.json"
+REM C:\Python27\ArcGIS10.4\python.exe "%SolutionDir%" --quick
@@ -0,0 +1,804 @@
+# -------------------------------------------------------------------------------
+# Name:        IMERG_Accumulations_Benchmark.py
+# Purpose:     Benchmark the stages of IMERG_Accumulations_ETL.py (listing/selection, download, transform, and load)
+#               with synthetic IMERG data - no NASA ftp site, proxy, or ArcGIS server needed. Synthetic IMERG named
+#               GeoTIFFs and monthly folder listings are generated into a scratch folder, served by local stand-in
+#               proxy (HTTP) and ftp servers, and loaded into a fake mosaic store. The timings are compared against a
+#               stored baseline so performance changes to the ETL can be measured.
+#
+# Author:               SERVIR GIT Team       2018
+# Last Modified By:
+# Copyright:   (c) SERVIR 2018
+#
+# Note: Requires numpy and GDAL (the same as the ETL's 'numpy' transform engine). The stand-in ftp server also needs
+#       pyftpdlib - without it the ftp download benchmark is skipped.
+# -------------------------------------------------------------------------------
+
+import argparse  # required for processing command line arguments
+import datetime
+import time
+import os
+import sys
+import shutil
+import tempfile
+import pickle
+import logging
+import json
+import sqlite3
+import threading  # required for running the stand-in servers
+import ftplib  # required for the ftp download benchmark
+
+import BaseHTTPServer  # required for the stand-in proxy server
+import SocketServer  # required for the stand-in proxy server
+
+# The ETL itself - importing it has no side effects, its config is only read by SetupBenchmarkWorkspace().
+import IMERG_Accumulations_ETL as etl
+
+try:
+    import numpy
+    from osgeo import gdal
+    from osgeo import osr
+except ImportError:
+    numpy = None
+    gdal = None
+    osr = None
+
+try:
+    # Only needed for the stand-in ftp server, the ftp download benchmark is skipped without it.
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+except ImportError:
+    ThreadedFTPServer = None
+
+# The benchmark reports through its own logger, so its results stand out from the ETL's logging (WARNING and above
+# unless a log level is passed in).
+benchLog = logging.getLogger("IMERG_Benchmark")
+
+
+# The sizes and concurrency levels each benchmark is run with. (--quick uses the smaller set.)
+BenchmarkSizes = {"full": {"listingDays": [31, 365, 3650],
+                           "downloadMB": [1, 8],
+                           "downloadConcurrency": [1, 3, 6],
+                           "rasterSizes": [(900, 450), (3600, 1800)],
+                           "transformProcesses": [1, 2, 4],
+                           "loadRasterSizes": [(3600, 1800)]},
+                  "quick": {"listingDays": [31, 365],
+                            "downloadMB": [1],
+                            "downloadConcurrency": [1, 3],
+                            "rasterSizes": [(360, 180)],
+                            "transformProcesses": [1, 2],
+                            "loadRasterSizes": [(360, 180)]}}
+
+BenchmarkNames = ["listing", "selection", "download", "transform", "load"]
+
+SyntheticHost = "benchmark.imerg"
+SyntheticBaseFolder = "/data/imerg/gis"
+
+
+def setupArgs():
+    # Setup the argparser to capture any arguments...
+    parser = argparse.ArgumentParser(__file__,
+                                     description="Benchmark the IMERG Accumulations ETL stages with synthetic data.")
+    parser.add_argument("-l", "--logging",
+                        help="the logging level at which the script should report",
+                        type=str, choices=['debug', 'DEBUG', 'info', 'INFO', 'warning', 'WARNING', 'error', 'ERROR'])
+    parser.add_argument("-b", "--bench",
+                        help="the benchmark(s) to run (default: all of them)",
+                        action="append", choices=BenchmarkNames)
+    parser.add_argument("--quick",
+                        help="use small sizes and fewer concurrency levels (a smoke test, not for baselines)",
+                        action="store_true")
+    parser.add_argument("-r", "--repeats",
+                        help="number of timed runs of each case, the median is reported (default 3)",
+                        type=int, default=3)
+    parser.add_argument("--link-mbps",
+                        help="bandwidth of each stand-in server connection in megabytes per second, so download "
+                             "concurrency behaves like a remote link (default 8, 0 for unlimited)",
+                        type=float, default=8.0)
+    parser.add_argument("--store",
+                        help="mosaic store used by the load benchmark: 'benchmark' (fake, default) or 'gdal'",
+                        type=str, choices=["benchmark", "gdal"], default="benchmark")
+    parser.add_argument("--baseline",
+                        help="baseline results file to compare against "
+                             "(default: IMERG_Accumulations_Benchmark_Baseline.json next to this script)",
+                        type=str)
+    parser.add_argument("--save-baseline",
+                        help="save these results as the new baseline",
+                        action="store_true")
+    parser.add_argument("--no-baseline",
+                        help="only measure - don't compare against a baseline (without this, a missing baseline is "
+                             "an error)",
+                        action="store_true")
+    parser.add_argument("--tolerance",
+                        help="allowed slowdown against the baseline before a case counts as a regression "
+                             "(default 0.15 = 15%%)",
+                        type=float, default=0.15)
+    parser.add_argument("-o", "--output",
+                        help="file to write the results (json) to",
+                        type=str)
+    parser.add_argument("--workspace",
+                        help="scratch folder for the synthetic data (default: a new temp folder, deleted afterwards)",
+                        type=str)
+    return parser.parse_args()
+
+
+# ------------------------------------------------------------
+# Synthetic IMERG data
+# ------------------------------------------------------------
+def SyntheticIMERGFileName(oStart, period, minutes=None):
+    """
+        Returns an IMERG style filename for a file starting at oStart.  i.e.
+            3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.1day.tif
+        The accumulations (1day, 3day, 7day...) all end with the last half hour of the day, the half hourly ('30min')
+        files are numbered by the minutes since midnight.
+    """
+    oEnd = oStart + datetime.timedelta(minutes=29, seconds=59)
+    if minutes is None:
+        minutes = oStart.hour * 60 + oStart.minute
+    return "3B-HHR-L.MS.MRG.3IMERG.{0}-S{1}-E{2}.{3}.V05B.{4}.tif".format(
+        oStart.strftime("%Y%m%d"), oStart.strftime("%H%M%S"), oEnd.strftime("%H%M%S"), str(minutes).zfill(4), period)
+
+
+def GenerateSourceListing(oLastDay, numDays):
+    """
+        Returns a synthetic source folder listing covering the numDays days up to oLastDay: for each day the 48 half
+        hourly files and the 3hr files, plus the 1day, 3day, 7day, and 30day accumulations - 60 files a day, like
+        the real /data/imerg/gis/<year>/<month> folders.
+    """
+    listing = []
+    for dayNum in range(numDays - 1, -1, -1):
+        oDay = datetime.datetime(oLastDay.year, oLastDay.month, oLastDay.day) - datetime.timedelta(days=dayNum)
+        for halfHour in range(48):
+            oStart = oDay + datetime.timedelta(minutes=30 * halfHour)
+            listing.append(SyntheticIMERGFileName(oStart, "30min"))
+            if halfHour % 6 == 5:
+                listing.append(SyntheticIMERGFileName(oStart, "3hr"))
+        oLastHalfHour = oDay + datetime.timedelta(hours=23, minutes=30)
+        for period in ["1day", "3day", "7day", "30day"]:
+            listing.append(SyntheticIMERGFileName(oLastHalfHour, period))
+    return listing
+
+
+def WriteSyntheticIMERGRaster(rasterFile, xSize, ySize, seed=0):
+    """
+        Writes a synthetic IMERG accumulation GeoTIFF (global, WGS84, int16 with NoData 29999). Most of the pixels are
+        zero (no rain), with scattered rain values and a band of NoData - so the transform has realistic work to do.
+    """
+    randomState = numpy.random.RandomState(seed)
+    data = randomState.gamma(0.3, 400.0, (ySize, xSize)).astype(numpy.int16)
+    data[randomState.random_sample((ySize, xSize)) < 0.6] = 0
+    data[:max(1, ySize // 20), :] = 29999
+
+    spatialRef = osr.SpatialReference()
+    spatialRef.ImportFromEPSG(4326)
+    rasterDS = gdal.GetDriverByName("GTiff").Create(rasterFile, xSize, ySize, 1, gdal.GDT_Int16,
+                                                    ["TILED=YES", "COMPRESS=DEFLATE"])
+    rasterDS.SetGeoTransform((-180.0, 360.0 / xSize, 0.0, 90.0, 0.0, -180.0 / ySize))
+    rasterDS.SetProjection(spatialRef.ExportToWkt())
+    rasterBand = rasterDS.GetRasterBand(1)
+    rasterBand.SetNoDataValue(29999)
+    rasterBand.WriteArray(data)
+    rasterDS = None
+
+
+def WriteSyntheticAccumulations(folder, oDay, xSize, ySize):
+    # Writes the 1, 3, and 7 day synthetic accumulation rasters for oDay into folder, returns their filenames.
+    fileNames = []
+    oLastHalfHour = datetime.datetime(oDay.year, oDay.month, oDay.day, 23, 30)
+    for seed, period in enumerate(["1day", "3day", "7day"]):
+        fileName = SyntheticIMERGFileName(oLastHalfHour, period)
+        WriteSyntheticIMERGRaster(os.path.join(folder, fileName), xSize, ySize, seed)
+        fileNames.append(fileName)
+    return fileNames
+
+
+def WriteFillerFile(targetFile, sizeBytes):
+    # Writes a file of sizeBytes random bytes - download payloads don't have to be valid rasters.
+    with open(targetFile, "wb") as outFile:
+        remaining = sizeBytes
+        while remaining > 0:
+            chunkSize = min(remaining, 1048576)
+            outFile.write(os.urandom(chunkSize))
+            remaining -= chunkSize
+
+
+# ------------------------------------------------------------
+# Stand-in servers
+# ------------------------------------------------------------
+class StandInProxyHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+        Serves the two requests the ETL makes of the SERVIR proxy (ProxyFTP.aspx), from the stand-in server's
+        listings and files:
+          ?directory=ftp://<host><folder>/  ->  the folder listing as one comma delimited string
+          ?url=ftp://<host><folder>/<file>  ->  the file, honoring byte range requests (used to resume downloads)
+        Responses are written in blocks paced to the server's bytesPerSecond, like a remote link.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.debug("Stand-in proxy: " + format % args)
+
+    def do_GET(self):
+        query = self.path.split("?", 1)[-1]
+        key, _, ftpURL = query.partition("=")
+        ftpPath = ftpURL[len("ftp://" + SyntheticHost):] if ftpURL.startswith("ftp://" + SyntheticHost) else None
+        if key == "directory" and ftpPath is not None and ftpPath.rstrip("/") in self.server.listings:
+            self.sendBody(200, ",".join(self.server.listings[ftpPath.rstrip("/")]), {})
+        elif key == "url" and ftpPath is not None and os.path.isfile(self.server.localPath(ftpPath)):
+            self.sendFile(self.server.localPath(ftpPath))
+        else:
+            self.sendBody(404, "Not found", {})
+
+    def sendBody(self, statusCode, body, headers):
+        self.send_response(statusCode)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def sendFile(self, localFile):
+        fileSize = os.path.getsize(localFile)
+        startByte = 0
+        rangeHeader = self.headers.getheader("Range")
+        if rangeHeader is not None and rangeHeader.startswith("bytes="):
+            startByte = int(rangeHeader[len("bytes="):].split("-")[0])
+            if startByte >= fileSize:
+                self.sendBody(416, "", {})
+                return
+        self.send_response(206 if startByte > 0 else 200)
+        self.send_header("Content-Length", str(fileSize - startByte))
+        self.send_header("Last-Modified", self.date_time_string(os.path.getmtime(localFile)))
+        if startByte > 0:
+            self.send_header("Content-Range", "bytes {0}-{1}/{2}".format(startByte, fileSize - 1, fileSize))
+        self.end_headers()
+        with open(localFile, "rb") as inFile:
+            inFile.seek(startByte)
+            PacedCopy(inFile, self.wfile, self.server.bytesPerSecond)
+
+
+class StandInProxyServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+        A local stand-in for the SERVIR proxy - see StandInProxyHandler. listings is a dictionary of
+        source folder -> list of filenames, and files are served from <rootFolder><source folder>/<file>.
+    """
+    daemon_threads = True
+
+    def __init__(self, rootFolder, listings, bytesPerSecond):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), StandInProxyHandler)
+        self.rootFolder = rootFolder
+        self.listings = listings
+        self.bytesPerSecond = bytesPerSecond
+
+    def localPath(self, ftpPath):
+        return os.path.join(self.rootFolder, *[p for p in ftpPath.split("/") if p])
+
+    def baseURL(self):
+        return "http://127.0.0.1:{0}/ProxyFTP.aspx".format(self.server_address[1])
+
+    def start(self):
+        serverThread = threading.Thread(target=self.serve_forever)
+        serverThread.daemon = True
+        serverThread.start()
+
+
+def PacedCopy(inFile, outFile, bytesPerSecond, blockSize=65536):
+    # Copies inFile to outFile in blocks, sleeping as needed to stay at (or under) bytesPerSecond (0 = no limit).
+    time_Start = time.time()
+    bytesSent = 0
+    while True:
+        block = inFile.read(blockSize)
+        if not block:
+            break
+        outFile.write(block)
+        bytesSent += len(block)
+        if bytesPerSecond > 0:
+            aheadSeconds = bytesSent / float(bytesPerSecond) - (time.time() - time_Start)
+            if aheadSeconds > 0:
+                time.sleep(aheadSeconds)
+
+
+def StartStandInFTPServer(rootFolder, bytesPerSecond):
+    """
+        Starts a local stand-in ftp server (pyftpdlib) serving rootFolder, paced to bytesPerSecond per connection.
+        Returns the server (host, port are in server.address), or None if pyftpdlib is not installed.
+    """
+    if ThreadedFTPServer is None:
+        return None
+    authorizer = DummyAuthorizer()
+    authorizer.add_user("benchmark", "benchmark", rootFolder, perm="elr")
+    handler = type("BenchmarkFTPHandler", (FTPHandler,), {})
+    handler.authorizer = authorizer
+    if bytesPerSecond > 0:
+        from pyftpdlib.handlers import ThrottledDTPHandler
+        handler.dtp_handler = type("BenchmarkDTPHandler", (ThrottledDTPHandler,), {"read_limit": bytesPerSecond})
+    server = ThreadedFTPServer(("127.0.0.1", 0), handler)
+    serverThread = threading.Thread(target=server.serve_forever)
+    serverThread.daemon = True
+    serverThread.start()
+    return server
+
+
+# ------------------------------------------------------------
+# Fake mosaic store
+# ------------------------------------------------------------
+class BenchmarkMosaicStore(etl.MosaicStore):
+    """
+        A fake mosaic store - one SQLite table per mosaic holding each raster's Name, Path, and time attributes,
+        and nothing else (no pyramids, statistics, or VRTs). The load benchmark then times the ETL's own work,
+        not ArcGIS's. Counts the calls made to it in .calls.
+    """
+
+    def __init__(self):
+        self.indexPath = etl.GetConfigString("mosaic_IndexPath")
+        self.attrNameList = [etl.GetConfigString('rasterStartTimeProperty'),
+                             etl.GetConfigString('rasterEndTimeProperty')]
+        self.calls = {}
+
+    def countCall(self, callName):
+        self.calls[callName] = self.calls.get(callName, 0) + 1
+
+    def connect(self, targetDataset):
+        tableName = os.path.basename(targetDataset)
+        connection = sqlite3.connect(self.indexPath)
+        connection.execute("CREATE TABLE IF NOT EXISTS {0} (Name TEXT, Path TEXT, {1} TEXT, {2} TEXT)".format(
+            tableName, self.attrNameList[0], self.attrNameList[1]))
+        return connection, tableName
+
+    def getDatasetPath(self, datasetName):
+        return os.path.join(self.indexPath, datasetName)
+
+    def listRasters(self, folder):
+        return sorted([f for f in os.listdir(folder) if f.lower().endswith(".tif")])
+
+    def deleteFile(self, rasterFile):
+        self.countCall("deleteFile")
+        if os.path.exists(rasterFile):
+            os.remove(rasterFile)
+
+    def addRasters(self, targetDataset, rasterFiles, duplicatesAction, buildPyramids, calculateStatistics,
+                   updateBoundary="NO_BOUNDARY"):
+        self.countCall("addRasters")
+        connection, tableName = self.connect(targetDataset)
+        try:
+            for rasterFile in rasterFiles:
+                rasterName = os.path.splitext(os.path.basename(rasterFile))[0]
+                if duplicatesAction == "OVERWRITE_DUPLICATES":
+                    connection.execute("DELETE FROM {0} WHERE Name = ?".format(tableName), [rasterName])
+                connection.execute("INSERT INTO {0} (Name, Path) VALUES (?, ?)".format(tableName),
+                                   [rasterName, rasterFile])
+            connection.commit()
+        finally:
+            connection.close()
+
+    def removeRasters(self, targetDataset, whereClause):
+        self.countCall("removeRasters")
+        connection, tableName = self.connect(targetDataset)
+        try:
+            connection.execute("DELETE FROM {0} WHERE {1}".format(tableName, whereClause))
+            connection.commit()
+        finally:
+            connection.close()
+
+    def openUpdateCursor(self, targetDataset, fieldNames, whereClause=None):
+        self.countCall("openUpdateCursor")
+        self.connect(targetDataset)[0].close()
+        return etl.SQLiteUpdateCursor(targetDataset, fieldNames, whereClause)
+
+    def compact(self):
+        self.countCall("compact")
+
+    def getFileSizes(self):
+        if not os.path.isfile(self.indexPath):
+            return {}
+        return {os.path.basename(self.indexPath): os.path.getsize(self.indexPath)}
+
+
+# ------------------------------------------------------------
+# Benchmark workspace
+# ------------------------------------------------------------
+def BenchmarkConfig(workFolder):
+    # The config.pkl settings the ETL runs with during the benchmark - everything points into workFolder.
+    return {'extract_AccumulationsFolder': os.path.join(workFolder, "Extract"),
+            'final_Folder': os.path.join(workFolder, "Final"),
+            'logFileDir': workFolder,
+            'logFilePrefix': 'IMERG_Benchmark',
+            'GDBPath': os.path.join(workFolder, "Benchmark.gdb"),
+            '1DayDSName': 'IMERG1Day',
+            '3DayDSName': 'IMERG3Day',
+            '7DayDSName': 'IMERG7Day',
+            'rasterStartTimeProperty': 'start_datetime',
+            'rasterEndTimeProperty': 'end_datetime',
+            'RegEx_StartDateFilterString': '\d{4}[01]\d[0-3]\d-S[0-2]\d{5}',
+            'GDB_DateFormat': '%Y%m%d%H%M',
+            'Filename_StartDateFormat': '%Y%m%d-S%H%M%S',
+            'ftp_host': SyntheticHost,
+            'ftp_user': 'benchmark',
+            'ftp_pswrd': 'benchmark',
+            'ftp_baseLateFolder': SyntheticBaseFolder,
+            'download_ManifestFile': os.path.join(workFolder, "IMERG_Benchmark_Manifest.json"),
+            'listing_CacheFolder': os.path.join(workFolder, "ListingCache"),
+            'transform_Engine': 'numpy',
+            'mosaic_Store': 'benchmark',
+            'mosaic_IndexPath': os.path.join(workFolder, "IMERG_Benchmark_Index.sqlite"),
+            'maintenance_StateFile': os.path.join(workFolder, "IMERG_Benchmark_MaintenanceState.json"),
+            'metrics_RunRecordFile': os.path.join(workFolder, "IMERG_Benchmark_RunRecords.jsonl")}
+
+
+def SetupBenchmarkWorkspace(workFolder, storeName):
+    """
+        Creates the benchmark workspace: writes its config.pkl and loads it into the ETL. workFolder becomes the
+        current folder, so the transform worker processes read the same config.pkl. The fake mosaic store is
+        registered with the ETL as the 'benchmark' store.
+    """
+    for subFolder in ["Extract", "Final", "Source", "ListingCache"]:
+        if not os.path.isdir(os.path.join(workFolder, subFolder)):
+            os.makedirs(os.path.join(workFolder, subFolder))
+    config = BenchmarkConfig(workFolder)
+    config["mosaic_Store"] = storeName
+    with open(os.path.join(workFolder, "config.pkl"), "wb") as configFile:
+        pickle.dump(config, configFile)
+
+    os.chdir(workFolder)
+    etl.LoadConfig(os.path.join(workFolder, "config.pkl"))
+    etl.MosaicStores["benchmark"] = BenchmarkMosaicStore
+    etl.mosaicStore = None
+    return config
+
+
+def ResetFolder(folder):
+    # Empties a folder (keeping the folder itself).
+    for fileName in os.listdir(folder):
+        filePath = os.path.join(folder, fileName)
+        if os.path.isdir(filePath):
+            shutil.rmtree(filePath)
+        else:
+            os.remove(filePath)
+
+
+def ResetLoadState(config):
+    # Clears everything a previous case left behind that would change the next one (manifest, index, outputs).
+    for stateFile in [config["download_ManifestFile"], config["mosaic_IndexPath"]]:
+        if os.path.isfile(stateFile):
+            os.remove(stateFile)
+    ResetFolder(config["extract_AccumulationsFolder"])
+    ResetFolder(config["final_Folder"])
+    ResetFolder(config["listing_CacheFolder"])
+    etl.mosaicStore = None
+    etl.CloseTransportSessions()
+
+
+def TimeRepeated(runFunc, repeats, setupFunc=None):
+    """
+        Runs runFunc repeats times (calling setupFunc, untimed, before each run) and returns the list of run times in
+        seconds.
+    """
+    runSeconds = []
+    for runNum in range(repeats):
+        if setupFunc is not None:
+            setupFunc()
+        time_Run = time.time()
+        runFunc()
+        runSeconds.append(time.time() - time_Run)
+    return runSeconds
+
+
+def BenchmarkResult(benchName, params, runSeconds, **extraValues):
+    # Returns (case key, result dictionary) for one benchmark case. The key identifies the case in the baseline.
+    sortedSeconds = sorted(runSeconds)
+    result = {"bench": benchName,
+              "params": params,
+              "runs": len(runSeconds),
+              "median": sortedSeconds[len(sortedSeconds) // 2],
+              "min": sortedSeconds[0],
+              "max": sortedSeconds[-1]}
+    result.update(extraValues)
+    caseKey = benchName + "[" + ",".join(["{0}={1}".format(k, params[k]) for k in sorted(params)]) + "]"
+    benchLog.info("{0}: median {1:.4f}s (min {2:.4f}s, max {3:.4f}s)".format(caseKey, result["median"],
+                                                                           result["min"], result["max"]))
+    return caseKey, result
+
+
+# ------------------------------------------------------------
+# Benchmarks
+# ------------------------------------------------------------
+def BenchmarkListing(config, sizes, repeats, proxyServer):
+    """
+        Times listing a source month folder through the stand-in proxy (ListProxyFolder()), for folders of different
+        sizes. The listing cache is not involved - this is the cost of every cache miss.
+    """
+    results = {}
+    for numDays in sizes["listingDays"]:
+        ftpFolder = "{0}/bench/{1}days".format(SyntheticBaseFolder, numDays)
+        proxyServer.listings[ftpFolder] = GenerateSourceListing(datetime.datetime(2018, 8, 31), numDays)
+        runSeconds = TimeRepeated(lambda: etl.ListProxyFolder(ftpFolder), repeats)
+        caseKey, result = BenchmarkResult("listing", {"files": len(proxyServer.listings[ftpFolder])}, runSeconds)
+        results[caseKey] = result
+    return results
+
+
+def BenchmarkSelection(config, sizes, repeats):
+    """
+        Times picking the latest file(s) out of listings of different sizes - GetLatestIMERGFileFromList() (latest of
+        any product) and IMERGFilenameIndex().latestPerProduct() (latest 1, 3, and 7 day file, as the ETL does).
+    """
+    results = {}
+    for numDays in sizes["listingDays"]:
+        listing = GenerateSourceListing(datetime.datetime(2018, 8, 31), numDays)
+        runSeconds = TimeRepeated(lambda: etl.GetLatestIMERGFileFromList(listing), repeats)
+        caseKey, result = BenchmarkResult("selection", {"files": len(listing), "func": "GetLatestIMERGFileFromList"},
+                                          runSeconds)
+        results[caseKey] = result
+        runSeconds = TimeRepeated(lambda: etl.IMERGFilenameIndex(listing).latestPerProduct(), repeats)
+        caseKey, result = BenchmarkResult("selection", {"files": len(listing), "func": "IMERGFilenameIndex"},
+                                          runSeconds)
+        results[caseKey] = result
+    return results
+
+
+def BenchmarkDownload(config, sizes, repeats, proxyServer, ftpServer, bytesPerSecond):
+    """
+        Times downloading the 1, 3, and 7 day files through the stand-in proxy with DownloadFilesConcurrently(), for
+        different file sizes and numbers of concurrent downloads - and, if the stand-in ftp server is running, one at
+        a time over a single ftp session with StreamDownloadFromFTP(). Reports the throughput as well.
+    """
+    results = {}
+    extractFolder = config["extract_AccumulationsFolder"]
+    for sizeMB in sizes["downloadMB"]:
+        sourceFolder = "{0}/bench/download{1}MB".format(SyntheticBaseFolder, sizeMB)
+        localFolder = proxyServer.localPath(sourceFolder)
+        if not os.path.isdir(localFolder):
+            os.makedirs(localFolder)
+        fileNames = [SyntheticIMERGFileName(datetime.datetime(2018, 8, 31, 23, 30), period)
+                     for period in ["1day", "3day", "7day"]]
+        for fileName in fileNames:
+            WriteFillerFile(os.path.join(localFolder, fileName), int(sizeMB * 1048576))
+        totalBytes = sum([os.path.getsize(os.path.join(localFolder, f)) for f in fileNames])
+
+        for concurrency in sizes["downloadConcurrency"]:
+            def runDownloads():
+                downloadList = [etl.DownloadItem(etl.ProxyFileURL + "ftp://" + SyntheticHost + sourceFolder + "/" + f,
+                                                 os.path.join(extractFolder, f), f.split(".")[-2]) for f in fileNames]
+                etl.DownloadFilesConcurrently(downloadList, concurrency)
+                if not all([dlItem.succeeded for dlItem in downloadList]):
+                    raise RuntimeError("Benchmark download failed - see the log.")
+            runSeconds = TimeRepeated(runDownloads, repeats, lambda: ResetFolder(extractFolder))
+            caseKey, result = BenchmarkResult("download", {"transport": "proxy", "sizeMB": sizeMB,
+                                                           "concurrency": concurrency}, runSeconds,
+                                              bytesPerSecond=totalBytes / sorted(runSeconds)[len(runSeconds) // 2])
+            results[caseKey] = result
+
+        if ftpServer is not None:
+            def runFTPDownloads():
+                # The stand-in server isn't on port 21, so the session is opened here instead of by GetFTPSession()
+                ftpSession = ftplib.FTP()
+                ftpSession.connect(ftpServer.address[0], ftpServer.address[1])
+                ftpSession.login("benchmark", "benchmark")
+                try:
+                    ftpSession.cwd(sourceFolder)
+                    for fileName in fileNames:
+                        etl.StreamDownloadFromFTP(ftpSession, fileName, os.path.join(extractFolder, fileName),
+                                                  1048576)
+                finally:
+                    ftpSession.quit()
+            runSeconds = TimeRepeated(runFTPDownloads, repeats, lambda: ResetFolder(extractFolder))
+            caseKey, result = BenchmarkResult("download", {"transport": "ftp", "sizeMB": sizeMB, "concurrency": 1},
+                                              runSeconds,
+                                              bytesPerSecond=totalBytes / sorted(runSeconds)[len(runSeconds) // 2])
+            results[caseKey] = result
+    if ftpServer is None:
+        benchLog.info("pyftpdlib is not installed, skipping the ftp download benchmark.")
+    return results
+
+
+def BenchmarkTransform(config, sizes, repeats):
+    """
+        Times the numpy masking transform of the 1, 3, and 7 day rasters with TransformRasters(), for different raster
+        sizes and numbers of worker processes.
+    """
+    results = {}
+    sourceFolder = os.path.join(config["extract_AccumulationsFolder"], "TransformSource")
+    for xSize, ySize in sizes["rasterSizes"]:
+        ResetFolder(config["extract_AccumulationsFolder"])
+        os.makedirs(sourceFolder)
+        fileNames = WriteSyntheticAccumulations(sourceFolder, datetime.date(2018, 8, 31), xSize, ySize)
+        for numProcesses in sizes["transformProcesses"]:
+            memoryCeilingMB = float(etl.GetConfigValue("transform_MemoryCeilingMB", 64)) / numProcesses
+            transformJobs = [("numpy", os.path.join(sourceFolder, f), os.path.join(config["final_Folder"], f),
+                              0, 29999, memoryCeilingMB) for f in fileNames]
+
+            def runTransform():
+                transformErrors = etl.TransformRasters(transformJobs, "numpy", numProcesses)
+                failedRasters = [inFile for inFile, err in transformErrors.items() if err is not None]
+                if len(failedRasters) > 0:
+                    raise RuntimeError("Benchmark transform failed: {0}".format(transformErrors[failedRasters[0]]))
+            runSeconds = TimeRepeated(runTransform, repeats, lambda: ResetFolder(config["final_Folder"]))
+            caseKey, result = BenchmarkResult("transform", {"size": "{0}x{1}".format(xSize, ySize),
+                                                            "processes": numProcesses}, runSeconds,
+                                              pixelsPerSecond=len(fileNames) * xSize * ySize /
+                                              sorted(runSeconds)[len(runSeconds) // 2])
+            results[caseKey] = result
+    return results
+
+
+def BenchmarkLoad(config, sizes, repeats):
+    """
+        Times a whole LoadAccumulationRasters() pass - transform, mosaic adds, and attribute updates - over the 1, 3,
+        and 7 day rasters, in both load modes, into the fake (or gdal) mosaic store.
+    """
+    results = {}
+    for xSize, ySize in sizes["loadRasterSizes"]:
+        for loadMode in ["overwrite", "swap"]:
+            etl.GetConfig()["load_Mode"] = loadMode
+
+            def setupLoad():
+                ResetLoadState(config)
+                WriteSyntheticAccumulations(config["extract_AccumulationsFolder"], datetime.date(2018, 8, 31),
+                                            xSize, ySize)
+
+            def runLoad():
+                loadResult = etl.LoadAccumulationRasters(config["extract_AccumulationsFolder"])
+                if len(loadResult.loadedRasters) != 3:
+                    raise RuntimeError("Benchmark load failed - see the log.")
+            runSeconds = TimeRepeated(runLoad, repeats, setupLoad)
+            caseKey, result = BenchmarkResult("load", {"size": "{0}x{1}".format(xSize, ySize), "mode": loadMode,
+                                                       "store": config["mosaic_Store"]}, runSeconds)
+            results[caseKey] = result
+    etl.GetConfig().pop("load_Mode", None)
+    return results
+
+
+# ------------------------------------------------------------
+# Baseline comparison
+# ------------------------------------------------------------
+def ReadBenchmarkFile(benchmarkFile):
+    # Returns the results dictionary stored in a benchmark results (or baseline) file, or None if there isn't one.
+    if not os.path.isfile(benchmarkFile):
+        return None
+    with open(benchmarkFile, "r") as inFile:
+        return json.load(inFile)
+
+
+def WriteBenchmarkFile(benchmarkFile, benchmarkRun):
+    with open(benchmarkFile, "w") as outFile:
+        json.dump(benchmarkRun, outFile, indent=2, sort_keys=True)
+
+
+def CompareWithBaseline(results, baseline, tolerance):
+    """
+        Compares each case's median time with the baseline's. Returns a list of (case key, baseline median,
+        median, ratio, verdict) where the verdict is 'regression' (slower by more than tolerance), 'improvement'
+        (faster by more than tolerance), 'ok', 'new' (not in the baseline) or 'missing' (not run this time).
+    """
+    comparison = []
+    baselineResults = baseline.get("results", {})
+    for caseKey in sorted(set(results.keys()) | set(baselineResults.keys())):
+        if caseKey not in baselineResults:
+            comparison.append((caseKey, None, results[caseKey]["median"], None, "new"))
+            continue
+        if caseKey not in results:
+            comparison.append((caseKey, baselineResults[caseKey]["median"], None, None, "missing"))
+            continue
+        baselineMedian = baselineResults[caseKey]["median"]
+        median = results[caseKey]["median"]
+        ratio = median / baselineMedian if baselineMedian > 0 else 1.0
+        if ratio > 1.0 + tolerance:
+            verdict = "regression"
+        elif ratio < 1.0 - tolerance:
+            verdict = "improvement"
+        else:
+            verdict = "ok"
+        comparison.append((caseKey, baselineMedian, median, ratio, verdict))
+    return comparison
+
+
+def LogComparison(comparison, baselineFile):
+    benchLog.info("Compared with the baseline {0}:".format(baselineFile))
+    for caseKey, baselineMedian, median, ratio, verdict in comparison:
+        if ratio is None:
+            benchLog.info("\t{0:<11} {1}".format(verdict.upper(), caseKey))
+        else:
+            benchLog.info("\t{0:<11} {1}: {2:.4f}s -> {3:.4f}s ({4:+.1f}%)".format(
+                verdict.upper(), caseKey, baselineMedian, median, (ratio - 1.0) * 100))
+
+
+# Main Function
+def main():
+    args = setupArgs()
+    if args.logging:
+        log_level = args.logging.upper()
+    else:
+        log_level = "WARNING"
+    logging.basicConfig(stream=sys.stdout, level=log_level, format='%(asctime)s: %(levelname)s --- %(message)s',
+                        datefmt='%m/%d/%Y %I:%M:%S %p')
+    benchLog.setLevel(logging.INFO)
+
+    if numpy is None or gdal is None:
+        logging.error("The benchmark needs numpy and GDAL to generate the synthetic rasters.")
+        return 2
+
+    scriptFolder = os.path.dirname(os.path.realpath(__file__))
+    baselineFile = args.baseline or os.path.join(scriptFolder, "IMERG_Accumulations_Benchmark_Baseline.json")
+    outputFile = os.path.realpath(args.output) if args.output else None
+    bCompare = not args.no_baseline and os.path.isfile(baselineFile)
+    if not bCompare and not args.no_baseline and not args.save_baseline:
+        # Without a baseline a regression can never be flagged, so don't pretend the run passed.
+        logging.error("No baseline found at {0}. Run the benchmark with --save-baseline on the reference machine to "
+                      "create one (or with --no-baseline to only measure).".format(baselineFile))
+        return 2
+    benchNames = args.bench or BenchmarkNames
+    sizes = BenchmarkSizes["quick" if args.quick else "full"]
+    bytesPerSecond = int(args.link_mbps * 1048576)
+
+    workFolder = os.path.realpath(args.workspace) if args.workspace else tempfile.mkdtemp(prefix="IMERG_Benchmark_")
+    startFolder = os.getcwd()
+    proxyServer = None
+    ftpServer = None
+    try:
+        config = SetupBenchmarkWorkspace(workFolder, args.store)
+        benchLog.info("Benchmark workspace: {0}".format(workFolder))
+
+        # The stand-in servers, with the ETL pointed at the stand-in proxy
+        proxyServer = StandInProxyServer(os.path.join(workFolder, "Source"), {}, bytesPerSecond)
+        proxyServer.start()
+        etl.ProxyDirectoryURL = proxyServer.baseURL() + "?directory="
+        etl.ProxyFileURL = proxyServer.baseURL() + "?url="
+        if "download" in benchNames:
+            ftpServer = StartStandInFTPServer(os.path.join(workFolder, "Source"), bytesPerSecond)
+
+        results = {}
+        if "listing" in benchNames:
+            results.update(BenchmarkListing(config, sizes, args.repeats, proxyServer))
+        if "selection" in benchNames:
+            results.update(BenchmarkSelection(config, sizes, args.repeats))
+        if "download" in benchNames:
+            results.update(BenchmarkDownload(config, sizes, args.repeats, proxyServer, ftpServer, bytesPerSecond))
+        if "transform" in benchNames:
+            results.update(BenchmarkTransform(config, sizes, args.repeats))
+        if "load" in benchNames:
+            results.update(BenchmarkLoad(config, sizes, args.repeats))
+
+        benchmarkRun = {"created": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        "python": sys.version.split()[0],
+                        "gdal": gdal.__version__ if hasattr(gdal, "__version__") else "",
+                        "numpy": numpy.__version__,
+                        "platform": sys.platform,
+                        "cpus": etl.multiprocessing.cpu_count(),
+                        "quick": args.quick,
+                        "linkMBps": args.link_mbps,
+                        "results": results}
+        if outputFile:
+            WriteBenchmarkFile(outputFile, benchmarkRun)
+
+        exitCode = 0
+        if bCompare:
+            baseline = ReadBenchmarkFile(baselineFile)
+            comparison = CompareWithBaseline(results, baseline, args.tolerance)
+            LogComparison(comparison, baselineFile)
+            if baseline.get("quick") != args.quick:
+                logging.warning("The baseline was run with quick={0}, so most cases won't match.".format(
+                    baseline.get("quick")))
+            if len([c for c in comparison if c[4] == "regression"]) > 0:
+                exitCode = 1
+
+        if args.save_baseline:
+            WriteBenchmarkFile(baselineFile, benchmarkRun)
+            benchLog.info("Saved the results as the baseline: {0}".format(baselineFile))
+        return exitCode
+
+    finally:
+        etl.CloseTransportSessions()
+        if proxyServer is not None:
+            proxyServer.shutdown()
+        if ftpServer is not None:
+            ftpServer.close_all()
+        os.chdir(startFolder)
+        if not args.workspace:
+            shutil.rmtree(workFolder, True)
+
+
+# Call Main Function
+# (The guard is required so the transform worker processes can import this script on Windows without running main.)
+if __name__ == "__main__":
+    sys.exit(main())
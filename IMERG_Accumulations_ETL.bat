@@ -7,3 +7,6 @@ REM ### Run the script with the desired command line option
 C:\Python27\ArcGIS10.4\python.exe "%SolutionDir%" -l DEBUG
 REM C:\Python27\ArcGISx6410.4\python.exe "%SolutionDir%" -l INFO
 
+REM ### Or keep it running and load new files as soon as they show up (see 'Daemon mode' in the README)
+REM C:\Python27\ArcGIS10.4\python.exe "%SolutionDir%" -l INFO --daemon
+
@@ -12,7 +12,6 @@
 # Note: This is a rewrite of the initial IMERG ETL - some portions of the initial code were reused.
 # -------------------------------------------------------------------------------
 
-import arcpy
 import argparse  # required for processing command line arguments
 import datetime
 import time
@@ -28,18 +27,34 @@ import re  # required for Regular Expressions
 
 import urllib  # required for RefreshService() (stopping and starting services) and retrieving remote files.
 import urllib2  # required for retrieving remote files.
+import httplib  # required for the pooled (keep-alive) HTTP connections
+import urlparse  # required for the pooled (keep-alive) HTTP connections
+import threading  # required for the connection pool and token cache locks
+import random  # required for the daemon mode poll jitter
 
 import ftplib  # require for ftp downloads
 import json  # required for UpdateServicesJsonFile() (updating services JSON file)
+import hashlib  # required for the download manifest checksums
+import sqlite3  # required for SQLiteUpdateCursor and the GDAL mosaic store index
+import struct  # required for the slot number trailer of the memory mapped slot files
+
+import multiprocessing  # required for transforming rasters in parallel
+from multiprocessing.pool import ThreadPool  # required for concurrent downloads
+
+# The geoprocessing modules are slow to import (arcpy takes seconds), so they are only imported once a stage needs them
+# - see ImportArcPy() and ImportGDAL(). A --check-only run never imports them.
+arcpy = None
+numpy = None
+gdal = None
+gdalImportError = None
 
 
 # ------------------------------------------------------------
 # Read configuration settings
 # Global Variables - contents will not change during execution
 # ------------------------------------------------------------
-pkl_file = open('config.pkl', 'rb')
-myConfig = pickle.load(pkl_file)
-pkl_file.close()
+# config.pkl is read on first use (see GetConfig()), so importing this script has no side effects.
+myConfig = None
 
 
 class RasterLoadObject(object):
@@ -50,12 +65,13 @@ class RasterLoadObject(object):
         raster entry each time. This is why we have both the origFile and loadFile properties.
     """
 
-    def __init__(self, oFile="default", lFile="default", sDate=None, eDate=None, sDataset="default"):
+    def __init__(self, oFile="default", lFile="default", sDate=None, eDate=None, sDataset="default", pName=""):
         self.origFile = oFile
         self.loadFile = lFile
         self.startDate = sDate
         self.endDate = eDate
         self.targetDataset = sDataset
+        self.productName = pName
 
     def origFile(self, oFile):
         self.origFile = oFile
@@ -72,6 +88,36 @@ class RasterLoadObject(object):
     def targetDataset(self, sDataset):
         self.targetDataset = sDataset
 
+    def productName(self, pName):
+        self.productName = pName
+
+
+class AccumulationLoadResult(object):
+    """
+        A class to hold the outcome of LoadAccumulationRasters() so that the downstream stages (compact, services JSON
+        file, and service refresh) only run for the products that actually changed.
+          'loadedRasters':  list of RasterLoadObjects that were successfully loaded into their mosaic dataset.
+          'failedRasters':  list of RasterLoadObjects that could not be loaded.
+          'rasterStatistics': dictionary of load file name -> list of band statistics dictionaries (see
+                              RasterBandStatistics.toDict()), for the rasters transformed by the 'numpy' engine.
+    """
+
+    def __init__(self):
+        self.loadedRasters = []
+        self.failedRasters = []
+        self.rasterStatistics = {}
+
+    def changedProducts(self):
+        # Returns the (unique) list of product names, i.e. ['1Day', '7Day'], that had a raster loaded.
+        products = []
+        for rasLoadObj in self.loadedRasters:
+            if rasLoadObj.productName not in products:
+                products.append(rasLoadObj.productName)
+        return products
+
+    def hasChanges(self):
+        return len(self.loadedRasters) > 0
+
 
 class MapService(object):
     """
@@ -111,6 +157,1090 @@ class MapService(object):
         self.svcType = svc_type
 
 
+class DownloadItem(object):
+    """
+        A class to hold information about a single file to be downloaded.  i.e.
+          'sourceURL': 'https://proxy.servirglobal.net/ProxyFTP.aspx?url=ftp://...1day.tif',
+          'targetFile': 'E:/ETLScratch/IMERG_Extract/Accumulations/...1day.tif',
+          'label': '1Day'
+    """
+
+    def __init__(self, src="", tFile="", lbl=""):
+        self.sourceURL = src
+        self.targetFile = tFile
+        self.label = lbl
+        self.remoteModified = None
+        self.succeeded = False
+
+    def sourceURL(self, src):
+        self.sourceURL = src
+
+    def targetFile(self, tFile):
+        self.targetFile = tFile
+
+    def label(self, lbl):
+        self.label = lbl
+
+
+class AccumulationProduct(object):
+    """
+        A class to hold one entry of the accumulation product registry (see GetProductRegistry()).  i.e.
+          'name':               '1Day' - the product name used in the logs, the run report, and the run record
+          'period':             '1day' - the period string (filename suffix) of its source files, i.e. ...V05B.1day.tif
+          'accumulationPeriod': timedelta(days=1)
+          'dsName':             'IMERG1Day' - the mosaic dataset it is loaded into
+          'backfillDSName':     'IMERG1Day_Archive' - the mosaic dataset backfilled rasters are loaded into ('' if
+                                there isn't one - required by backfill mode, see GetBackfillDatasetErrors())
+          'loadName':           'IMERG1Day' - the file (and mosaic item) name it is loaded as, i.e. IMERG1Day.tif
+          'svcName':            'IMERG_Acc_1Day_ImgSvc' - the image service that shows it ('' if there isn't one)
+    """
+
+    def __init__(self, pName, sPeriod, accumulationPeriod, dsName, backfillDSName="", loadName="", svcName=""):
+        self.name = pName
+        self.period = sPeriod
+        self.accumulationPeriod = accumulationPeriod
+        self.dsName = dsName
+        self.backfillDSName = backfillDSName
+        self.loadName = loadName or "IMERG" + pName
+        self.svcName = svcName
+
+    def loadFile(self):
+        return self.loadName + ".tif"
+
+
+class AccumulationProductRegistry(object):
+    """
+        A class to hold the accumulation products we load, shortest accumulation period first, so that every stage can
+        work through all of them in one pass instead of having its own code for each product.
+          'products':          list of AccumulationProduct
+          'byName(pName)':     the AccumulationProduct with that name, or None
+          'byPeriod(sPeriod)': the AccumulationProduct for that filename period string, or None
+    """
+
+    def __init__(self, products):
+        self.products = sorted(products, key=lambda p: p.accumulationPeriod)
+        self.names = dict((p.name, p) for p in self.products)
+        self.periods = dict((p.period, p) for p in self.products)
+
+    def byName(self, pName):
+        return self.names.get(pName)
+
+    def byPeriod(self, sPeriod):
+        return self.periods.get(sPeriod)
+
+
+# The built-in accumulation products: product name, period string in the filename, and accumulation period. Their
+# mosaic datasets and services come from the '<name>DSName', 'backfill_<name>DSName', and 'svc_Name_<name>' settings.
+# More products can be added with the 'products_Additional' setting (see GetProductRegistry()).
+BuiltInAccumulationProducts = [("1Day", "1day", datetime.timedelta(days=1)),
+                               ("3Day", "3day", datetime.timedelta(days=3)),
+                               ("7Day", "7day", datetime.timedelta(days=7))]
+
+# Compiled once - matches the whole filename and captures every field we need in one pass.
+#   3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.1day.tif
+IMERGFilenamePattern = re.compile(r"^(?P<prefix>.+)\.(?P<date>\d{8})-S(?P<start>\d{6})-E(?P<end>\d{6})"
+                                  r"\.(?P<minutes>\d{4})\.(?P<version>V[0-9A-Za-z]+)\.(?P<period>[0-9A-Za-z]+)\.tif$")
+
+
+class IMERGFilename(object):
+    """
+        A class to hold the information parsed out of an IMERG filename.  i.e. for
+            3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.1day.tif
+          'fileName':       the filename itself
+          'startDateTime':  datetime of the date and start time  (2018-08-09 23:30:00)
+          'endDateTime':    datetime of the date and end time  (2018-08-09 23:59:59)
+          'version':        'V05B'
+          'period':         '1day'
+          'product':        '1Day' (None if the period is not one of the registered products - see GetProductRegistry())
+          'accumulationPeriod': timedelta(days=1) (None if the period is not one of the registered products)
+        Use ParseIMERGFilename() to build one.
+    """
+
+    def __init__(self, fName="", sDateTime=None, eDateTime=None, sVersion="", sPeriod=""):
+        self.fileName = fName
+        self.startDateTime = sDateTime
+        self.endDateTime = eDateTime
+        self.version = sVersion
+        self.period = sPeriod
+        registeredProduct = GetProductRegistry().byPeriod(sPeriod)
+        self.product = registeredProduct.name if registeredProduct is not None else None
+        self.accumulationPeriod = registeredProduct.accumulationPeriod if registeredProduct is not None else None
+
+
+def ParseIMERGFilename(fileName):
+    """
+        Parses an IMERG filename with the compiled IMERGFilenamePattern and returns an IMERGFilename, or None if the
+        name does not match (this includes partial ".part" downloads).
+    """
+    match = IMERGFilenamePattern.match(fileName)
+    if match is None:
+        return None
+    try:
+        sDate = match.group("date")
+        oStart = datetime.datetime.strptime(sDate + match.group("start"), "%Y%m%d%H%M%S")
+        oEnd = datetime.datetime.strptime(sDate + match.group("end"), "%Y%m%d%H%M%S")
+    except ValueError:
+        return None
+    return IMERGFilename(fileName, oStart, oEnd, match.group("version"), match.group("period"))
+
+
+class IMERGFilenameIndex(object):
+    """
+        A class that parses a list of filenames (i.e. a source folder listing) once, keeping only the accumulation files
+        of the registered products (see GetProductRegistry()), so that the questions we ask of a listing can be
+        answered without parsing again:
+          'latestPerProduct()':  the latest IMERGFilename for each product (tracked while the list is parsed).
+          'inRange(oStart, oEnd)':  every IMERGFilename whose start date/time is within [oStart, oEnd).
+        As in GetLatestIMERGFileFromList(), the latest file is the one with the latest date and start time, and the
+        first one in the list wins a tie.
+    """
+
+    def __init__(self, theFilenameList):
+        self.files = []
+        self.latest = {}
+        for fileName in theFilenameList:
+            parsed = ParseIMERGFilename(fileName)
+            if parsed is None or parsed.product is None:
+                continue
+            self.files.append(parsed)
+            current = self.latest.get(parsed.product)
+            if current is None or parsed.startDateTime > current.startDateTime:
+                self.latest[parsed.product] = parsed
+
+    def latestPerProduct(self):
+        # Returns a dictionary of product name -> latest IMERGFilename.
+        return dict(self.latest)
+
+    def inRange(self, oStart, oEnd):
+        # Returns the list of IMERGFilenames with a start date/time from oStart up to (not including) oEnd.
+        return [f for f in self.files if oStart <= f.startDateTime < oEnd]
+
+
+class RasterBandStatistics(object):
+    """
+        Accumulates the statistics of one raster band (min, max, mean, standard deviation, valid pixel count, and a
+        histogram) a window at a time, as the transform streams the band - so no second read of the raster is needed.
+        The running mean and variance are merged window by window (Chan et al.), which stays accurate over millions
+        of pixels.
+    """
+
+    # Bytes per valid pixel of the temporary array update() builds (the float64 differences from the mean), counted by
+    # GetMaxWindowPixels(). The sums, minimum, maximum, and histogram are worked out without full size temporaries.
+    workingBytesPerPixel = 8
+
+    def __init__(self, histMin, histMax, numBuckets=256):
+        self.histMin = histMin
+        self.histMax = histMax
+        self.histogram = numpy.zeros(numBuckets, numpy.int64)
+        self.validCount = 0
+        self.totalCount = 0
+        self.minimum = None
+        self.maximum = None
+        self.mean = 0.0
+        self.sumSqDiff = 0.0   # sum of squared differences from the mean (M2)
+
+    def update(self, validValues, windowPixels):
+        # Adds a window - validValues is a 1D array of the valid (unmasked) pixels, windowPixels the window size.
+        self.totalCount += windowPixels
+        count = validValues.size
+        if count == 0:
+            return
+        windowMean = validValues.sum(dtype=numpy.float64) / count
+        diffs = numpy.subtract(validValues, windowMean, dtype=numpy.float64)
+        windowSumSqDiff = float(numpy.dot(diffs, diffs))
+        del diffs
+        windowMin = float(validValues.min())
+        windowMax = float(validValues.max())
+
+        newCount = self.validCount + count
+        delta = windowMean - self.mean
+        self.mean += delta * count / newCount
+        self.sumSqDiff += windowSumSqDiff + delta * delta * self.validCount * count / newCount
+        self.validCount = newCount
+        self.minimum = windowMin if self.minimum is None else min(self.minimum, windowMin)
+        self.maximum = windowMax if self.maximum is None else max(self.maximum, windowMax)
+        self.histogram += numpy.histogram(validValues, bins=self.histogram.size,
+                                          range=(self.histMin, self.histMax))[0]
+
+    def stdDev(self):
+        if self.validCount == 0:
+            return 0.0
+        return (self.sumSqDiff / self.validCount) ** 0.5
+
+    def toDict(self):
+        return {"min": self.minimum, "max": self.maximum, "mean": self.mean, "stdDev": self.stdDev(),
+                "validCount": self.validCount, "totalCount": self.totalCount,
+                "validPercent": 100.0 * self.validCount / self.totalCount if self.totalCount > 0 else 0.0,
+                "histogram": {"min": self.histMin, "max": self.histMax, "buckets": self.histogram.tolist()}}
+
+
+class RunMetrics(object):
+    """
+        Collects the metrics of one run, for WriteRunMetrics():
+          'stageSeconds': stage name -> seconds (i.e. 'download', 'transform', 'load', 'maintenance', 'refresh').
+          'fileSeconds':  list of {'stage', 'file', 'seconds'} - the time each file took within a stage.
+          'counters':     counter name -> value (i.e. 'download_bytes', 'pixels_masked').
+        Thread safe, as the concurrent downloads record into it from several threads.
+    """
+
+    def __init__(self, mode=""):
+        self.lock = threading.Lock()
+        self.mode = mode
+        self.startTime = time.time()
+        self.stageSeconds = {}
+        self.fileSeconds = []
+        self.counters = {}
+
+    def addStageTime(self, stage, seconds):
+        with self.lock:
+            self.stageSeconds[stage] = self.stageSeconds.get(stage, 0.0) + seconds
+
+    def addFileTime(self, stage, fileName, seconds):
+        with self.lock:
+            self.fileSeconds.append({"stage": stage, "file": fileName, "seconds": seconds})
+
+    def increment(self, counterName, amount=1):
+        with self.lock:
+            self.counters[counterName] = self.counters.get(counterName, 0) + amount
+
+    def toDict(self, bSucceeded):
+        with self.lock:
+            runDict = {"start": datetime.datetime.fromtimestamp(self.startTime).strftime('%Y-%m-%dT%H:%M:%S'),
+                       "mode": self.mode,
+                       "succeeded": bSucceeded,
+                       "durationSeconds": time.time() - self.startTime,
+                       "stageSeconds": dict(self.stageSeconds),
+                       "fileSeconds": list(self.fileSeconds),
+                       "counters": dict(self.counters)}
+        if runDict["stageSeconds"].get("download", 0) > 0:
+            runDict["counters"]["download_bytes_per_second"] = (runDict["counters"].get("download_bytes", 0) /
+                                                                runDict["stageSeconds"]["download"])
+        return runDict
+
+
+class MetricsTimer(object):
+    """
+        Context manager that times a stage of the run - or, with a fileName, one file within a stage - and records it
+        in the run metrics. i.e.
+            with MetricsTimer("download", fileName):
+                ...
+        The elapsed seconds are also kept on the timer (.seconds) once the block exits.
+    """
+
+    def __init__(self, stage, fileName=None):
+        self.stage = stage
+        self.fileName = fileName
+        self.startTime = None
+        self.seconds = None
+
+    def __enter__(self):
+        self.startTime = time.time()
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        self.seconds = time.time() - self.startTime
+        if self.fileName is None:
+            runMetrics.addStageTime(self.stage, self.seconds)
+        else:
+            runMetrics.addFileTime(self.stage, self.fileName, self.seconds)
+        return False
+
+
+class SQLiteUpdateCursor(object):
+    """
+        A stand-in for arcpy.da.UpdateCursor on a table in a SQLite (or GeoPackage) database, so the mosaic attribute
+        updates can be run and tested without ArcGIS. The dataset is given as <database file>/<table name>, the same
+        form as <GDB path>/<mosaic dataset name>. Like the arcpy cursor it is used in a 'with' block: rows are yielded
+        as lists of the requested fields and written back with updateRow(), and the changes are committed when the
+        block exits without an error.
+    """
+
+    def __init__(self, targetDataset, fieldNames, whereClause=None):
+        dbFile, self.tableName = os.path.split(targetDataset)
+        self.fieldNames = list(fieldNames)
+        self.connection = sqlite3.connect(dbFile)
+        sql = "SELECT rowid, {0} FROM {1}".format(", ".join(self.fieldNames), self.tableName)
+        if whereClause:
+            sql += " WHERE " + whereClause
+        self.rows = self.connection.execute(sql).fetchall()
+        self.currentRowId = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        if excType is None:
+            self.connection.commit()
+        else:
+            self.connection.rollback()
+        self.connection.close()
+        return False
+
+    def __iter__(self):
+        for row in self.rows:
+            self.currentRowId = row[0]
+            yield list(row[1:])
+
+    def updateRow(self, row):
+        setClause = ", ".join([fieldName + " = ?" for fieldName in self.fieldNames])
+        self.connection.execute("UPDATE {0} SET {1} WHERE rowid = ?".format(self.tableName, setClause),
+                                list(row) + [self.currentRowId])
+
+
+class MosaicAttributeWriter(object):
+    """
+        Collects the attribute updates (raster name -> attribute values) for the rasters loaded into the mosaic
+        datasets, and applies them with one update cursor per mosaic dataset - instead of one cursor (and table scan)
+        per raster. updateCursorClass is the mosaic store's openUpdateCursor by default; SQLiteUpdateCursor (or
+        arcpy.da.UpdateCursor) can be used in its place.
+    """
+
+    def __init__(self, attrNameList, updateCursorClass=None):
+        self.attrNameList = list(attrNameList)
+        self.updateCursorClass = updateCursorClass
+        self.pendingUpdates = {}   # targetDataset -> {raster name (minus extension): [attribute values]}
+
+    def add(self, targetDataset, rasterName_minusExt, attrExprList):
+        self.pendingUpdates.setdefault(targetDataset, {})[rasterName_minusExt] = list(attrExprList)
+
+    def apply(self):
+        """
+            Applies the pending updates and returns the set of (targetDataset, raster name) that were updated. A
+            failure in one mosaic dataset is logged and doesn't stop the others.
+        """
+        updateCursorClass = self.updateCursorClass or GetMosaicStore().openUpdateCursor
+        updatedRasters = set()
+        for targetDataset, nameValues in self.pendingUpdates.items():
+            wClause = "Name IN ({0})".format(", ".join(["'" + rasterName.replace("'", "''") + "'"
+                                                         for rasterName in sorted(nameValues)]))
+            try:
+                with updateCursorClass(targetDataset, ["Name"] + self.attrNameList, wClause) as cursor:
+                    for row in cursor:
+                        attrExprList = nameValues.get(row[0])
+                        if attrExprList is not None:
+                            cursor.updateRow([row[0]] + attrExprList)
+                            updatedRasters.add((targetDataset, row[0]))
+            except:
+                err = capture_exception()
+                logging.warning("\t...Raster attributes not set in {0}. Error = {1}".format(targetDataset, err))
+
+            for rasterName in nameValues:
+                if (targetDataset, rasterName) not in updatedRasters:
+                    logging.warning("\t...Raster attributes not set for raster {0}.".format(rasterName))
+        self.pendingUpdates = {}
+        return updatedRasters
+
+
+class MosaicStore(object):
+    """
+        The interface to where the transformed rasters are loaded (everything after the transform). Implementations:
+          FileGDBMosaicStore - Esri file geodatabase mosaic datasets, via arcpy (the default).
+          GDALMosaicStore    - a SQLite index table per mosaic (raster name, path, and time attributes) plus a GDAL
+                               VRT of the latest raster - no ArcGIS needed.
+        Mosaic datasets are addressed by the path returned from getDatasetPath(), and where clauses use the same SQL
+        for both (i.e. "Name IN ('IMERG1Day')").
+    """
+
+    def getDatasetPath(self, datasetName):
+        raise NotImplementedError()
+
+    def listRasters(self, folder):
+        # Returns the names of the tif rasters in folder.
+        raise NotImplementedError()
+
+    def deleteFile(self, rasterFile):
+        # Deletes a raster file (and its side car files).
+        raise NotImplementedError()
+
+    def addRasters(self, targetDataset, rasterFiles, duplicatesAction, buildPyramids, calculateStatistics,
+                   updateBoundary="NO_BOUNDARY"):
+        # Adds the rasterFiles to the mosaic. duplicatesAction/buildPyramids/calculateStatistics take the
+        # AddRastersToMosaicDataset keywords (i.e. 'OVERWRITE_DUPLICATES', 'NO_PYRAMIDS', 'CALCULATE_STATISTICS').
+        raise NotImplementedError()
+
+    def removeRasters(self, targetDataset, whereClause):
+        raise NotImplementedError()
+
+    def openUpdateCursor(self, targetDataset, fieldNames, whereClause=None):
+        # Returns an arcpy.da.UpdateCursor style cursor (see MosaicAttributeWriter).
+        raise NotImplementedError()
+
+    def compact(self):
+        raise NotImplementedError()
+
+    def getFileSizes(self):
+        # Returns a dictionary of file name -> size (bytes) for the files that make up the store.
+        raise NotImplementedError()
+
+
+class FileGDBMosaicStore(MosaicStore):
+    """
+        Mosaic datasets in an Esri file geodatabase (the 'GDBPath' setting), loaded with arcpy.
+    """
+
+    def __init__(self):
+        if ImportArcPy() is None:
+            raise RuntimeError("The 'filegdb' mosaic store requires arcpy.")
+        self.gdbPath = GetConfigString("GDBPath")
+        arcpy.env.overwriteOutput = True
+
+    def getDatasetPath(self, datasetName):
+        return os.path.join(self.gdbPath, datasetName)
+
+    def listRasters(self, folder):
+        arcpy.env.workspace = folder
+        return arcpy.ListRasters()
+
+    def deleteFile(self, rasterFile):
+        arcpy.Delete_management(rasterFile)
+
+    def addRasters(self, targetDataset, rasterFiles, duplicatesAction, buildPyramids, calculateStatistics,
+                   updateBoundary="NO_BOUNDARY"):
+        arcpy.AddRastersToMosaicDataset_management(targetDataset, "Raster Dataset", ";".join(rasterFiles),
+                                                   "UPDATE_CELL_SIZES", updateBoundary, "NO_OVERVIEWS",
+                                                   "2", "#", "#", "#", "#", "NO_SUBFOLDERS",
+                                                   duplicatesAction, buildPyramids,
+                                                   calculateStatistics, "NO_THUMBNAILS",
+                                                   "Add Raster Datasets", "#")
+
+    def removeRasters(self, targetDataset, whereClause):
+        arcpy.RemoveRastersFromMosaicDataset_management(targetDataset, whereClause, "NO_BOUNDARY",
+                                                        "NO_MARK_OVERVIEW_ITEMS", "NO_DELETE_OVERVIEW_IMAGES",
+                                                        "NO_DELETE_ITEM_CACHE", "REMOVE_MOSAICDATASET_ITEMS",
+                                                        "NO_CELL_SIZES")
+
+    def openUpdateCursor(self, targetDataset, fieldNames, whereClause=None):
+        return arcpy.da.UpdateCursor(targetDataset, fieldNames, whereClause)
+
+    def compact(self):
+        arcpy.Compact_management(self.gdbPath)
+
+    def getFileSizes(self):
+        fileSizes = {}
+        if os.path.isdir(self.gdbPath):
+            for fileName in os.listdir(self.gdbPath):
+                if not fileName.endswith(".lock"):
+                    fileSizes[fileName] = os.path.getsize(os.path.join(self.gdbPath, fileName))
+        return fileSizes
+
+
+class GDALMosaicStore(MosaicStore):
+    """
+        Mosaics kept as tables in a SQLite index database (the 'mosaic_IndexPath' setting) - one row per raster with
+        its Name, Path, and start/end time attributes, so rasters can be looked up by time (like a STAC item
+        collection). After each change a GDAL VRT (<index folder>/<mosaic name>.vrt) is rebuilt pointing at the
+        mosaic's latest raster, for GDAL based clients. Needs GDAL but not arcpy.
+    """
+
+    def __init__(self):
+        if not ImportGDAL():
+            raise RuntimeError("The 'gdal' mosaic store requires GDAL.")
+        self.indexPath = GetConfigString("mosaic_IndexPath")
+        self.attrNameList = [GetConfigString('rasterStartTimeProperty'), GetConfigString('rasterEndTimeProperty')]
+
+    def getDatasetPath(self, datasetName):
+        return os.path.join(self.indexPath, datasetName)
+
+    def listRasters(self, folder):
+        return sorted([f for f in os.listdir(folder) if f.lower().endswith(".tif")])
+
+    def deleteFile(self, rasterFile):
+        for sideCarFile in [rasterFile, rasterFile + ".aux.xml", rasterFile + ".ovr"]:
+            if os.path.exists(sideCarFile):
+                os.remove(sideCarFile)
+
+    def connect(self, targetDataset):
+        # Opens the index database and makes sure the mosaic's table exists. Returns (connection, table name).
+        tableName = os.path.basename(targetDataset)
+        connection = sqlite3.connect(self.indexPath)
+        connection.execute("CREATE TABLE IF NOT EXISTS {0} (Name TEXT, Path TEXT, {1} TEXT, {2} TEXT, "
+                           "Added TEXT)".format(tableName, self.attrNameList[0], self.attrNameList[1]))
+        return connection, tableName
+
+    def addRasters(self, targetDataset, rasterFiles, duplicatesAction, buildPyramids, calculateStatistics,
+                   updateBoundary="NO_BOUNDARY"):
+        # Pyramids and statistics are built on the raster files themselves (external .ovr / .aux.xml).
+        for rasterFile in rasterFiles:
+            if buildPyramids == "BUILD_PYRAMIDS" or calculateStatistics == "CALCULATE_STATISTICS":
+                rasterDS = gdal.Open(rasterFile, gdal.GA_ReadOnly)
+                if calculateStatistics == "CALCULATE_STATISTICS":
+                    for bandNum in range(1, rasterDS.RasterCount + 1):
+                        rasterDS.GetRasterBand(bandNum).ComputeStatistics(False)
+                if buildPyramids == "BUILD_PYRAMIDS":
+                    overviewLevels = GetOverviewLevels(rasterDS.RasterXSize, rasterDS.RasterYSize)
+                    if len(overviewLevels) > 0:
+                        rasterDS.BuildOverviews("AVERAGE", overviewLevels)
+                rasterDS = None
+
+        connection, tableName = self.connect(targetDataset)
+        try:
+            for rasterFile in rasterFiles:
+                rasterName = os.path.splitext(os.path.basename(rasterFile))[0]
+                bExists = connection.execute("SELECT COUNT(*) FROM {0} WHERE Name = ?".format(tableName),
+                                             [rasterName]).fetchone()[0] > 0
+                if bExists and duplicatesAction == "EXCLUDE_DUPLICATES":
+                    continue
+                if bExists and duplicatesAction == "OVERWRITE_DUPLICATES":
+                    connection.execute("DELETE FROM {0} WHERE Name = ?".format(tableName), [rasterName])
+                connection.execute("INSERT INTO {0} (Name, Path, Added) VALUES (?, ?, ?)".format(tableName),
+                                   [rasterName, rasterFile, datetime.datetime.now()])
+            connection.commit()
+        finally:
+            connection.close()
+        self.updateVRT(targetDataset)
+
+    def removeRasters(self, targetDataset, whereClause):
+        connection, tableName = self.connect(targetDataset)
+        try:
+            connection.execute("DELETE FROM {0} WHERE {1}".format(tableName, whereClause))
+            connection.commit()
+        finally:
+            connection.close()
+        self.updateVRT(targetDataset)
+
+    def openUpdateCursor(self, targetDataset, fieldNames, whereClause=None):
+        self.connect(targetDataset)[0].close()
+        return GDALIndexUpdateCursor(self, targetDataset, fieldNames, whereClause)
+
+    def updateVRT(self, targetDataset):
+        # Points <mosaic name>.vrt at the raster with the latest end time (a raster without times yet was just
+        # added, so it counts as the latest).
+        connection, tableName = self.connect(targetDataset)
+        try:
+            endTimeField = self.attrNameList[1]
+            latestRow = connection.execute("SELECT Path FROM {0} ORDER BY ({1} IS NULL) DESC, {1} DESC, "
+                                           "rowid DESC LIMIT 1".format(tableName, endTimeField)).fetchone()
+        finally:
+            connection.close()
+        vrtFile = os.path.join(os.path.dirname(self.indexPath), tableName + ".vrt")
+        if latestRow is None:
+            if os.path.exists(vrtFile):
+                os.remove(vrtFile)
+            return
+        vrtDS = gdal.BuildVRT(vrtFile, [str(latestRow[0])])
+        if vrtDS is None:
+            raise RuntimeError("Unable to build {0} from {1}".format(vrtFile, latestRow[0]))
+        # The VRT file is only written out when the dataset is flushed - release the handle now instead of leaving it
+        # to the garbage collector.
+        vrtDS.FlushCache()
+        vrtDS = None
+
+    def compact(self):
+        connection = sqlite3.connect(self.indexPath)
+        try:
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+
+    def getFileSizes(self):
+        if not os.path.isfile(self.indexPath):
+            return {}
+        return {os.path.basename(self.indexPath): os.path.getsize(self.indexPath)}
+
+
+class GDALIndexUpdateCursor(SQLiteUpdateCursor):
+    # SQLiteUpdateCursor for GDALMosaicStore - the mosaic's VRT is rebuilt once the updates are committed.
+
+    def __init__(self, store, targetDataset, fieldNames, whereClause=None):
+        SQLiteUpdateCursor.__init__(self, targetDataset, fieldNames, whereClause)
+        self.store = store
+        self.targetDataset = targetDataset
+
+    def __exit__(self, excType, excValue, tb):
+        SQLiteUpdateCursor.__exit__(self, excType, excValue, tb)
+        if excType is None:
+            self.store.updateVRT(self.targetDataset)
+        return False
+
+
+class PooledHTTPResponse(object):
+    """
+        A wrapper around an httplib response that behaves like a urllib2 response (getcode(), info(), read(), close()).
+        Once the body has been read to the end, the connection is handed back to its HTTPConnectionPool so the next
+        request to the same host can reuse it (keep-alive). If the body is not read to the end, the connection can't
+        be reused and is closed.
+    """
+
+    def __init__(self, pool, poolKey, conn, response, url):
+        self.pool = pool
+        self.poolKey = poolKey
+        self.conn = conn
+        self.response = response
+        self.url = url
+
+    def getcode(self):
+        return self.response.status
+
+    def geturl(self):
+        return self.url
+
+    def info(self):
+        return self.response.msg
+
+    def read(self, amt=None):
+        if amt is None:
+            data = self.response.read()
+        else:
+            data = self.response.read(amt)
+        if self.response.isclosed():
+            self.release()
+        return data
+
+    def release(self):
+        # Give the connection back to the pool (or close it if it can't be reused).
+        if self.conn is not None:
+            if self.response.isclosed() and not self.response.will_close:
+                self.pool.releaseConnection(self.poolKey, self.conn)
+            else:
+                self.conn.close()
+            self.conn = None
+
+    def close(self):
+        self.release()
+
+
+class HTTPConnectionPool(object):
+    """
+        A thread safe pool of keep-alive httplib connections, kept per (scheme, host, port). Requests made through
+        open() reuse an idle connection to the same host when there is one, so the TCP and TLS handshakes are only done
+        once per connection instead of once per request. Up to maxIdlePerHost idle connections are kept per host.
+    """
+
+    def __init__(self, maxIdlePerHost=4, timeout=120):
+        self.maxIdlePerHost = maxIdlePerHost
+        self.timeout = timeout
+        self.idleConnections = {}
+        self.lock = threading.Lock()
+
+    def getConnection(self, poolKey):
+        with self.lock:
+            idle = self.idleConnections.get(poolKey, [])
+            if len(idle) > 0:
+                return idle.pop(), True
+        scheme, host, port = poolKey
+        if scheme == "https":
+            return httplib.HTTPSConnection(host, port, timeout=self.timeout), False
+        return httplib.HTTPConnection(host, port, timeout=self.timeout), False
+
+    def releaseConnection(self, poolKey, conn):
+        with self.lock:
+            idle = self.idleConnections.setdefault(poolKey, [])
+            if len(idle) < self.maxIdlePerHost:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def closeAll(self):
+        with self.lock:
+            for idle in self.idleConnections.values():
+                for conn in idle:
+                    conn.close()
+            self.idleConnections = {}
+
+    def open(self, url, data=None, headers=None, maxRedirects=5):
+        """
+            Sends a GET (or a POST if data is passed in) and returns a PooledHTTPResponse. Redirects are followed, and
+            like urllib2.urlopen() an HTTP error status raises a urllib2.HTTPError.
+        """
+        reqHeaders = {"Connection": "keep-alive"}
+        if headers is not None:
+            reqHeaders.update(headers)
+        method = "GET"
+        if data is not None:
+            method = "POST"
+            reqHeaders["Content-Type"] = "application/x-www-form-urlencoded"
+
+        parsedURL = urlparse.urlsplit(url)
+        defaultPort = 443 if parsedURL.scheme == "https" else 80
+        poolKey = (parsedURL.scheme, parsedURL.hostname, parsedURL.port or defaultPort)
+        path = parsedURL.path or "/"
+        if parsedURL.query:
+            path += "?" + parsedURL.query
+
+        conn, bReused = self.getConnection(poolKey)
+        try:
+            conn.request(method, path, data, reqHeaders)
+            response = conn.getresponse()
+        except (httplib.HTTPException, IOError):
+            conn.close()
+            if not bReused:
+                raise
+            # The server closed the idle connection - try again on a new one.
+            conn = self.getConnection(poolKey)[0]
+            try:
+                conn.request(method, path, data, reqHeaders)
+                response = conn.getresponse()
+            except:
+                conn.close()
+                raise
+
+        pooledResponse = PooledHTTPResponse(self, poolKey, conn, response, url)
+        if response.status in (301, 302, 303, 307) and maxRedirects > 0:
+            location = urlparse.urljoin(url, response.getheader("Location", ""))
+            pooledResponse.read()
+            pooledResponse.close()
+            if response.status == 303:
+                data = None
+            return self.open(location, data, headers, maxRedirects - 1)
+        if response.status >= 400:
+            pooledResponse.read()
+            pooledResponse.close()
+            raise urllib2.HTTPError(url, response.status, response.reason, response.msg, None)
+        return pooledResponse
+
+
+# The half hourly (30 minute) IMERG files are the slots that the 'halfhourly' accumulation source adds up.
+#   3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.30min.tif
+HalfHourlyPeriod = "30min"
+HalfHourlySlot = datetime.timedelta(minutes=30)
+
+
+class MemorySlotStore(object):
+    """
+        A ring buffer of half hourly slot grids, held in memory, for the RollingAccumulator. It has room for
+        'capacity' slots (i.e. 336 for 7 days of 30 minute slots). Each slot start date/time maps to a fixed position
+        in the ring, so storing a slot replaces the one that is 'capacity' slots older.
+          'getSlot(oSlotStart)':  the grid stored for the slot, or None if it isn't held (never stored, or replaced).
+          'putSlot(oSlotStart, grid)':  stores the grid for the slot.
+          'getWindow(oFirst, oLast)':  list of (slot start, grid) for the slots held from oFirst to oLast, oldest first.
+          'newSum(productName, shape)':  a zeroed int32 grid for the running sum of a product.
+          'loadState()', 'saveState(accumulator)', 'markDirty()':  keep the accumulator state between runs - nothing
+                                                                  is kept by this store (see MemoryMappedSlotStore).
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.starts = [None] * capacity
+        self.grids = [None] * capacity
+
+    def position(self, oSlotStart):
+        return GetSlotNumber(oSlotStart) % self.capacity
+
+    def getSlot(self, oSlotStart):
+        pos = self.position(oSlotStart)
+        if self.starts[pos] != oSlotStart:
+            return None
+        return self.grids[pos]
+
+    def putSlot(self, oSlotStart, grid):
+        pos = self.position(oSlotStart)
+        self.starts[pos] = oSlotStart
+        self.grids[pos] = grid
+
+    def getWindow(self, oFirst, oLast):
+        return sorted((oStart, self.grids[pos]) for pos, oStart in enumerate(self.starts)
+                      if oStart is not None and oFirst <= oStart <= oLast)
+
+    def newSum(self, productName, shape):
+        return numpy.zeros(shape, numpy.int32)
+
+    def loadState(self, productNames):
+        return None
+
+    def saveState(self, accumulator):
+        pass
+
+    def markDirty(self):
+        pass
+
+
+class MemoryMappedSlotStore(MemorySlotStore):
+    """
+        A ring buffer of half hourly slot grids kept on disk, for the RollingAccumulator - so the slots, and the
+        running sums, survive a restart and a week of half hourly files doesn't have to be downloaded again.
+        In the store folder:
+          'Slot_000.grid' ...   one raw int16 file per ring position, opened as a numpy.memmap. Replacing a slot
+                                 writes that one file in place - nothing else is read or moved. The grid is followed
+                                 by an 8 byte trailer holding the number of the slot it holds (see GetSlotNumber()),
+                                 which is cleared while the grid is being written.
+          'Sum_1Day.grid' ...   the running int32 sum of each product, also a numpy.memmap, updated in place.
+          'SlotIndex.json':     the slot index - each slot start (formatted with 'Filename_StartDateFormat', and
+                                 parsed back with Get_StartDateTime_FromString()) -> its ring position, along with the
+                                 accumulator state saved by saveState() (latest slot, slot counts, grid shape, and
+                                 georeference).
+        getSlot() and getWindow() return read only memmaps, so reading a window copies nothing - only the pages that
+        are actually used are read from disk.
+        The index is marked dirty while the sums are being changed (markDirty()) and clean again by saveState(), so if
+        the process stops in between, loadState() returns no sums and the accumulator rebuilds them from the slots. A
+        slot is only in the index once its grid is completely written, and a slot whose file trailer doesn't hold its
+        number (the process stopped while the file was being replaced) is dropped when the index is read.
+    """
+
+    # Trailer value of a slot file whose grid is being written
+    NoSlotNumber = -1
+
+    def __init__(self, folder, capacity):
+        MemorySlotStore.__init__(self, capacity)
+        self.folder = folder
+        self.indexFile = os.path.join(folder, "SlotIndex.json")
+        self.dateRegExp = GetConfigString("RegEx_StartDateFilterString")
+        self.dateFormat = GetConfigString("Filename_StartDateFormat")
+        self.positions = {}
+        self.state = None
+        self.sums = {}
+        self.bDirty = False
+
+        index = None
+        try:
+            readableFile = GetReadableFile(self.indexFile)
+            if os.path.isfile(readableFile):
+                with open(readableFile, "r") as jf:
+                    index = json.load(jf)
+        except:
+            logging.warning("Unable to read slot index {0}: {1}".format(self.indexFile, capture_exception()))
+        if index is None or index.get("capacity") != capacity:
+            return
+        self.state = index.get("state")
+        self.bDirty = not index.get("clean", False)
+        for sSlotStart, pos in index.get("slots", {}).items():
+            oSlotStart = Get_StartDateTime_FromString(sSlotStart, self.dateRegExp, self.dateFormat)
+            if oSlotStart is None or pos != self.position(oSlotStart):
+                continue
+            if self.state is None or self.readSlotNumber(pos) != GetSlotNumber(oSlotStart):
+                logging.warning("Half hourly slot {0} was not completely written, dropping it.".format(sSlotStart))
+                self.bDirty = True
+                continue
+            self.positions[oSlotStart] = pos
+
+    def writeIndex(self):
+        # Writes the slot index to a temp file first, so a partly written index is never read.
+        index = {"capacity": self.capacity,
+                 "clean": not self.bDirty,
+                 "slots": dict((oSlotStart.strftime(self.dateFormat), pos)
+                               for oSlotStart, pos in self.positions.items()),
+                 "state": self.state}
+        with open(self.indexFile + ".tmp", "w") as jf:
+            json.dump(index, jf)
+        ReplaceFile(self.indexFile + ".tmp", self.indexFile)
+
+    def openGrid(self, fileName, dtype, shape, mode, trailerBytes=0):
+        # Opens a grid file as a memmap - a missing (or wrong sized) file is created, zero filled, in 'r+' mode.
+        # trailerBytes is the size of anything stored after the grid (not part of the memmap).
+        gridFile = os.path.join(self.folder, fileName)
+        numBytes = numpy.dtype(dtype).itemsize * shape[0] * shape[1]
+        if mode == "r+" and (not os.path.isfile(gridFile) or os.path.getsize(gridFile) != numBytes + trailerBytes):
+            with open(gridFile, "wb") as gf:
+                gf.truncate(numBytes + trailerBytes)
+        return numpy.memmap(gridFile, dtype=dtype, mode=mode, shape=tuple(shape))
+
+    def slotFileName(self, pos):
+        return "Slot_{0:03d}.grid".format(pos)
+
+    def slotGridBytes(self):
+        return numpy.dtype(numpy.int16).itemsize * self.state["shape"][0] * self.state["shape"][1]
+
+    def readSlotNumber(self, pos):
+        # Returns the slot number in the trailer of a slot file, or None if the file is missing or the wrong size.
+        try:
+            with open(os.path.join(self.folder, self.slotFileName(pos)), "rb") as sf:
+                sf.seek(self.slotGridBytes())
+                trailer = sf.read(8)
+        except (IOError, OSError):
+            return None
+        if len(trailer) != 8:
+            return None
+        return struct.unpack("<q", trailer)[0]
+
+    def writeSlotNumber(self, pos, slotNumber):
+        with open(os.path.join(self.folder, self.slotFileName(pos)), "r+b") as sf:
+            sf.seek(self.slotGridBytes())
+            sf.write(struct.pack("<q", slotNumber))
+            sf.flush()
+            os.fsync(sf.fileno())
+
+    def getSlot(self, oSlotStart):
+        pos = self.positions.get(oSlotStart)
+        if pos is None or self.state is None:
+            return None
+        return self.openGrid(self.slotFileName(pos), numpy.int16, self.state["shape"], "r")
+
+    def putSlot(self, oSlotStart, grid):
+        # The trailer is cleared while the grid is overwritten, so a slot that is replaced part way (the process
+        # stops) is never read back as either slot. The index is written once, after the grid is flushed.
+        pos = self.position(oSlotStart)
+        if self.state is None:
+            self.state = {"shape": list(grid.shape)}
+        for oHeld in [o for o, p in self.positions.items() if p == pos]:
+            del self.positions[oHeld]
+        slotGrid = self.openGrid(self.slotFileName(pos), numpy.int16, grid.shape, "r+", 8)
+        self.writeSlotNumber(pos, self.NoSlotNumber)
+        slotGrid[:] = grid
+        slotGrid.flush()
+        del slotGrid
+        self.writeSlotNumber(pos, GetSlotNumber(oSlotStart))
+        self.positions[oSlotStart] = pos
+        self.writeIndex()
+
+    def getWindow(self, oFirst, oLast):
+        return [(oSlotStart, self.getSlot(oSlotStart)) for oSlotStart in sorted(self.positions)
+                if oFirst <= oSlotStart <= oLast]
+
+    def newSum(self, productName, shape):
+        # An open sum of the right shape is zeroed in place (a mapped file can't be recreated on Windows).
+        sumGrid = self.sums.get(productName)
+        if sumGrid is not None and sumGrid.shape == tuple(shape):
+            sumGrid.fill(0)
+        else:
+            self.sums.pop(productName, None)
+            sumGrid = numpy.memmap(os.path.join(self.folder, "Sum_{0}.grid".format(productName)), dtype=numpy.int32,
+                                   mode="w+", shape=tuple(shape))
+            self.sums[productName] = sumGrid
+        return sumGrid
+
+    def loadState(self, productNames):
+        """
+            Returns the accumulator state saved by saveState() - a dictionary with the keys 'latestSlot',
+            'slotCounts', 'shape', 'georeference', and 'sums' (product name -> memmap) - or None if nothing is stored.
+            'sums' is None if they have to be rebuilt from the slots (the store is dirty, or a product is new).
+        """
+        if self.state is None or len(self.positions) == 0:
+            return None
+        state = {"latestSlot": None, "slotCounts": None, "sums": None, "shape": tuple(self.state["shape"]),
+                 "georeference": self.state.get("georeference")}
+        if state["georeference"] is not None:
+            state["georeference"] = (tuple(state["georeference"][0]), state["georeference"][1])
+        slotCounts = self.state.get("slotCounts", {})
+        if self.bDirty or self.state.get("latestSlot") is None or \
+                not all(productName in slotCounts for productName in productNames):
+            return state
+        state["latestSlot"] = datetime.datetime.strptime(self.state["latestSlot"], '%Y-%m-%d %H:%M:%S')
+        state["slotCounts"] = dict((productName, slotCounts[productName]) for productName in productNames)
+        for productName in productNames:
+            self.sums[productName] = self.openGrid("Sum_{0}.grid".format(productName), numpy.int32, state["shape"],
+                                                   "r+")
+        state["sums"] = dict((productName, self.sums[productName]) for productName in productNames)
+        return state
+
+    def saveState(self, accumulator):
+        # Flushes the sums and saves the accumulator state with the index, marking the store clean again.
+        if accumulator.latestSlot is None:
+            return
+        for sumGrid in accumulator.sums.values():
+            sumGrid.flush()
+        self.state = {"shape": list(accumulator.shape),
+                      "latestSlot": accumulator.latestSlot.strftime('%Y-%m-%d %H:%M:%S'),
+                      "slotCounts": accumulator.slotCounts,
+                      "georeference": accumulator.georeference}
+        self.bDirty = False
+        self.writeIndex()
+
+    def markDirty(self):
+        if not self.bDirty:
+            self.bDirty = True
+            self.writeIndex()
+
+
+class RollingAccumulator(object):
+    """
+        A class that keeps a running sum of the half hourly slot grids for each product (i.e. 1, 3, and 7 day), so that
+        each new slot costs one add (and one subtract per product, for the slot leaving its window) instead of summing
+        the whole window again.
+          'periodSlots':  dictionary of product name -> number of slots in its window.  i.e. {'1Day': 48, ...}
+          'latestSlot':   start date/time of the latest slot added - every window ends with this slot.
+          'sums':         dictionary of product name -> int32 grid, the sum of the slots in its window.
+          'slotCounts':   dictionary of product name -> number of slots in its window that were added.
+          'georeference': (geotransform, projection) of the slot grids, used when the sums are written out.
+        Slot grids hold the raw int16 values, with the pixels outside of the range we keep already set to 0, so the
+        integer sums are exact - adding and later subtracting the same slot never drifts.
+        The slots themselves are kept in the slot store (a MemorySlotStore or MemoryMappedSlotStore) with room for the
+        longest window. The state kept by the store from a previous run is picked up when the accumulator is created.
+    """
+
+    def __init__(self, slotStore, periodSlots):
+        self.slotStore = slotStore
+        self.periodSlots = dict(periodSlots)
+        self.latestSlot = None
+        self.sums = {}
+        self.slotCounts = {}
+        self.shape = None
+        self.georeference = None
+
+        state = slotStore.loadState(list(self.periodSlots))
+        if state is not None:
+            self.shape = state["shape"]
+            self.georeference = state["georeference"]
+            if state["sums"] is not None:
+                self.latestSlot = state["latestSlot"]
+                self.slotCounts = state["slotCounts"]
+                self.sums = state["sums"]
+            else:
+                self.rebuild()
+
+    def rebuild(self):
+        # Sums the slots held by the store again - only needed if the saved sums can't be used.
+        heldSlots = self.slotStore.getWindow(datetime.datetime.min, datetime.datetime.max)
+        if len(heldSlots) == 0:
+            return
+        logging.info("Rebuilding the accumulation sums from {0} stored half hourly slots.".format(len(heldSlots)))
+        self.slotStore.markDirty()
+        self.latestSlot = heldSlots[-1][0]
+        for productName in self.periodSlots:
+            self.sums[productName] = self.slotStore.newSum(productName, self.shape)
+            self.slotCounts[productName] = 0
+            for oSlotStart, grid in self.slotStore.getWindow(self.windowStart(productName), self.latestSlot):
+                numpy.add(self.sums[productName], grid, out=self.sums[productName])
+                self.slotCounts[productName] += 1
+        self.save()
+
+    def save(self):
+        # Has the slot store keep the sums and state (see MemoryMappedSlotStore).
+        self.slotStore.saveState(self)
+
+    def windowStart(self, productName):
+        # The start date/time of the first slot in the product's window.
+        return self.latestSlot - HalfHourlySlot * (self.periodSlots[productName] - 1)
+
+    def isWindowComplete(self, productName, maxMissingSlots=0):
+        if self.latestSlot is None:
+            return False
+        return self.slotCounts[productName] >= self.periodSlots[productName] - maxMissingSlots
+
+    def advanceTo(self, oNewLatest):
+        # Moves every window forward so that it ends with oNewLatest, subtracting the slots that drop out of it.
+        numSteps = None
+        if self.latestSlot is not None:
+            numSteps = GetSlotNumber(oNewLatest) - GetSlotNumber(self.latestSlot)
+        for productName, numSlots in self.periodSlots.items():
+            if numSteps is None or numSteps >= numSlots:
+                # The whole window drops out - start again from zero.
+                self.sums[productName] = self.slotStore.newSum(productName, self.shape)
+                self.slotCounts[productName] = 0
+                continue
+            oFirst = self.windowStart(productName)
+            for step in range(numSteps):
+                expired = self.slotStore.getSlot(oFirst + HalfHourlySlot * step)
+                if expired is not None:
+                    numpy.subtract(self.sums[productName], expired, out=self.sums[productName])
+                    self.slotCounts[productName] -= 1
+        self.latestSlot = oNewLatest
+
+    def addSlot(self, oSlotStart, grid):
+        """
+            Adds a half hourly slot grid. A slot after the latest one moves the windows forward first, and a slot that
+            arrived late is only added to the windows it falls in. Returns False if the slot was already added or is
+            older than the longest window.
+        """
+        if self.shape is None:
+            self.shape = grid.shape
+        elif grid.shape != self.shape:
+            raise ValueError("Slot grid shape {0} does not match {1}".format(grid.shape, self.shape))
+
+        if self.slotStore.getSlot(oSlotStart) is not None:
+            return False
+        if self.latestSlot is not None and oSlotStart <= self.latestSlot - HalfHourlySlot * self.slotStore.capacity:
+            return False
+        self.slotStore.markDirty()
+        if self.latestSlot is None or oSlotStart > self.latestSlot:
+            self.advanceTo(oSlotStart)
+
+        for productName in self.periodSlots:
+            if self.windowStart(productName) <= oSlotStart:
+                numpy.add(self.sums[productName], grid, out=self.sums[productName])
+                self.slotCounts[productName] += 1
+        self.slotStore.putSlot(oSlotStart, grid)
+        return True
+
+
 def setupArgs():
     # Setup the argparser to capture any arguments...
     parser = argparse.ArgumentParser(__file__,
@@ -119,6 +1249,21 @@ def setupArgs():
     parser.add_argument("-l", "--logging",
                         help="the logging level at which the script should report",
                         type=str, choices=['debug', 'DEBUG', 'info', 'INFO', 'warning', 'WARNING', 'error', 'ERROR'])
+    # Optional backfill arguments - load every 1, 3, and 7 day file in a historical date range (YYYYMMDD).
+    parser.add_argument("--start",
+                        help="backfill: first date (YYYYMMDD) of the range of files to load",
+                        type=str)
+    parser.add_argument("--end",
+                        help="backfill: last date (YYYYMMDD) of the range of files to load (defaults to today)",
+                        type=str)
+    # Optional check - only list the source and report whether there are new files to load.
+    parser.add_argument("--check-only",
+                        help="list the source, report any new files (exit code 1) or none (exit code 0), and exit",
+                        action="store_true")
+    # Optional daemon (watch) mode - stay resident and load new files as they show up.
+    parser.add_argument("--daemon",
+                        help="stay resident, polling the source and loading the latest files when newer ones show up",
+                        action="store_true")
     return parser.parse_args()
 
 
@@ -160,7 +1305,11 @@ def getScriptName():
 
 # Calculate and return time elapsed since input time
 def timeElapsed(timeS):
-    seconds = time.time() - timeS
+    return format_Elapsed_Seconds(time.time() - timeS)
+
+
+# Format a number of seconds as 'SS seconds', 'MM:SS seconds', or 'HH:MM:SS seconds'
+def format_Elapsed_Seconds(seconds):
     hours = seconds // 3600
     seconds -= 3600*hours
     minutes = seconds // 60
@@ -183,15 +1332,80 @@ def get_Elapsed_Time_As_String(timeInput):
     return timeElapsed(timeInput)
 
 
+def LoadConfig(configFile="config.pkl"):
+    # Reads the configuration settings - the dictionary pickled by IMERG_Accumulations_Pickle.py. (The product
+    # registry is built from them, so it is built again on its next use.)
+    global myConfig, productRegistry
+    with open(configFile, "rb") as pkl_file:
+        myConfig = pickle.load(pkl_file)
+    productRegistry = None
+    return myConfig
+
+
+def GetConfig():
+    # Returns the configuration settings, reading config.pkl (from the current folder) on first use.
+    if myConfig is None:
+        LoadConfig()
+    return myConfig
+
+
+def ImportArcPy():
+    """
+        Imports arcpy on first use and returns it, or None if it is not installed. arcpy is only available on ArcGIS
+        machines - everything up to the mosaic load (download, numpy transform) can still run without it.
+    """
+    global arcpy
+    if arcpy is None:
+        try:
+            import arcpy as arcpyModule
+            arcpy = arcpyModule
+        except ImportError:
+            return None
+    return arcpy
+
+
+def ImportGDAL():
+    """
+        Imports numpy and GDAL on first use. Returns True if both are installed. They are required for the "numpy"
+        raster transform engine and the "gdal" mosaic store - if they are not installed, the "arcpy" engine is used.
+        numpy is kept even if GDAL can't be imported (the ArcGIS python has numpy but no osgeo), and the import error
+        is kept in gdalImportError for the warning logged by GetRasterTransformEngineName().
+    """
+    global numpy, gdal, gdalImportError
+    if numpy is None or gdal is None:
+        try:
+            import numpy as numpyModule
+            numpy = numpyModule
+            from osgeo import gdal as gdalModule
+            gdal = gdalModule
+        except ImportError, e:
+            gdalImportError = str(e)
+            return False
+    return True
+
+
 def GetConfigString(variable):
     try:
-        global myConfig
-        return myConfig[variable]
+        return GetConfig()[variable]
     except:
         logging.error("### ERROR ###: Config variable NOT FOUND: {0}".format(variable))
         return ""
 
 
+def GetConfigValue(variable, defaultValue):
+    """
+        Returns the config setting if it exists, otherwise returns the default value passed in. Used for optional
+        settings that may not be present in older config.pkl files.
+    """
+    try:
+        config = GetConfig()
+        if variable in config and config[variable] != "":
+            return config[variable]
+        return defaultValue
+    except:
+        return defaultValue
+
+
 def create_folder(thePath):
     # Creates a directory on the file system if it does not already exist.
     # Then checks to see if the folder exists.
@@ -206,21 +1420,76 @@ def create_folder(thePath):
         return False
 
 
+productRegistry = None
+
+
+def GetProductRegistry():
+    """
+        Returns the AccumulationProductRegistry, built on first use from the built-in 1, 3, and 7 day products (see
+        BuiltInAccumulationProducts) and the optional 'products_Additional' config setting - a list of dictionaries,
+        one per extra product.  i.e.
+            [{'name': '10Day', 'period': '10day', 'days': 10, 'dsName': 'IMERG10Day', 'svcName': 'IMERG_Acc_10Day'}]
+        Each needs 'name', 'period', 'dsName', and either 'days' or 'minutes'. 'backfillDSName', 'loadName', and
+        'svcName' are optional (the load name defaults to 'IMERG' + name, and backfill mode needs 'backfillDSName').
+        The accumulation period is a fixed length (a timedelta) - it sets the start date/time of each loaded raster and
+        the number of half hourly slots summed for it. Calendar month accumulations vary in length, so they can't be
+        described: an entry with 'months' is rejected (logged as an error and left out of the registry).
+    """
+    global productRegistry
+    if productRegistry is None:
+        products = []
+        for pName, sPeriod, accumulationPeriod in BuiltInAccumulationProducts:
+            dsName = GetConfigString(pName + "DSName")
+            products.append(AccumulationProduct(pName, sPeriod, accumulationPeriod, dsName,
+                                                GetConfigValue("backfill_" + pName + "DSName", ""), "",
+                                                GetConfigValue("svc_Name_" + pName, "")))
+        for entry in GetConfigValue("products_Additional", []):
+            try:
+                if "months" in entry:
+                    raise ValueError("calendar month periods ('months') are not supported, the period must be a "
+                                     "fixed number of 'days' or 'minutes'")
+                accumulationPeriod = datetime.timedelta(days=float(entry.get("days", 0)),
+                                                        minutes=float(entry.get("minutes", 0)))
+                if accumulationPeriod <= datetime.timedelta(0):
+                    raise ValueError("'days' or 'minutes' is required")
+                products.append(AccumulationProduct(entry["name"], entry["period"], accumulationPeriod,
+                                                    entry["dsName"], entry.get("backfillDSName", ""),
+                                                    entry.get("loadName", ""), entry.get("svcName", "")))
+            except:
+                logging.error("Invalid 'products_Additional' entry {0}: {1}".format(entry, capture_exception()))
+        productRegistry = AccumulationProductRegistry(products)
+    return productRegistry
+
+
+def GetBackfillDatasetErrors(registry):
+    """
+        Backfill mode loads into its own mosaic datasets - archived rasters keep their original names and times, so
+        loading them into a live mosaic dataset would mix them in with (and be compacted and refreshed along with) the
+        latest rasters. Returns a list of error messages - one for each product with no backfill mosaic dataset, or
+        whose backfill mosaic dataset is also one of the live ones. An empty list means backfill can run.
+    """
+    errors = []
+    liveDSNames = set(product.dsName.lower() for product in registry.products)
+    for product in registry.products:
+        if not product.backfillDSName:
+            errors.append("No backfill mosaic dataset is set for the {0} product - set 'backfill_{0}DSName' (or "
+                          "'backfillDSName' in its 'products_Additional' entry)".format(product.name))
+        elif product.backfillDSName.lower() in liveDSNames:
+            errors.append("The backfill mosaic dataset for the {0} product ({1}) is a live mosaic dataset - backfill "
+                          "needs its own, i.e. '{2}_Archive'".format(product.name, product.backfillDSName,
+                                                                      product.dsName))
+    return errors
+
+
 def ValidAccumulationRaster(fileName):
     """
-        Accepts a filename and checks to see if it contains any of a few desired strings that identify the file
-        as a desired file.
+        Accepts a filename and checks to see if it is a valid IMERG accumulation file - one of the registered
+        products (see GetProductRegistry()).
+        (Partial ".part" downloads are never valid.)
     """
     try:
-        bRetVal = False
-        if ".1day.tif" in fileName:
-            bRetVal = True
-        elif ".3day.tif" in fileName:
-            bRetVal = True
-        elif ".7day.tif" in fileName:
-            bRetVal = True
-
-        return bRetVal
+        parsed = ParseIMERGFilename(fileName)
+        return parsed is not None and parsed.product is not None
     except:
         return False
 
@@ -305,359 +1574,1718 @@ def GetLatestIMERGFileFromList(theFilenameList):
             3B-HHR-L.MS.MRG.3IMERG.20150802-S083000-E085959.0510.V05B.1day.tif
         Particularly, we are interested in the date and start time string portion:  i.e.  20150802-S083000
         The goal is to identify and return the filename with the latest datetime.
+        (When the latest file for each product is needed, build an IMERGFilenameIndex once instead.)
     """
     try:
-        # Grab a few needed settings.
-        RegEx_StartDatePattern = GetConfigString("RegEx_StartDateFilterString")
-        Filename_StartDateFormat = GetConfigString("Filename_StartDateFormat")
-
-        # Set the initial latest date to some old date...
         slatestFileName = ""
-        olatestDate = datetime.datetime.strptime("19500101", "%Y%m%d")  # Some random older date
-
-        # Now, loop through the list and capture which one is the latest
+        olatestDate = None
         for tmpFile in theFilenameList:
-            # Ex. filename format: 3B-HHR-L.MS.MRG.3IMERG.20150802-S083000-E085959.0510.V05B.1day.tif
-            # If the item's date and start time is later than the olatestDate, we want to keep it.
-            fileDate = Get_StartDateTime_FromString(tmpFile, RegEx_StartDatePattern, Filename_StartDateFormat)
-            if (fileDate is not None) and (fileDate > olatestDate):
-                olatestDate = fileDate
+            parsed = ParseIMERGFilename(tmpFile)
+            if parsed is not None and (olatestDate is None or parsed.startDateTime > olatestDate):
+                olatestDate = parsed.startDateTime
                 slatestFileName = tmpFile
-
-        # Return the status
         return slatestFileName
 
     except:
         return None
 
 
-#  --- NOTE! NOTE! NOTE! ---
-# For some unknown reason, our server (where this script will be running) cannot connect to the FTP site where we need
-# to download files from. So, a "proxy" server/location has been established to retrieve the files from the FTP site.
-# For this reason, we have implemented another function further below that uses URLLIB to retrieve the files from the
-# proxy location vs. this function that uses FTPLIB to retrieve the files from the ftp location.
-#  --- NOTE! NOTE! NOTE! ---
-def ProcessAccumulationFiles(oTodaysDateTime):
-    """
-        Connects to the FTP site (base folder) and based on today's date, looks in a particular folder
-        (year and month) and retrieves a list of .tif files.
+# The metrics of the current run (see RunMetrics, MetricsTimer, and WriteRunMetrics()). Replaced at the start of
+# each run by main().
+runMetrics = RunMetrics()
 
-        Note:  Files on the FTP site are broken down into folders by Year and then by Month.
-            Late files are in FTP folder hierarchy:     /data/imerg/gis/<year>/<month>
-                e.g  /data/imerg/gis/2017/01 ... /data/imerg/gis/2017/02 ... /data/imerg/gis/2018/01 ...
-            So we must use Today's Date passed in to know which FTP folder we need to go to get the files.
 
-        As it processes through the files in the folder, the list of potential filenames to download is reduced to only
-        files that we want to keep by omitting any files that do not contain ".1day.tif", ".3day.tif", or ".7day.tif".
-        As we find files with these names, they are placed in respective lists. Once the list of respectively named files
-        is complete, the lists are searched for the latest file and the latest 1, 3, and 7 day files are downloaded to
-        the proper extract location.
+def GetPrometheusName(name, bLabel=False):
     """
-    try:
-        ftp_Host = GetConfigString("ftp_host")
-        ftp_baseLateFolder = GetConfigString("ftp_baseLateFolder")
-        ftp_UserName = GetConfigString("ftp_user")
-        ftp_UserPass = GetConfigString("ftp_pswrd")
-
-        targetFolder = GetConfigString("extract_AccumulationsFolder")
+        Returns name as a valid Prometheus metric name ([a-zA-Z_:][a-zA-Z0-9_:]*) or, with bLabel, label name
+        ([a-zA-Z_][a-zA-Z0-9_]*) - any other character becomes '_', and a leading digit gets a '_' in front.
+    """
+    validName = re.sub(r"[^a-zA-Z0-9_]" if bLabel else r"[^a-zA-Z0-9_:]", "_", str(name))
+    if validName == "" or validName[0].isdigit():
+        validName = "_" + validName
+    return validName
 
-        # Set up the FTP connection
-        bConnectionCreated = False
-        ftp_Connection = ftplib.FTP(ftp_Host, ftp_UserName, ftp_UserPass)
-        bConnectionCreated = True
 
-        # Get the year and month from each date passed in
-        oFolderYear = oTodaysDateTime.year
-        oFolderMonth = oTodaysDateTime.month
-
-        # Change to the <baseFolder>/Year/Month FTP folder
-        sYear = str(oFolderYear)
-        sMonth = str(oFolderMonth).zfill(2)  # pad with zero if a single digit
-        ftpFolder = ftp_baseLateFolder + "/" + sYear + "/" + sMonth
-        ftp_Connection.cwd(ftpFolder)
-
-        # Initialize a list for names of ALL files that are in the FTP folder
-        tmpList = []
-        # Initialize a placeholder list for names of files that we ACTUALLY process/download
-        OneDayList = []
-        ThreeDayList = []
-        SevenDayList = []
-
-        # Grab the list of ALL filenames from the current FTP folder...
-        line = ftp_Connection.retrlines("NLST", tmpList.append)
-
-        # Loop through each item in the tmpList and add it to the respective list!
-        # Note - There may be lots of different files/types in the FTP folder, we only need certain ones.
-        # To keep a file, it must contain the string ".1day.tif", ".3day.tif", or ".7day.tif"
-        for ftpFile in tmpList:
-            if ".1day.tif" in ftpFile:
-                OneDayList.append(ftpFile)
-            elif ".3day.tif" in ftpFile:
-                ThreeDayList.append(ftpFile)
-            elif ".7day.tif" in ftpFile:
-                SevenDayList.append(ftpFile)
-
-        # Find the latest file in the list based on the date and start time string in the filename
-        slatestOneDayFile = GetLatestIMERGFileFromList(OneDayList)
-        if len(slatestOneDayFile) > 0:
-            # Download the file to the targetFolder
-            target1DayExtractFile = os.path.join(targetFolder, slatestOneDayFile)
-            logging.info("Downloading latest 1Day file as {0}".format(target1DayExtractFile))
-            with open(target1DayExtractFile, "wb") as f:
-                ftp_Connection.retrbinary("RETR %s" % slatestOneDayFile, f.write)
-
-        # Find the latest file in the list based on the date and start time string in the filename
-        slatestThreeDayFile = GetLatestIMERGFileFromList(ThreeDayList)
-        if len(slatestThreeDayFile) > 0:
-            # Download the file to the targetFolder
-            target3DayExtractFile = os.path.join(targetFolder, slatestThreeDayFile)
-            logging.info("Downloading latest 3Day file: {0}.".format(target3DayExtractFile))
-            with open(target3DayExtractFile, "wb") as f:
-                ftp_Connection.retrbinary("RETR %s" % slatestThreeDayFile, f.write)
-
-        # Find the latest file in the list based on the date and start time string in the filename
-        slatestSevenDayFile = GetLatestIMERGFileFromList(SevenDayList)
-        if len(slatestSevenDayFile) > 0:
-            # Download the file to the targetFolder
-            target7DayExtractFile = os.path.join(targetFolder, slatestSevenDayFile)
-            logging.info("Downloading latest 7Day file: {0}.".format(target7DayExtractFile))
-            with open(target7DayExtractFile, "wb") as f:
-                ftp_Connection.retrbinary("RETR %s" % slatestSevenDayFile, f.write)
-
-        # Delete the temp lists of filenames
-        del OneDayList[:]
-        del ThreeDayList[:]
-        del SevenDayList[:]
-        del tmpList[:]
+def EscapePrometheusText(text, bLabelValue=False):
+    # Escapes a HELP text (backslash and line feed) or, with bLabelValue, a label value (double quote as well).
+    if isinstance(text, unicode):
+        text = text.encode("utf-8")
+    text = str(text).replace("\\", "\\\\").replace("\n", "\\n")
+    if bLabelValue:
+        text = text.replace('"', '\\"')
+    return text
 
-        # Disconnect from ftp
-        ftp_Connection.close()
-        return True
 
-    except:
-        err = capture_exception()
-        logging.error(err)
-        if bConnectionCreated:
-            ftp_Connection.close()
-        return False
+def FormatPrometheusValue(value):
+    # Returns a sample value in the Prometheus text format (NaN, +Inf, and -Inf are spelled the Prometheus way).
+    value = float(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
 
 
-#  --- NOTE! NOTE! NOTE! ---
-# This function is a replacement for ProcessAccumulationFiles() above. We cannot rely on FTP functionality, so we
-# are using a proxy server that provides access to the needed ftp files via URLLIB functionality.
-#  --- NOTE! NOTE! NOTE! ---
-def ProcessAccumulationFiles_FromProxy(oTodaysDateTime):
+def FormatPrometheusMetric(metricName, metricHelp, samples):
     """
-        Connects to the Proxy site (via URLLIB) and based on today's date, grabs filenames from a particular folder
-        (year and month) and retrieves a list of .tif files.
+        Returns the Prometheus text format lines for one gauge. samples is a list of (labels dictionary, value).
+        The metric and label names are made valid (see GetPrometheusName()), and the help text and label values are
+        escaped, so a counter or stage name can never break the file.
+    """
+    metricName = GetPrometheusName(metricName)
+    lines = ["# HELP {0} {1}".format(metricName, EscapePrometheusText(metricHelp)),
+             "# TYPE {0} gauge".format(metricName)]
+    for labels, value in samples:
+        labelText = ",".join(['{0}="{1}"'.format(GetPrometheusName(k, True), EscapePrometheusText(labels[k], True))
+                              for k in sorted(labels)])
+        if labelText:
+            lines.append("{0}{{{1}}} {2}".format(metricName, labelText, FormatPrometheusValue(value)))
+        else:
+            lines.append("{0} {1}".format(metricName, FormatPrometheusValue(value)))
+    return lines
 
-        Note:  Source files on the FTP site are broken down into folders by Year and then by Month.
-            Late files are in FTP folder hierarchy:     /data/imerg/gis/<year>/<month>
-                e.g  /data/imerg/gis/2017/01 ... /data/imerg/gis/2017/02 ... /data/imerg/gis/2018/01 ...
-            So we must use Today's Date passed in to know which FTP folder we need to go to get the files.
 
-        As it processes through the files in the folder, the list of potential filenames to download is reduced to only
-        files that we want to keep by omitting any files that do not contain ".1day.tif", ".3day.tif", or ".7day.tif".
-        As we find files with these names, they are placed in respective lists. Once the list of respectively named files
-        is complete, the lists are searched for the latest file and the latest 1, 3, and 7 day files are downloaded to
-        the proper extract location.
+def WritePrometheusMetrics(promFile, runDict):
     """
-    try:
-        # When using the proxy, we have to specify "ftp://" as part of the host string
+        Writes the run metrics in the Prometheus text format, for the node_exporter textfile collector. The file is
+        written to a temp file and renamed, so the collector never reads a partial file.
+    """
+    modeLabel = {"mode": runDict["mode"]}
+    lines = []
+    lines += FormatPrometheusMetric("imerg_etl_run_success", "1 if the last run succeeded, 0 if it failed.",
+                                    [(modeLabel, 1 if runDict["succeeded"] else 0)])
+    lines += FormatPrometheusMetric("imerg_etl_run_duration_seconds", "Duration of the last run.",
+                                    [(modeLabel, runDict["durationSeconds"])])
+    lines += FormatPrometheusMetric("imerg_etl_last_run_timestamp_seconds", "Unix time the last run finished.",
+                                    [(modeLabel, time.time())])
+    lines += FormatPrometheusMetric("imerg_etl_stage_duration_seconds", "Duration of each stage of the last run.",
+                                    [({"stage": stage}, seconds)
+                                     for stage, seconds in sorted(runDict["stageSeconds"].items())])
+
+    fileStages = sorted(set([fileTime["stage"] for fileTime in runDict["fileSeconds"]]))
+    stageFileSeconds = dict((stage, [f["seconds"] for f in runDict["fileSeconds"] if f["stage"] == stage])
+                            for stage in fileStages)
+    lines += FormatPrometheusMetric("imerg_etl_files", "Number of files processed by each stage of the last run.",
+                                    [({"stage": stage}, len(stageFileSeconds[stage])) for stage in fileStages])
+    lines += FormatPrometheusMetric("imerg_etl_file_duration_seconds_max",
+                                    "Longest time a single file took in each stage of the last run.",
+                                    [({"stage": stage}, max(stageFileSeconds[stage])) for stage in fileStages])
+    lines += FormatPrometheusMetric("imerg_etl_file_duration_seconds_sum",
+                                    "Total time of the files in each stage of the last run.",
+                                    [({"stage": stage}, sum(stageFileSeconds[stage])) for stage in fileStages])
+    for counterName, value in sorted(runDict["counters"].items()):
+        lines += FormatPrometheusMetric("imerg_etl_" + counterName, counterName.replace("_", " ") +
+                                        " in the last run.", [({}, value)])
+
+    with open(promFile + ".tmp", "w") as outFile:
+        outFile.write("\n".join(lines) + "\n")
+    ReplaceFile(promFile + ".tmp", promFile, False)
+
+
+def WriteRunMetrics(bSucceeded):
+    """
+        Writes the metrics of the current run: a json run record appended (one line per run) to the
+        'metrics_RunRecordFile', and - if 'metrics_PrometheusFile' is set - a Prometheus textfile collector file.
+        Never raises, a metrics failure must not fail the run.
+    """
+    try:
+        runDict = runMetrics.toDict(bSucceeded)
+        recordFile = GetConfigValue("metrics_RunRecordFile",
+                                    os.path.join(GetConfigString("logFileDir"), "IMERG_RunRecords.jsonl"))
+        with open(recordFile, "a") as outFile:
+            outFile.write(json.dumps(runDict, sort_keys=True) + "\n")
+
+        promFile = GetConfigValue("metrics_PrometheusFile", None)
+        if promFile:
+            WritePrometheusMetrics(promFile, runDict)
+    except:
+        logging.warning("Unable to write the run metrics: {0}".format(capture_exception()))
+
+
+# Shared transport sessions - created on first use and reused for the rest of the run (see GetHTTPTransport(),
+# GetFTPSession(), and GetAdminToken()).
+httpTransport = None
+ftpSession = None
+ftpSessionKey = None
+adminTokenCache = {}
+adminTokenLock = threading.Lock()
+
+
+def GetHTTPTransport():
+    """
+        Returns the shared HTTPConnectionPool used for every proxy listing, download, and ArcGIS admin request.
+    """
+    global httpTransport
+    if httpTransport is None:
+        httpTransport = HTTPConnectionPool(int(GetConfigValue("transport_MaxIdlePerHost", 4)),
+                                           int(GetConfigValue("transport_TimeoutSeconds", 120)))
+    return httpTransport
+
+
+def OpenURL(url, data=None, headers=None):
+    """
+        Opens a URL and returns a urllib2 style response. Uses the pooled keep-alive connections unless the
+        'transport_KeepAlive' setting is False, in which case a plain urllib2.urlopen() is used.
+    """
+    if GetConfigValue("transport_KeepAlive", True):
+        return GetHTTPTransport().open(url, data, headers)
+    req = urllib2.Request(url, data)
+    if headers is not None:
+        for key, value in headers.items():
+            req.add_header(key, value)
+    return urllib2.urlopen(req)
+
+
+def GetFTPSession(ftp_Host, ftp_UserName, ftp_UserPass):
+    """
+        Returns a logged in ftplib.FTP connection. The connection is kept open and reused by later calls (i.e. the
+        next run in daemon mode) as long as the server still answers a NOOP - otherwise a new one is created.
+    """
+    global ftpSession, ftpSessionKey
+    sessionKey = (ftp_Host, ftp_UserName)
+    if ftpSession is not None and ftpSessionKey == sessionKey:
+        try:
+            ftpSession.voidcmd("NOOP")
+            return ftpSession
+        except ftplib.all_errors:
+            logging.debug("FTP session to {0} was closed, reconnecting.".format(ftp_Host))
+            CloseFTPSession()
+
+    ftpSession = ftplib.FTP(ftp_Host, ftp_UserName, ftp_UserPass)
+    ftpSessionKey = sessionKey
+    return ftpSession
+
+
+def CloseFTPSession():
+    # Closes the shared FTP connection, if there is one.
+    global ftpSession, ftpSessionKey
+    if ftpSession is not None:
+        try:
+            ftpSession.quit()
+        except ftplib.all_errors:
+            ftpSession.close()
+    ftpSession = None
+    ftpSessionKey = None
+
+
+def CloseTransportSessions():
+    # Closes all of the shared transport connections. Called at the end of a run.
+    CloseFTPSession()
+    if httpTransport is not None:
+        httpTransport.closeAll()
+
+
+def GetAdminToken(clsSvc, bForceNew=False):
+    """
+        Returns an ArcGIS admin token for the service's admin URL and user. Tokens are cached until shortly before
+        they expire, so stopping and starting several services only needs one generateToken round trip. Pass
+        bForceNew=True to throw away a cached token that the server has rejected.
+    """
+    cacheKey = (clsSvc.adminURL, clsSvc.username)
+    with adminTokenLock:
+        cached = adminTokenCache.get(cacheKey)
+        # Don't hand out a token that is within a minute of expiring
+        if cached is not None and not bForceNew and cached[1] - 60 > time.time():
+            return cached[0]
+
+        expirationMinutes = int(GetConfigValue("svc_TokenExpirationMinutes", 60))
+        tokenParams = urllib.urlencode({"f": "json", "username": clsSvc.username,
+                                        "password": clsSvc.password, "client": "requestip",
+                                        "expiration": expirationMinutes})
+        tokenResponse = OpenURL(clsSvc.adminURL + "/generateToken?", tokenParams).read()
+        tokenResponseJSON = json.loads(tokenResponse)
+        token = tokenResponseJSON["token"]
+        if "expires" in tokenResponseJSON:
+            expires = float(tokenResponseJSON["expires"]) / 1000.0   # milliseconds since epoch
+        else:
+            expires = time.time() + expirationMinutes * 60
+        adminTokenCache[cacheKey] = (token, expires)
+        return token
+
+
+def GetManifestFile():
+    """
+        Returns the path and filename of the download manifest. Defaults to a file in the extract folder.
+    """
+    return GetConfigValue("download_ManifestFile",
+                          os.path.join(GetConfigString("extract_AccumulationsFolder"),
+                                       "IMERG_Accumulations_Manifest.json"))
+
+
+def GetBackfillManifestFile(backfillExtractFolder):
+    """
+        Returns the path and filename of the backfill download manifest. Backfill keeps its own manifest, as a file
+        loaded into the backfill mosaics still has to be loaded into the live ones (and the other way around).
+        Defaults to a file in the backfill extract folder.
+    """
+    return GetConfigValue("backfill_ManifestFile",
+                          os.path.join(backfillExtractFolder, "IMERG_Accumulations_Backfill_Manifest.json"))
+
+
+def ReadDownloadManifest(manifestFile):
+    """
+        Read the download manifest (json) file and return it as a dictionary. The manifest tracks every accumulation
+        file we have downloaded, keyed by filename.  i.e.
+            {"Files": {"3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.1day.tif":
+                        {"size": 1234, "remoteModified": "...", "sha256": "...", "status": "loaded",
+                         "lastUpdated": "2018-08-10 00:15:00"}}}
+        If the file is missing or can't be read, the backup kept by the last write (see ReplaceFile()) is read instead.
+        Returns an empty manifest if neither can be read.
+    """
+    for theFile in [manifestFile, manifestFile + ".bak"]:
+        try:
+            if os.path.isfile(theFile):
+                with open(theFile, "r") as mf:
+                    manifest = json.load(mf)
+                if "Files" in manifest:
+                    if theFile != manifestFile:
+                        logging.warning("Download manifest {0} could not be read, using its backup.".format(
+                            manifestFile))
+                    return manifest
+        except:
+            logging.warning("Error reading download manifest {0}.".format(theFile))
+            err = capture_exception()
+            logging.debug(err)
+    logging.warning("No readable download manifest {0}, starting a new one.".format(manifestFile))
+    return {"Files": {}}
+
+
+def WriteDownloadManifest(manifestFile, manifest):
+    """
+        Write the download manifest to disk. Entries that have not been touched in 'download_ManifestKeepDays' days
+        are dropped so the file does not grow forever. The manifest is written to a temp file first and then moved
+        into place so a crash can never leave a half written manifest.
+    """
+    try:
+        keepDays = int(GetConfigValue("download_ManifestKeepDays", 31))
+        oldestKept = (datetime.datetime.now() - datetime.timedelta(days=keepDays)).strftime('%Y-%m-%d %H:%M:%S')
+        for fileName in manifest["Files"].keys():
+            if manifest["Files"][fileName].get("lastUpdated", "") < oldestKept:
+                del manifest["Files"][fileName]
+
+        tmpFile = manifestFile + ".tmp"
+        with open(tmpFile, "w") as mf:
+            json.dump(manifest, mf, indent=2, sort_keys=True)
+        ReplaceFile(tmpFile, manifestFile)
+
+    except:
+        logging.warning("Error writing download manifest {0}".format(manifestFile))
+        err = capture_exception()
+        logging.error(err)
+
+
+def UpdateDownloadManifest(manifest, fileName, **entryValues):
+    """
+        Add or update the manifest entry for fileName with the values passed in (size, remoteModified, sha256,
+        status) and stamp it with the current date/time.
+    """
+    entry = manifest["Files"].setdefault(fileName, {})
+    for key, value in entryValues.items():
+        if value is not None:
+            entry[key] = value
+    entry["lastUpdated"] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def ComputeFileSHA256(theFile, chunkSize=1048576):
+    # Returns the SHA-256 hex digest of a file, reading it in chunks.
+    sha = hashlib.sha256()
+    with open(theFile, "rb") as f:
+        while True:
+            chunk = f.read(chunkSize)
+            if not chunk:
+                break
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def IsFileAlreadyIngested(manifest, fileName, remoteSize=None, remoteModified=None):
+    """
+        Returns True if the manifest shows fileName has already been loaded into its mosaic dataset. If the remote size
+        or modified date is known and differs from what was recorded, the file has been republished and is treated as
+        new.
+    """
+    entry = manifest["Files"].get(fileName)
+    if entry is None or entry.get("status") != "loaded":
+        return False
+    if remoteSize is not None and entry.get("size") is not None and entry["size"] != remoteSize:
+        return False
+    if remoteModified is not None and entry.get("remoteModified") is not None and \
+            entry["remoteModified"] != remoteModified:
+        return False
+    return True
+
+
+def IsFileAlreadyDownloaded(manifest, fileName, targetFile):
+    """
+        Returns True if targetFile is already sitting in the extract folder from an earlier run (downloaded, but not yet
+        loaded) and its contents still match the SHA-256 recorded in the manifest.
+    """
+    entry = manifest["Files"].get(fileName)
+    if entry is None or entry.get("status") != "downloaded" or not os.path.isfile(targetFile):
+        return False
+    try:
+        return ComputeFileSHA256(targetFile) == entry.get("sha256")
+    except:
+        return False
+
+
+def RecordDownloadedFile(manifest, fileName, targetFile, remoteModified=None):
+    # Add a freshly downloaded file to the manifest with its size and checksum.
+    UpdateDownloadManifest(manifest, fileName,
+                           size=os.path.getsize(targetFile),
+                           remoteModified=remoteModified,
+                           sha256=ComputeFileSHA256(targetFile),
+                           status="downloaded")
+
+
+def GetPendingAccumulationRasters(temp_workspace):
+    """
+        Returns the list of valid accumulation raster filenames (i.e. 1, 3, and 7 day) that are waiting in the temp
+        workspace (folder) to be loaded into their mosaic datasets.
+    """
+    try:
+        return [f for f in os.listdir(temp_workspace)
+                if ValidAccumulationRaster(f) and os.path.isfile(os.path.join(temp_workspace, f))]
+    except:
+        return []
+
+
+def ReplaceFile(tmpFile, targetFile, bKeepBackup=True):
+    """
+        Moves a completely written tmpFile into place as targetFile. On Windows os.rename() will not replace an
+        existing file, so the current targetFile is first renamed to "<targetFile>.bak" (replacing the previous
+        backup) - there is always either a targetFile or a backup, so a crash part way can't lose both. Readers fall
+        back to the backup when targetFile is missing (see GetReadableFile()). With bKeepBackup=False the backup is
+        deleted once the new file is in place (i.e. for rasters, which can be downloaded again).
+    """
+    bakFile = targetFile + ".bak"
+    if os.path.isfile(targetFile):
+        if os.path.isfile(bakFile):
+            os.remove(bakFile)
+        os.rename(targetFile, bakFile)
+    os.rename(tmpFile, targetFile)
+    if not bKeepBackup and os.path.isfile(bakFile):
+        os.remove(bakFile)
+
+
+def GetReadableFile(theFile):
+    # Returns theFile, or its ReplaceFile() backup if theFile is missing (a crash part way through a replace).
+    if not os.path.isfile(theFile) and os.path.isfile(theFile + ".bak"):
+        logging.warning("{0} is missing, reading its backup.".format(theFile))
+        return theFile + ".bak"
+    return theFile
+
+
+def FinalizePartFile(partFile, targetFile):
+    """
+        Moves a completed ".part" download into its final location (see ReplaceFile()). The rename is atomic on the
+        same volume, so the final file either does not exist or is complete - a partial raster can never be picked up
+        by the load step.
+    """
+    ReplaceFile(partFile, targetFile, False)
+    os.chmod(targetFile, 0777)
+
+
+def StreamDownloadFromURL(sourceURL, targetFile, chunkSize):
+    """
+        Streams a remote file (via the shared HTTP transport) into targetFile in fixed size chunks. Data is written to a
+        "<targetFile>.part" temp file which is renamed to targetFile only once the transfer is complete. If a ".part"
+        file is left over from an interrupted transfer, a byte range request is used to resume it. If the server does
+        not honor the range request, the download simply starts over. Raises an exception if the download fails.
+        Returns the Last-Modified header reported by the server (or None) so it can be recorded in the manifest.
+    """
+    partFile = targetFile + ".part"
+    resumeFrom = 0
+    if os.path.isfile(partFile):
+        resumeFrom = os.path.getsize(partFile)
+
+    reqHeaders = {}
+    if resumeFrom > 0:
+        reqHeaders["Range"] = "bytes={0}-".format(resumeFrom)
+    try:
+        response = OpenURL(sourceURL, None, reqHeaders)
+    except urllib2.HTTPError, e:
+        if e.code == 416 and resumeFrom > 0:
+            # Requested range not satisfiable - the partial file is no good, start over.
+            logging.debug("Range request rejected, restarting download: {0}".format(sourceURL))
+            os.remove(partFile)
+            return StreamDownloadFromURL(sourceURL, targetFile, chunkSize)
+        raise
+
+    try:
+        if resumeFrom > 0 and response.getcode() == 206:
+            logging.debug("Resuming download at byte {0}: {1}".format(resumeFrom, sourceURL))
+            fileMode = "ab"
+        else:
+            resumeFrom = 0
+            fileMode = "wb"
+
+        # Content-Length is the size of the remaining portion when resuming
+        remoteModified = response.info().getheader("Last-Modified")
+        expectedSize = None
+        contentLength = response.info().getheader("Content-Length")
+        if contentLength is not None:
+            expectedSize = resumeFrom + int(contentLength)
+
+        with open(partFile, fileMode) as f:
+            while True:
+                chunk = response.read(chunkSize)
+                if not chunk:
+                    break
+                f.write(chunk)
+    finally:
+        response.close()
+
+    runMetrics.increment("download_bytes", os.path.getsize(partFile) - resumeFrom)
+    if expectedSize is not None and os.path.getsize(partFile) != expectedSize:
+        raise IOError("Incomplete download of {0}: got {1} of {2} bytes".format(
+            sourceURL, os.path.getsize(partFile), expectedSize))
+
+    FinalizePartFile(partFile, targetFile)
+    return remoteModified
+
+
+def StreamDownloadFromFTP(ftp_Connection, remoteFile, targetFile, chunkSize):
+    """
+        Streams a file from an open FTP connection into targetFile in fixed size blocks. Data is written to a
+        "<targetFile>.part" temp file which is renamed to targetFile only once the transfer is complete. If a ".part"
+        file is left over from an interrupted transfer, the FTP REST command is used to resume it.
+        Raises an exception if the download fails.
+    """
+    partFile = targetFile + ".part"
+    resumeFrom = 0
+    if os.path.isfile(partFile):
+        resumeFrom = os.path.getsize(partFile)
+
+    # Not all servers support SIZE, if not we just can't verify the transfer.
+    expectedSize = None
+    try:
+        ftp_Connection.voidcmd("TYPE I")
+        expectedSize = ftp_Connection.size(remoteFile)
+    except ftplib.all_errors:
+        pass
+
+    if expectedSize is not None and resumeFrom > expectedSize:
+        # The partial file is larger than the source, so it can't be part of it. Start over.
+        resumeFrom = 0
+
+    if resumeFrom > 0:
+        logging.debug("Resuming download at byte {0}: {1}".format(resumeFrom, remoteFile))
+        with open(partFile, "ab") as f:
+            ftp_Connection.retrbinary("RETR %s" % remoteFile, f.write, chunkSize, resumeFrom)
+    else:
+        with open(partFile, "wb") as f:
+            ftp_Connection.retrbinary("RETR %s" % remoteFile, f.write, chunkSize)
+
+    runMetrics.increment("download_bytes", os.path.getsize(partFile) - resumeFrom)
+    if expectedSize is not None and os.path.getsize(partFile) != expectedSize:
+        raise IOError("Incomplete download of {0}: got {1} of {2} bytes".format(
+            remoteFile, os.path.getsize(partFile), expectedSize))
+
+    FinalizePartFile(partFile, targetFile)
+
+
+def DownloadProxyFile(dlItem):
+    """
+        Downloads a single DownloadItem (via URLLIB) from the proxy location into its target file. This is the unit of
+        work run by each thread in DownloadFilesConcurrently(), so it must never raise - any failure is logged, the
+        item is marked as not succeeded. Any partial ".part" file is kept so the next run can resume it, but the target
+        file itself is only ever created for a complete download.
+    """
+    time_Download = get_NewStart_Time()
+    try:
+        logging.info("Downloading {0} file: {1}".format(dlItem.label, dlItem.targetFile))
+        with MetricsTimer("download", os.path.basename(dlItem.targetFile)):
+            dlItem.remoteModified = StreamDownloadFromURL(dlItem.sourceURL, dlItem.targetFile,
+                                                          int(GetConfigValue("download_ChunkSize", 1048576)))
+        dlItem.succeeded = True
+        runMetrics.increment("files_downloaded")
+        logging.info("\t=== PERFORMANCE ===>: Download of {0} file took: {1}".format(
+            dlItem.label, get_Elapsed_Time_As_String(time_Download)))
+    except:
+        err = capture_exception()
+        logging.info("Error retrieving {0} file from proxy: {1}".format(dlItem.label, dlItem.sourceURL))
+        logging.debug(err)
+        dlItem.succeeded = False
+        runMetrics.increment("files_download_failed")
+    return dlItem
+
+
+def DownloadFilesConcurrently(downloadList, maxConcurrent):
+    """
+        Accepts a list of DownloadItem objects and downloads them at the same time using a pool of threads. The
+        number of simultaneous downloads is limited by maxConcurrent. Each file succeeds or fails on its own - a failed
+        download does not stop the others. Returns the list of DownloadItem objects (with the succeeded flag set).
+    """
+    if len(downloadList) == 0:
+        return downloadList
+
+    # Don't start more threads than there are files to download
+    numThreads = max(1, min(maxConcurrent, len(downloadList)))
+    logging.debug("Downloading {0} files using {1} threads.".format(len(downloadList), numThreads))
+    pool = ThreadPool(numThreads)
+    try:
+        results = pool.map(DownloadProxyFile, downloadList)
+    finally:
+        pool.close()
+        pool.join()
+
+    for dlItem in results:
+        if not dlItem.succeeded:
+            logging.warning("Download failed for {0} file: {1}".format(dlItem.label, dlItem.sourceURL))
+    return results
+
+
+# Proxy locations used to reach the source FTP site (see the note above ProcessAccumulationFiles_FromProxy())
+ProxyDirectoryURL = "https://proxy.servirglobal.net/ProxyFTP.aspx?directory="
+ProxyFileURL = "https://proxy.servirglobal.net/ProxyFTP.aspx?url="
+
+
+def GetSourceMonthFolder(year, month):
+    # Returns the source FTP folder for a year and month.  i.e.  /data/imerg/gis/2018/08
+    return GetConfigString("ftp_baseLateFolder") + "/" + str(year) + "/" + str(month).zfill(2)
+
+
+def ListProxyFolder(ftpFolder):
+    """
+        Returns the list of ALL filenames in a source FTP folder, retrieved through the proxy. (The proxy returns the
+        folder listing as a single comma delimited string.)
+    """
+    ftpHost = "ftp://" + GetConfigString("ftp_host")
+    logging.debug("FTPProxy Directory URL = {0}".format(ProxyDirectoryURL + ftpHost + ftpFolder + "/"))
+    response = OpenURL(ProxyDirectoryURL + ftpHost + ftpFolder + "/")   # last slash is required
+    try:
+        return response.read().split(",")
+    finally:
+        response.close()
+
+
+def ListFTPFolder(ftp_Connection, ftpFolder):
+    # Returns the list of ALL filenames in a source FTP folder, using an open FTP connection.
+    folderList = []
+    ftp_Connection.cwd(ftpFolder)
+    ftp_Connection.retrlines("NLST", folderList.append)
+    return folderList
+
+
+def GetPreviousMonth(year, month):
+    # Returns the (year, month) before the year and month passed in.
+    if month == 1:
+        return year - 1, 12
+    return year, month - 1
+
+
+def IsMonthFolderFrozen(year, month, oNow):
+    """
+        Returns True if the source folder for a year and month will no longer change - that is, once the month has
+        been over for 'listing_FrozenAfterDays' days (to allow for late files at the month boundary).
+    """
+    nextYear, nextMonth = (year + 1, 1) if month == 12 else (year, month + 1)
+    frozenDays = int(GetConfigValue("listing_FrozenAfterDays", 3))
+    return oNow >= datetime.datetime(nextYear, nextMonth, 1) + datetime.timedelta(days=frozenDays)
+
+
+def GetMonthFolderListing(year, month, oNow, listFolderFunc):
+    """
+        Returns the list of ALL filenames in the <baseFolder>/Year/Month source folder. Listings are cached locally
+        (one json file per folder in 'listing_CacheFolder'):
+          - a frozen month (see IsMonthFolderFrozen()) never changes, so its cached listing is always used.
+          - any other month's cached listing is used until it is 'listing_CacheTTLMinutes' old.
+        listFolderFunc(ftpFolder) does the actual listing (i.e. ListProxyFolder). If the listing fails, a stale cached
+        listing is used if there is one, otherwise the error is raised.
+    """
+    ftpFolder = GetSourceMonthFolder(year, month)
+    cacheFolder = GetConfigValue("listing_CacheFolder",
+                                 os.path.join(GetConfigString("extract_AccumulationsFolder"), "ListingCache"))
+    cacheFile = os.path.join(cacheFolder, "Listing_{0}_{1}.json".format(year, str(month).zfill(2)))
+    ttlMinutes = float(GetConfigValue("listing_CacheTTLMinutes", 5))
+    bFrozen = IsMonthFolderFrozen(year, month, oNow)
+
+    cached = None
+    try:
+        if os.path.isfile(cacheFile):
+            with open(cacheFile, "r") as cf:
+                cached = json.load(cf)
+    except:
+        cached = None
+
+    if cached is not None and cached.get("folder") == ftpFolder:
+        oListed = datetime.datetime.strptime(cached["listed"], '%Y-%m-%d %H:%M:%S')
+        if (cached.get("frozen") and bFrozen) or (oNow - oListed) < datetime.timedelta(minutes=ttlMinutes):
+            logging.debug("Using cached listing for {0}".format(ftpFolder))
+            return [str(f) for f in cached["files"]]
+
+    try:
+        folderList = [f for f in listFolderFunc(ftpFolder) if len(f.strip()) > 0]
+    except:
+        if cached is not None and cached.get("folder") == ftpFolder:
+            logging.warning("Unable to list {0}, using the cached listing from {1}.".format(ftpFolder,
+                                                                                           cached["listed"]))
+            return [str(f) for f in cached["files"]]
+        raise
+
+    # The listing is only marked frozen if it was taken after the month froze - so a listing taken while late files
+    # could still arrive is never kept forever.
+    try:
+        if create_folder(cacheFolder):
+            with open(cacheFile + ".tmp", "w") as cf:
+                json.dump({"folder": ftpFolder, "listed": oNow.strftime('%Y-%m-%d %H:%M:%S'), "frozen": bFrozen,
+                           "files": folderList}, cf)
+            ReplaceFile(cacheFile + ".tmp", cacheFile, False)
+    except:
+        logging.warning("Unable to cache listing for {0}: {1}".format(ftpFolder, capture_exception()))
+
+    return folderList
+
+
+def ListSourceFiles(oTodaysDateTime, listFolderFunc):
+    """
+        Returns a dictionary of filename -> source folder for ALL files in the current month's source folder. Near the
+        start of a month the latest files are often still in the previous month's folder, so the previous month's
+        folder is included as well when either:
+          - it is within the first 'listing_PreviousMonthDays' days of the month, or
+          - the current month's folder is missing (or has no) files for one of the products yet.
+        Listings come from GetMonthFolderListing(), so checking the previous month is usually a cache hit.
+    """
+    fileFolders = {}
+    oYear, oMonth = oTodaysDateTime.year, oTodaysDateTime.month
+    try:
+        for ftpFile in GetMonthFolderListing(oYear, oMonth, oTodaysDateTime, listFolderFunc):
+            fileFolders[ftpFile] = GetSourceMonthFolder(oYear, oMonth)
+    except:
+        logging.warning("Unable to list the current month's source folder: {0}".format(capture_exception()))
+
+    latestFiles = IMERGFilenameIndex(fileFolders.keys()).latestPerProduct()
+    bMissingProduct = len(latestFiles) < len(GetProductRegistry().products)
+
+    if bMissingProduct or oTodaysDateTime.day <= int(GetConfigValue("listing_PreviousMonthDays", 1)):
+        prevYear, prevMonth = GetPreviousMonth(oYear, oMonth)
+        logging.debug("Including the previous month's source folder {0}".format(
+            GetSourceMonthFolder(prevYear, prevMonth)))
+        try:
+            for ftpFile in GetMonthFolderListing(prevYear, prevMonth, oTodaysDateTime, listFolderFunc):
+                if ftpFile not in fileFolders:
+                    fileFolders[ftpFile] = GetSourceMonthFolder(prevYear, prevMonth)
+        except:
+            logging.warning("Unable to list the previous month's source folder: {0}".format(capture_exception()))
+
+    return fileFolders
+
+
+#  --- NOTE! NOTE! NOTE! ---
+# For some unknown reason, our server (where this script will be running) cannot connect to the FTP site where we need
+# to download files from. So, a "proxy" server/location has been established to retrieve the files from the FTP site.
+# For this reason, we have implemented another function further below that uses URLLIB to retrieve the files from the
+# proxy location vs. this function that uses FTPLIB to retrieve the files from the ftp location.
+#  --- NOTE! NOTE! NOTE! ---
+def ProcessAccumulationFiles(oTodaysDateTime):
+    """
+        Connects to the FTP site (base folder) and based on today's date, looks in a particular folder
+        (year and month) and retrieves a list of .tif files.
+
+        Note:  Files on the FTP site are broken down into folders by Year and then by Month.
+            Late files are in FTP folder hierarchy:     /data/imerg/gis/<year>/<month>
+                e.g  /data/imerg/gis/2017/01 ... /data/imerg/gis/2017/02 ... /data/imerg/gis/2018/01 ...
+            So we must use Today's Date passed in to know which FTP folder we need to go to get the files.
+
+        As it processes through the files in the folder, the list of potential filenames to download is reduced to only
+        files that we want to keep by omitting any files that are not one of the registered products (i.e. ".1day.tif",
+        ".3day.tif", or ".7day.tif" - see GetProductRegistry()). The latest file of each product is found in the same
+        pass, and the latest files of all of the products are downloaded to the proper extract location.
+    """
+    try:
+        ftp_Host = GetConfigString("ftp_host")
+        ftp_UserName = GetConfigString("ftp_user")
+        ftp_UserPass = GetConfigString("ftp_pswrd")
+
+        targetFolder = GetConfigString("extract_AccumulationsFolder")
+        chunkSize = int(GetConfigValue("download_ChunkSize", 1048576))
+
+        # Set up the FTP connection
+        bConnectionCreated = False
+        ftp_Connection = GetFTPSession(ftp_Host, ftp_UserName, ftp_UserPass)
+        bConnectionCreated = True
+
+        # Get the list of ALL filenames in this month's <baseFolder>/Year/Month FTP folder (and last month's folder
+        # near the start of a month), along with the folder each file is in.
+        fileFolders = ListSourceFiles(oTodaysDateTime, lambda ftpFolder: ListFTPFolder(ftp_Connection, ftpFolder))
+        tmpList = fileFolders.keys()
+
+        # Parse the list once and find the latest 1, 3, and 7 day file based on the date and start time string in
+        # the filename. There may be lots of different files/types in the FTP folder, we only need certain ones.
+        latestFiles = IMERGFilenameIndex(tmpList).latestPerProduct()
+
+        # Download the latest 1, 3, and 7 day files - unless the manifest shows we already have them.
+        manifestFile = GetManifestFile()
+        manifest = ReadDownloadManifest(manifestFile)
+        for product in GetProductRegistry().products:
+            productLabel = product.name
+            if productLabel in latestFiles:
+                slatestFile = latestFiles[productLabel].fileName
+                targetExtractFile = os.path.join(targetFolder, slatestFile)
+
+                ftp_Connection.cwd(fileFolders[slatestFile])
+
+                # Not all servers support SIZE and MDTM, if not we fall back to the filename alone.
+                remoteSize = None
+                remoteModified = None
+                try:
+                    ftp_Connection.voidcmd("TYPE I")
+                    remoteSize = ftp_Connection.size(slatestFile)
+                    remoteModified = ftp_Connection.sendcmd("MDTM %s" % slatestFile)[4:].strip()
+                except ftplib.all_errors:
+                    pass
+
+                if IsFileAlreadyIngested(manifest, slatestFile, remoteSize, remoteModified):
+                    logging.info("Latest {0} file already loaded, skipping: {1}".format(productLabel, slatestFile))
+                elif IsFileAlreadyDownloaded(manifest, slatestFile, targetExtractFile):
+                    logging.info("Latest {0} file already downloaded: {1}".format(productLabel, targetExtractFile))
+                else:
+                    # Download the file to the targetFolder
+                    logging.info("Downloading latest {0} file: {1}".format(productLabel, targetExtractFile))
+                    with MetricsTimer("download", slatestFile):
+                        StreamDownloadFromFTP(ftp_Connection, slatestFile, targetExtractFile, chunkSize)
+                    runMetrics.increment("files_downloaded")
+                    RecordDownloadedFile(manifest, slatestFile, targetExtractFile, remoteModified)
+        WriteDownloadManifest(manifestFile, manifest)
+
+        # Delete the temp list of filenames
+        del tmpList[:]
+
+        # The ftp connection is left open so it can be reused - see CloseTransportSessions()
+        return True
+
+    except:
+        err = capture_exception()
+        logging.error(err)
+        if bConnectionCreated:
+            # The connection may be in a bad state, don't reuse it.
+            CloseFTPSession()
+        return False
+
+
+#  --- NOTE! NOTE! NOTE! ---
+# This function is a replacement for ProcessAccumulationFiles() above. We cannot rely on FTP functionality, so we
+# are using a proxy server that provides access to the needed ftp files via URLLIB functionality.
+#  --- NOTE! NOTE! NOTE! ---
+def ProcessAccumulationFiles_FromProxy(oTodaysDateTime):
+    """
+        Connects to the Proxy site (via URLLIB) and based on today's date, grabs filenames from a particular folder
+        (year and month) and retrieves a list of .tif files.
+
+        Note:  Source files on the FTP site are broken down into folders by Year and then by Month.
+            Late files are in FTP folder hierarchy:     /data/imerg/gis/<year>/<month>
+                e.g  /data/imerg/gis/2017/01 ... /data/imerg/gis/2017/02 ... /data/imerg/gis/2018/01 ...
+            So we must use Today's Date passed in to know which FTP folder we need to go to get the files.
+
+        As it processes through the files in the folder, the list of potential filenames to download is reduced to only
+        files that we want to keep by omitting any files that are not one of the registered products (i.e. ".1day.tif",
+        ".3day.tif", or ".7day.tif" - see GetProductRegistry()). The latest file of each product is found in the same
+        pass, and the latest files of all of the products are downloaded to the proper extract location.
+    """
+    try:
+        # When using the proxy, we have to specify "ftp://" as part of the host string
+        ftpHost = "ftp://" + GetConfigString("ftp_host")
+        targetFolder = GetConfigString("extract_AccumulationsFolder")
+
+        # Set up the FTP connection
+        # bConnectionCreated = False
+        # ftp_Connection = ftplib.FTP(ftp_Host, ftp_UserName, ftp_UserPass)
+        # bConnectionCreated = True
+
+        # Get the list of ALL filenames in this month's <baseFolder>/Year/Month FTP folder (and last month's folder
+        # near the start of a month), along with the folder each file is in.
+        # line = ftp_Connection.retrlines("NLST", tmpList.append)
+        fileFolders = ListSourceFiles(oTodaysDateTime, ListProxyFolder)
+        tmpList = fileFolders.keys()
+
+        # Parse the list once and find the latest 1, 3, and 7 day file based on the date and start time string in
+        # the filename. There may be lots of different files/types in the FTP folder, we only need certain ones.
+        latestFiles = IMERGFilenameIndex(tmpList).latestPerProduct()
+
+        # Build the list of files to download - the latest 1, 3, and 7 day files, unless the manifest shows we
+        # already have them.
+        manifestFile = GetManifestFile()
+        manifest = ReadDownloadManifest(manifestFile)
+        downloadList = []
+        for product in GetProductRegistry().products:
+            productLabel = product.name
+            if productLabel in latestFiles:
+                slatestFile = latestFiles[productLabel].fileName
+                sourceExtractFile = ftpHost + fileFolders[slatestFile] + "/" + slatestFile
+                targetExtractFile = os.path.join(targetFolder, slatestFile)
+                if IsFileAlreadyIngested(manifest, slatestFile):
+                    logging.info("Latest {0} file already loaded, skipping: {1}".format(productLabel, slatestFile))
+                elif IsFileAlreadyDownloaded(manifest, slatestFile, targetExtractFile):
+                    logging.info("Latest {0} file already downloaded: {1}".format(productLabel, targetExtractFile))
+                else:
+                    downloadList.append(DownloadItem(ProxyFileURL + sourceExtractFile, targetExtractFile,
+                                                     productLabel))
+
+        # Download all of the selected files at the same time
+        with MetricsTimer("download"):
+            DownloadFilesConcurrently(downloadList, int(GetConfigValue("download_MaxConcurrent", 3)))
+
+        # Record the successful downloads in the manifest
+        for dlItem in downloadList:
+            if dlItem.succeeded:
+                RecordDownloadedFile(manifest, os.path.basename(dlItem.targetFile), dlItem.targetFile,
+                                     dlItem.remoteModified)
+        WriteDownloadManifest(manifestFile, manifest)
+
+        # Delete the temp list of filenames
+        del tmpList[:]
+
+        # Disconnect from ftp
+        # ftp_Connection.close()
+        return True
+
+    except:
+        err = capture_exception()
+        logging.error(err)
+        # if bConnectionCreated:
+        #     ftp_Connection.close()
+        return False
+
+
+def GetAccumulationSource():
+    """
+        Returns where the 1, 3, and 7 day accumulations come from - the 'accumulation_Source' config setting:
+          'pps':         the 1, 3, and 7 day files published on the source FTP site are downloaded (the default).
+          'halfhourly':  they are built here from the half hourly files (see ProcessHalfHourlyAccumulations()).
+    """
+    source = str(GetConfigValue("accumulation_Source", "pps")).lower()
+    if source not in ("pps", "halfhourly"):
+        logging.warning("Unknown accumulation source '{0}', using 'pps'.".format(source))
+        source = "pps"
+    return source
+
+
+def GetSlotNumber(oSlotStart):
+    # Returns the number of half hourly slots from 1970-01-01 to the slot start date/time.
+    return int((oSlotStart - datetime.datetime(1970, 1, 1)).total_seconds() // HalfHourlySlot.total_seconds())
+
+
+def GetAccumulationPeriodSlots():
+    # Returns a dictionary of product name -> number of half hourly slots in its accumulation period.
+    return dict((product.name, GetSlotNumber(datetime.datetime(1970, 1, 1) + product.accumulationPeriod))
+                for product in GetProductRegistry().products)
+
+
+rollingAccumulator = None
+
+
+def GetRollingAccumulator():
+    """
+        Returns the RollingAccumulator, created on first use. It lives as long as the process - i.e. across the passes
+        of daemon mode, so each pass only adds the slots published since the last one. The 'realtime_SlotStore'
+        config setting picks where the slots are kept:
+          'memmap':  on disk in the 'realtime_StateFolder' folder (see MemoryMappedSlotStore), so the slots and sums
+                     are picked up again after a restart (the default).
+          'memory':  in memory (see MemorySlotStore), so they are rebuilt from the source files after a restart.
+    """
+    global rollingAccumulator
+    if rollingAccumulator is None:
+        periodSlots = GetAccumulationPeriodSlots()
+        capacity = max(periodSlots.values())
+        storeName = str(GetConfigValue("realtime_SlotStore", "memmap")).lower()
+        if storeName == "memory":
+            slotStore = MemorySlotStore(capacity)
+        else:
+            stateFolder = GetConfigValue("realtime_StateFolder",
+                                         os.path.join(GetConfigString("extract_AccumulationsFolder"),
+                                                      "AccumulationState"))
+            if not create_folder(stateFolder):
+                raise IOError("Could not create folder: {0}".format(stateFolder))
+            slotStore = MemoryMappedSlotStore(stateFolder, capacity)
+        rollingAccumulator = RollingAccumulator(slotStore, periodSlots)
+    return rollingAccumulator
+
+
+def GetLatestHalfHourlyFile(theFilenameList):
+    # Returns the IMERGFilename of the latest half hourly file in the list, or None if there isn't one.
+    latestFile = None
+    for fileName in theFilenameList:
+        parsed = ParseIMERGFilename(fileName)
+        if parsed is not None and parsed.period == HalfHourlyPeriod:
+            if latestFile is None or parsed.startDateTime > latestFile.startDateTime:
+                latestFile = parsed
+    return latestFile
+
+
+def ListHalfHourlySourceFiles(oTodaysDateTime, oFirstDate, listFolderFunc):
+    """
+        Returns a dictionary of slot start date/time -> (IMERGFilename, source folder) for every half hourly file in
+        the month folders from oFirstDate's month to oTodaysDateTime's month. A month folder that can't be listed is
+        skipped (its slots are missing).
+    """
+    slotFiles = {}
+    oYear, oMonth = oFirstDate.year, oFirstDate.month
+    while (oYear, oMonth) <= (oTodaysDateTime.year, oTodaysDateTime.month):
+        ftpFolder = GetSourceMonthFolder(oYear, oMonth)
+        try:
+            for ftpFile in GetMonthFolderListing(oYear, oMonth, oTodaysDateTime, listFolderFunc):
+                parsed = ParseIMERGFilename(ftpFile)
+                if parsed is not None and parsed.period == HalfHourlyPeriod and parsed.startDateTime >= oFirstDate:
+                    slotFiles[parsed.startDateTime] = (parsed, ftpFolder)
+        except:
+            logging.warning("Unable to list source folder {0}: {1}".format(ftpFolder, capture_exception()))
+
+        # Next month
+        oMonth += 1
+        if oMonth > 12:
+            oYear, oMonth = oYear + 1, 1
+    return slotFiles
+
+
+def GetHalfHourlyAccumulationFileName(slotFileName, period):
+    # The accumulation built from the slots up to (and including) a half hourly file is named like the file PPS
+    # publishes for it.  i.e. ...20180809-S233000-E235959.1410.V05B.30min.tif -> ...-E235959.1410.V05B.1day.tif
+    return slotFileName[:-len(HalfHourlyPeriod + ".tif")] + period + ".tif"
+
+
+def ReadHalfHourlyGrid(inFile, minValue, maxValue):
+    """
+        Reads a half hourly file and returns (grid, georeference): the first band as an int16 array with every pixel
+        that is not above minValue and below maxValue set to 0, and the (geotransform, projection) of the raster.
+    """
+    srcDS = gdal.Open(inFile, gdal.GA_ReadOnly)
+    if srcDS is None:
+        raise IOError("Unable to open raster: {0}".format(inFile))
+    try:
+        data = srcDS.GetRasterBand(1).ReadAsArray()
+        grid = numpy.where((data > minValue) & (data < maxValue), data, 0).astype(numpy.int16)
+        return grid, (srcDS.GetGeoTransform(), srcDS.GetProjection())
+    finally:
+        srcDS = None
+
+
+def WriteAccumulationRaster(outFile, sumGrid, slotScale, noData, georeference):
+    """
+        Writes an accumulated sum as a tiled, compressed int16 GeoTIFF, in the same units as the PPS accumulation
+        files: each sum is multiplied by slotScale and rounded, and sums at or above the NoData value are set to it.
+        The raster is written to a ".part" file first, so the loader never picks up a partly written file.
+    """
+    values = numpy.rint(sumGrid * float(slotScale))
+    numpy.clip(values, 0, noData, out=values)
+
+    partFile = outFile + ".part"
+    ySize, xSize = values.shape
+    dstDS = gdal.GetDriverByName("GTiff").Create(partFile, xSize, ySize, 1, gdal.GDT_Int16,
+                                                 ["TILED=YES", "BLOCKXSIZE=256", "BLOCKYSIZE=256",
+                                                  "COMPRESS=DEFLATE"])
+    if dstDS is None:
+        raise IOError("Unable to create raster: {0}".format(partFile))
+    try:
+        dstDS.SetGeoTransform(georeference[0])
+        dstDS.SetProjection(georeference[1])
+        dstBand = dstDS.GetRasterBand(1)
+        dstBand.SetNoDataValue(noData)
+        dstBand.WriteArray(values.astype(numpy.int16))
+        dstBand.FlushCache()
+    finally:
+        dstDS = None
+    FinalizePartFile(partFile, outFile)
+
+
+def ProcessHalfHourlyAccumulations(oTodaysDateTime):
+    """
+        The 'halfhourly' accumulation source (see GetAccumulationSource()). Instead of waiting for the 1, 3, and 7 day
+        files, they are built here from the half hourly (30 minute) files, as soon as each one is published:
+        1 - Lists the month folder(s) covering the longest window, and selects the half hourly files in the window
+            that the RollingAccumulator doesn't already hold.
+        2 - Downloads them in parallel into the 'realtime_SlotFolder' folder.
+        3 - Adds each one to the RollingAccumulator in time order - one vectorized add, and one subtract per product
+            for the slot that drops out of its window - and then deletes it. The slots and sums are saved by the
+            slot store (see GetRollingAccumulator()), so a restart picks up where the last pass left off.
+        4 - Writes the sum of each product whose window is complete into the extract folder, named like the PPS file
+            for the latest slot (see GetHalfHourlyAccumulationFileName()), so that LoadAccumulationRasters() loads it
+            exactly like a downloaded file.
+        Returns True if successful.
+    """
+    try:
+        if not ImportGDAL():
+            raise RuntimeError("The 'halfhourly' accumulation source requires numpy and GDAL.")
         ftpHost = "ftp://" + GetConfigString("ftp_host")
-        ftp_baseLateFolder = GetConfigString("ftp_baseLateFolder")
         targetFolder = GetConfigString("extract_AccumulationsFolder")
+        slotFolder = GetConfigValue("realtime_SlotFolder", os.path.join(targetFolder, "HalfHourly"))
+        minValue = GetConfigValue("transform_MinValue", 0)
+        maxValue = GetConfigValue("transform_MaxValue", 29999)
+        slotScale = float(GetConfigValue("realtime_SlotScale", 0.5))
+        # A half hourly file is now and then published late (or not at all) - by default up to an hour of them may
+        # be missing from a window, so one late file doesn't hold back every accumulation until it shows up.
+        maxMissingSlots = int(GetConfigValue("realtime_MaxMissingSlots", 2))
+        if not create_folder(slotFolder):
+            logging.error("Could not create folder: {0}. Try to create manually and run again!".format(slotFolder))
+            return False
+        accumulator = GetRollingAccumulator()
+        capacity = accumulator.slotStore.capacity
+
+        # 1.) List the half hourly files that could be in the longest window (files are a few hours late, so allow
+        #     an extra day) and select the ones the accumulator doesn't hold yet.
+        time_Listing = get_NewStart_Time()
+        slotFiles = ListHalfHourlySourceFiles(oTodaysDateTime,
+                                              oTodaysDateTime - HalfHourlySlot * capacity - datetime.timedelta(days=1),
+                                              ListProxyFolder)
+        if len(slotFiles) == 0:
+            logging.warning("No half hourly files found in the source folder(s).")
+            return True
+        oWindowStart = max(slotFiles.keys()) - HalfHourlySlot * (capacity - 1)
+        newSlots = sorted(oSlotStart for oSlotStart in slotFiles
+                          if oSlotStart >= oWindowStart and accumulator.slotStore.getSlot(oSlotStart) is None)
+        logging.info("Selected {0} new half hourly files.".format(len(newSlots)))
+        logging.info("\t=== PERFORMANCE ===>: Half hourly listing took: " + get_Elapsed_Time_As_String(time_Listing))
+
+        # 2.) Download them in parallel (a file left over from a failed pass is used as is)
+        downloadList = []
+        for oSlotStart in newSlots:
+            parsedFile, ftpFolder = slotFiles[oSlotStart]
+            targetSlotFile = os.path.join(slotFolder, parsedFile.fileName)
+            if not os.path.isfile(targetSlotFile):
+                downloadList.append(DownloadItem(ProxyFileURL + ftpHost + ftpFolder + "/" + parsedFile.fileName,
+                                                 targetSlotFile, HalfHourlyPeriod))
+        with MetricsTimer("download"):
+            DownloadFilesConcurrently(downloadList, int(GetConfigValue("download_MaxConcurrent", 3)))
+
+        # 3.) Add the slots to the running sums, oldest first
+        time_Accumulate = get_NewStart_Time()
+        with MetricsTimer("accumulate"):
+            for oSlotStart in newSlots:
+                slotFile = os.path.join(slotFolder, slotFiles[oSlotStart][0].fileName)
+                if not os.path.isfile(slotFile):
+                    continue
+                try:
+                    grid, accumulator.georeference = ReadHalfHourlyGrid(slotFile, minValue, maxValue)
+                    if accumulator.addSlot(oSlotStart, grid):
+                        runMetrics.increment("slots_accumulated")
+                    os.remove(slotFile)
+                except:
+                    logging.warning("Unable to add half hourly file {0}: {1}".format(slotFile, capture_exception()))
+            accumulator.save()
+        logging.info("\t=== PERFORMANCE ===>: Adding {0} half hourly slots took: {1}".format(
+            len(newSlots), get_Elapsed_Time_As_String(time_Accumulate)))
+
+        # 4.) Write the accumulations that have a complete window into the extract folder
+        if accumulator.latestSlot not in slotFiles:
+            logging.warning("The latest half hourly slot is no longer listed, no accumulations written.")
+            return True
+        latestSlotFile = slotFiles[accumulator.latestSlot][0].fileName
+        manifest = ReadDownloadManifest(GetManifestFile())
+        for product in GetProductRegistry().products:
+            productName, period = product.name, product.period
+            if not accumulator.isWindowComplete(productName, maxMissingSlots):
+                logging.info("The {0} window is not complete yet ({1} of {2} slots).".format(
+                    productName, accumulator.slotCounts[productName], accumulator.periodSlots[productName]))
+                continue
+            outFile = os.path.join(targetFolder, GetHalfHourlyAccumulationFileName(latestSlotFile, period))
+            if IsFileAlreadyIngested(manifest, os.path.basename(outFile)) or os.path.isfile(outFile):
+                logging.info("Latest {0} accumulation already built, skipping: {1}".format(productName, outFile))
+                continue
+            logging.info("Writing {0} accumulation: {1}".format(productName, outFile))
+            WriteAccumulationRaster(outFile, accumulator.sums[productName], slotScale, maxValue,
+                                    accumulator.georeference)
+        return True
+
+    except:
+        err = capture_exception()
+        logging.error(err)
+        return False
+
+
+def CheckOutSpatialAnalyst():
+    # The 'arcpy' transform engine needs arcpy (imported here on first use) and the Spatial Analyst extension.
+    if ImportArcPy() is None:
+        raise RuntimeError("The 'arcpy' transform engine requires arcpy.")
+    arcpy.CheckOutExtension("Spatial")
+    arcpy.env.overwriteOutput = True
+
+
+def TransformRaster_ArcPy(inFile, outFile, minValue, maxValue, memoryCeilingMB=None):
+    """
+        Raster transform engine using the Spatial Analyst extension. Extracts only the pixel values above minValue and
+        below maxValue from inFile and saves the result as outFile. (Requires the Spatial extension to be checked out.)
+        memoryCeilingMB is not used - arcpy manages its own memory.
+    """
+    inSQLClause = "VALUE > {0} AND VALUE < {1}".format(minValue, maxValue)
+    extract = arcpy.sa.ExtractByAttributes(inFile, inSQLClause)
+    extract.save(outFile)
+    # ----------
+    #  For some reason, the extract is causing the raster attribute table (.tif.vat.dbf file) to be created
+    # which is being locked (with a ...tif.vat.dbf.lock file) as users access the WMS service. The problem
+    # is that the lock file is never released and future updates to the raster are failing. Therefore, here
+    # we will just try to delete the raster attribute table right after it is created.
+    arcpy.DeleteRasterAttributeTable_management(outFile)
+    # ----------
+
+
+def GenerateRasterWindows(srcBand, xSize, ySize, maxWindowPixels):
+    """
+        Generator that yields the read windows (xOff, yOff, numCols, numRows) covering a raster band. Windows are
+        built from whole native blocks of the band so GDAL never has to read a block twice. Normally a window is a
+        full width strip of as many block rows as fit within maxWindowPixels. If a single row of blocks is already
+        too big (very wide rasters), the strip is split into runs of whole blocks across.
+    """
+    blockXSize, blockYSize = srcBand.GetBlockSize()
+    blockXSize = max(1, min(blockXSize, xSize))
+    blockYSize = max(1, min(blockYSize, ySize))
+
+    if xSize * blockYSize <= maxWindowPixels:
+        # Full width strips - as many block rows as the budget allows
+        numBlockRows = max(1, maxWindowPixels // (xSize * blockYSize))
+        winCols = xSize
+        winRows = numBlockRows * blockYSize
+    else:
+        # One block row at a time, split into runs of whole blocks
+        numBlockCols = max(1, maxWindowPixels // (blockXSize * blockYSize))
+        winCols = min(xSize, numBlockCols * blockXSize)
+        winRows = blockYSize
+
+    for yOff in xrange(0, ySize, winRows):
+        numRows = min(winRows, ySize - yOff)
+        for xOff in xrange(0, xSize, winCols):
+            numCols = min(winCols, xSize - xOff)
+            yield (xOff, yOff, numCols, numRows)
+
+
+def ReadRasterWindows(srcBand, windows):
+    # Generator that reads each window from the band and yields (window, numpy array).
+    for window in windows:
+        xOff, yOff, numCols, numRows = window
+        yield window, srcBand.ReadAsArray(xOff, yOff, numCols, numRows)
+
+
+def MaskRasterWindows(dataWindows, minValue, maxValue, noData, bandStats=None):
+    """
+        Generator that sets every pixel not above minValue and below maxValue to noData, window by window. If a
+        RasterBandStatistics is passed in, the kept pixels of each window are added to it on the way through.
+        The window array is masked in place, so the only other full size array is the one byte per pixel mask (see
+        GetMaxWindowPixels()).
+    """
+    for window, data in dataWindows:
+        keep = data > minValue
+        keep &= data < maxValue
+        if bandStats is not None:
+            bandStats.update(data[keep], data.size)
+        numpy.logical_not(keep, out=keep)
+        data[keep] = data.dtype.type(noData)
+        del keep
+        yield window, data
+        del data
+
+
+def WriteBandStatistics(dstBand, bandStats):
+    """
+        Stores the statistics gathered during the transform on the output band, as the standard GDAL statistics and
+        default histogram (which ArcGIS reads instead of calculating them), plus the valid pixel count and percentage.
+    """
+    if bandStats.validCount == 0:
+        return
+    dstBand.SetStatistics(float(bandStats.minimum), float(bandStats.maximum), float(bandStats.mean),
+                          float(bandStats.stdDev()))
+    dstBand.SetMetadataItem("STATISTICS_VALIDCOUNT", str(bandStats.validCount))
+    dstBand.SetMetadataItem("STATISTICS_VALID_PERCENT",
+                            "{0:.4f}".format(100.0 * bandStats.validCount / bandStats.totalCount))
+    dstBand.SetDefaultHistogram(float(bandStats.histMin), float(bandStats.histMax), bandStats.histogram.tolist())
+
+
+def GetMaxWindowPixels(dataType, memoryCeilingMB, bGatherStatistics=True):
+    """
+        Returns how many pixels a single window may hold so that the working arrays of the transform stay within
+        memoryCeilingMB. MaskRasterWindows() masks the window array in place, and needs a one byte per pixel mask plus
+        a one byte per pixel temporary while it is built. When statistics are gathered, the valid pixels are also
+        copied out of the window, along with RasterBandStatistics' own temporaries (at most every pixel is valid).
+    """
+    dataBytes = gdal.GetDataTypeSize(dataType) // 8
+    bytesPerPixel = dataBytes + 2
+    if bGatherStatistics:
+        bytesPerPixel = max(bytesPerPixel, dataBytes + 1 + dataBytes + RasterBandStatistics.workingBytesPerPixel)
+    return max(1, int(float(memoryCeilingMB) * 1024 * 1024) // bytesPerPixel)
+
+
+def GetRasterOutputFormat(engineName):
+    """
+        Returns the 'transform_OutputFormat' setting - 'gtiff' (a tiled, compressed GeoTIFF) or 'cog' (a Cloud
+        Optimized GeoTIFF with internal overviews and statistics). COGs can only be written by the 'numpy' engine.
+    """
+    outputFormat = str(GetConfigValue("transform_OutputFormat", "gtiff")).lower()
+    if outputFormat not in ["gtiff", "cog"]:
+        logging.warning("Unknown transform_OutputFormat '{0}', using 'gtiff'.".format(outputFormat))
+        outputFormat = "gtiff"
+    if outputFormat == "cog" and engineName != "numpy":
+        outputFormat = "gtiff"
+    return outputFormat
+
+
+def GetOverviewLevels(xSize, ySize, minSize=256):
+    # Returns the overview decimation factors (2, 4, 8, ...) needed until the smallest overview fits within minSize.
+    levels = []
+    factor = 2
+    while max(xSize, ySize) // (factor // 2) > minSize:
+        levels.append(factor)
+        factor *= 2
+    return levels
+
+
+def WriteCloudOptimizedGeoTIFF(workDS, outFile):
+    """
+        Copies a finished working dataset (workDS) to outFile as a Cloud Optimized GeoTIFF - 512x512 internal tiles,
+        DEFLATE or ZSTD compression (the 'transform_Compression' setting) with a predictor, internal overviews, and
+        the band statistics (set on workDS by the transform) embedded, so the mosaic dataset doesn't have to build
+        pyramids or calculate statistics.
+        Uses GDAL's COG driver when it is available (GDAL 3.1+), otherwise a GTiff copy of the working dataset's
+        overviews (COPY_SRC_OVERVIEWS).
+    """
+    compression = str(GetConfigValue("transform_Compression", "DEFLATE")).upper()
+    bFloat = gdal.GetDataTypeName(workDS.GetRasterBand(1).DataType).startswith("Float")
+
+    cogDriver = gdal.GetDriverByName("COG")
+    if cogDriver is not None:
+        cogOptions = ["BLOCKSIZE=512", "COMPRESS=" + compression, "PREDICTOR=YES", "OVERVIEW_RESAMPLING=AVERAGE",
+                      "BIGTIFF=IF_SAFER"]
+        outDS = cogDriver.CreateCopy(outFile, workDS, 0, cogOptions)
+    else:
+        overviewLevels = GetOverviewLevels(workDS.RasterXSize, workDS.RasterYSize)
+        if len(overviewLevels) > 0:
+            workDS.BuildOverviews("AVERAGE", overviewLevels)
+        gtiffOptions = ["TILED=YES", "BLOCKXSIZE=512", "BLOCKYSIZE=512", "COMPRESS=" + compression,
+                        "PREDICTOR=" + ("3" if bFloat else "2"), "COPY_SRC_OVERVIEWS=YES", "BIGTIFF=IF_SAFER"]
+        outDS = gdal.GetDriverByName("GTiff").CreateCopy(outFile, workDS, 0, gtiffOptions)
+    if outDS is None:
+        raise IOError("Unable to write Cloud Optimized GeoTIFF: {0}".format(outFile))
+    outDS = None
+
+
+def TransformRaster_NumPy(inFile, outFile, minValue, maxValue, memoryCeilingMB=None):
+    """
+        Raster transform engine using GDAL and numpy - no arcpy or Spatial Analyst license needed. Does the same thing
+        as TransformRaster_ArcPy(): every pixel that is not above minValue and below maxValue is set to NoData.
+        Each band is streamed through a read -> mask -> write generator pipeline in windows made of native blocks,
+        sized so the working memory stays under memoryCeilingMB (the 'transform_MemoryCeilingMB' setting by default).
+        The output keeps the source NoData value, geotransform, and projection, and is written as a tiled, compressed
+        GeoTIFF - or, with the 'cog' output format, streamed into a working file that is then copied to a Cloud
+        Optimized GeoTIFF (see WriteCloudOptimizedGeoTIFF()).
+        The statistics and histogram of each band are gathered while the blocks stream through (see
+        RasterBandStatistics), stored on the output band, and returned as a list of dictionaries - one per band.
+    """
+    # (A worker process starts with nothing imported.)
+    if not ImportGDAL():
+        raise RuntimeError("The 'numpy' transform engine requires numpy and GDAL.")
+    if memoryCeilingMB is None:
+        memoryCeilingMB = GetConfigValue("transform_MemoryCeilingMB", 64)
+    outputFormat = GetRasterOutputFormat("numpy")
+    numBuckets = int(GetConfigValue("transform_HistogramBuckets", 256))
+    rasterStats = []
+
+    srcDS = gdal.Open(inFile, gdal.GA_ReadOnly)
+    if srcDS is None:
+        raise IOError("Unable to open raster: {0}".format(inFile))
+    try:
+        xSize = srcDS.RasterXSize
+        ySize = srcDS.RasterYSize
+        numBands = srcDS.RasterCount
+        dataType = srcDS.GetRasterBand(1).DataType
+
+        driver = gdal.GetDriverByName("GTiff")
+        if outputFormat == "cog":
+            # Uncompressed, so writing the blocks and building the overviews is cheap
+            workFile = outFile + ".work.tif"
+            createOptions = ["TILED=YES", "BLOCKXSIZE=512", "BLOCKYSIZE=512", "BIGTIFF=IF_SAFER"]
+        else:
+            workFile = outFile
+            createOptions = ["TILED=YES", "BLOCKXSIZE=256", "BLOCKYSIZE=256", "COMPRESS=DEFLATE"]
+        dstDS = driver.Create(workFile, xSize, ySize, numBands, dataType, createOptions)
+        try:
+            dstDS.SetGeoTransform(srcDS.GetGeoTransform())
+            dstDS.SetProjection(srcDS.GetProjection())
+
+            for bandNum in range(1, numBands + 1):
+                srcBand = srcDS.GetRasterBand(bandNum)
+                dstBand = dstDS.GetRasterBand(bandNum)
+
+                # Masked pixels become NoData, so the NoData value itself must be outside of the range we keep.
+                noData = srcBand.GetNoDataValue()
+                if noData is None or minValue < noData < maxValue:
+                    noData = maxValue
+                dstBand.SetNoDataValue(noData)
+
+                bandStats = RasterBandStatistics(minValue, maxValue, numBuckets)
+                windows = GenerateRasterWindows(srcBand, xSize, ySize,
+                                                GetMaxWindowPixels(srcBand.DataType, memoryCeilingMB))
+                for window, maskedData in MaskRasterWindows(ReadRasterWindows(srcBand, windows),
+                                                            minValue, maxValue, noData, bandStats):
+                    dstBand.WriteArray(maskedData, window[0], window[1])
+                    del maskedData  # (freed before the next window is read)
+
+                WriteBandStatistics(dstBand, bandStats)
+                rasterStats.append(bandStats.toDict())
+                dstBand.FlushCache()
+
+            if outputFormat == "cog":
+                WriteCloudOptimizedGeoTIFF(dstDS, outFile)
+        finally:
+            dstDS = None
+            if outputFormat == "cog" and os.path.exists(workFile):
+                driver.Delete(workFile)
+    finally:
+        srcDS = None
+
+    return rasterStats
 
-        # Set up the FTP connection
-        # bConnectionCreated = False
-        # ftp_Connection = ftplib.FTP(ftp_Host, ftp_UserName, ftp_UserPass)
-        # bConnectionCreated = True
 
-        # Get the year and month from each date passed in
-        oFolderYear = oTodaysDateTime.year
-        oFolderMonth = oTodaysDateTime.month
-
-        # Change to the <baseFolder>/Year/Month FTP folder
-        sYear = str(oFolderYear)
-        sMonth = str(oFolderMonth).zfill(2)  # pad with zero if a single digit
-        ftpFolder = ftp_baseLateFolder + "/" + sYear + "/" + sMonth
-        proxyDir = "https://proxy.servirglobal.net/ProxyFTP.aspx?directory="
-        logging.debug("FTPProxy Directory URL = {0}".format(proxyDir + ftpHost + ftpFolder + "/"))
-        # ftp_Connection.cwd(ftpFolder)
-        req = urllib2.Request(proxyDir + ftpHost + ftpFolder + "/")   # last slash is required
-        response = urllib2.urlopen(req)
-
-        # Initialize a placeholder list for names of files that we ACTUALLY process/download
-        OneDayList = []
-        ThreeDayList = []
-        SevenDayList = []
-
-        # Grab the list of ALL filenames from the current FTP folder...
-        # line = ftp_Connection.retrlines("NLST", tmpList.append)
-        tmpList = response.read().split(",")
-
-        # Loop through each item in the tmpList and add it to the respective list!
-        # Note - There may be lots of different files/types in the FTP folder, we only need certain ones.
-        # To keep a file, it must contain the string ".1day.tif", ".3day.tif", or ".7day.tif"
-        for ftpFile in tmpList:
-            if ".1day.tif" in ftpFile:
-                OneDayList.append(ftpFile)
-            elif ".3day.tif" in ftpFile:
-                ThreeDayList.append(ftpFile)
-            elif ".7day.tif" in ftpFile:
-                SevenDayList.append(ftpFile)
-
-        # Find the latest file in the list based on the date and start time string in the filename
-        slatestOneDayFile = GetLatestIMERGFileFromList(OneDayList)
-        if len(slatestOneDayFile) > 0:
-            # Download the source file to the targetFolder
-            source1DayExtractFile = ftpHost + os.path.join(ftpFolder, slatestOneDayFile)
-            target1DayExtractFile = os.path.join(targetFolder, slatestOneDayFile)
-            logging.info("Downloading latest 1Day file: {0}".format(target1DayExtractFile))
-            # with open(target1DayExtractFile, "wb") as f:
-            #     ftp_Connection.retrbinary("RETR %s" % slatestOneDayFile, f.write)
-            fx = open(target1DayExtractFile, "wb")
-            fx.close()
-            os.chmod(target1DayExtractFile, 0777)
-            try:
-                urllib.urlretrieve("https://proxy.servirglobal.net/ProxyFTP.aspx?url=" + source1DayExtractFile,
-                                   target1DayExtractFile)
-            except:
-                logging.info("Error retrieving latest 1Day file from proxy: {0}".format(source1DayExtractFile))
-                os.remove(target1DayExtractFile)
-
-        # Find the latest file in the list based on the date and start time string in the filename
-        slatestThreeDayFile = GetLatestIMERGFileFromList(ThreeDayList)
-        if len(slatestThreeDayFile) > 0:
-            # Download the source file to the targetFolder
-            source3DayExtractFile = ftpHost + os.path.join(ftpFolder, slatestThreeDayFile)
-            target3DayExtractFile = os.path.join(targetFolder, slatestThreeDayFile)
-            logging.info("Downloading latest 3Day file: {0}".format(target3DayExtractFile))
-            # with open(target3DayExtractFile, "wb") as f:
-            #     ftp_Connection.retrbinary("RETR %s" % slatestThreeDayFile, f.write)
-            fx = open(target3DayExtractFile, "wb")
-            fx.close()
-            os.chmod(target3DayExtractFile, 0777)
-            try:
-                urllib.urlretrieve("https://proxy.servirglobal.net/ProxyFTP.aspx?url=" + source3DayExtractFile,
-                                   target3DayExtractFile)
-            except:
-                logging.info("Error retrieving latest 3Day file from proxy: {0}".format(source3DayExtractFile))
-                os.remove(target3DayExtractFile)
-
-        # Find the latest file in the list based on the date and start time string in the filename
-        slatestSevenDayFile = GetLatestIMERGFileFromList(SevenDayList)
-        if len(slatestSevenDayFile) > 0:
-            # Download the source file to the targetFolder
-            source7DayExtractFile = ftpHost + os.path.join(ftpFolder, slatestSevenDayFile)
-            target7DayExtractFile = os.path.join(targetFolder, slatestSevenDayFile)
-            logging.info("Downloading latest 7Day file: {0}".format(target7DayExtractFile))
-            # with open(target7DayExtractFile, "wb") as f:
-            #     ftp_Connection.retrbinary("RETR %s" % slatestSevenDayFile, f.write)
-            fx = open(target7DayExtractFile, "wb")
-            fx.close()
-            os.chmod(target7DayExtractFile, 0777)
-            try:
-                urllib.urlretrieve("https://proxy.servirglobal.net/ProxyFTP.aspx?url=" + source7DayExtractFile,
-                                   target7DayExtractFile)
-            except:
-                logging.info("Error retrieving latest 3Day file from proxy: {0}".format(source7DayExtractFile))
-                os.remove(target7DayExtractFile)
+# The available raster transform engines, selected with the 'transform_Engine' config setting.
+RasterTransformEngines = {"arcpy": TransformRaster_ArcPy,
+                          "numpy": TransformRaster_NumPy}
 
-        # Delete the temp lists of filenames
-        del OneDayList[:]
-        del ThreeDayList[:]
-        del SevenDayList[:]
-        del tmpList[:]
 
-        # Disconnect from ftp
-        # ftp_Connection.close()
-        return True
+bEngineFallbackLogged = False
+
 
+def GetRasterTransformEngineName():
+    """
+        Returns the name of the raster transform engine to use. Falls back to the arcpy engine if numpy or GDAL are not
+        installed on this machine - logged once per process (i.e. once for a daemon), naming the missing module.
+    """
+    global bEngineFallbackLogged
+    engineName = str(GetConfigValue("transform_Engine", "arcpy")).lower()
+    if engineName not in RasterTransformEngines:
+        logging.warning("Unknown transform_Engine '{0}', using 'arcpy'.".format(engineName))
+        engineName = "arcpy"
+    if engineName == "numpy" and not ImportGDAL():
+        if not bEngineFallbackLogged:
+            bCOG = str(GetConfigValue("transform_OutputFormat", "gtiff")).lower() == "cog"
+            logging.warning("The 'numpy' transform engine needs numpy and GDAL ({0}) - using the 'arcpy' engine{1}. "
+                            "Install GDAL, or set transform_Engine to 'arcpy'.".format(
+                                gdalImportError, " (and 'gtiff' instead of 'cog' output)" if bCOG else ""))
+            bEngineFallbackLogged = True
+        engineName = "arcpy"
+    return engineName
+
+
+def TransformRasterWorker(transformJob):
+    """
+        Runs one raster transform. This is the unit of work run by each process in TransformRasters(), so it must be a
+        top level function and must never raise. transformJob is a tuple of
+            (engineName, inFile, outFile, minValue, maxValue, memoryCeilingMB)
+        Returns a tuple of (inFile, error string or None, elapsed seconds, band statistics or None).
+    """
+    engineName, inFile, outFile, minValue, maxValue, memoryCeilingMB = transformJob
+    time_Transform = get_NewStart_Time()
+    try:
+        rasterStats = RasterTransformEngines[engineName](inFile, outFile, minValue, maxValue, memoryCeilingMB)
+        return inFile, None, time.time() - time_Transform, rasterStats
     except:
-        err = capture_exception()
-        logging.error(err)
-        # if bConnectionCreated:
-        #     ftp_Connection.close()
-        return False
+        return inFile, capture_exception(), time.time() - time_Transform, None
+
+
+def TransformRasters(transformJobs, engineName, maxProcesses, transformStats=None):
+    """
+        Runs a list of transform jobs (see TransformRasterWorker()) and returns a dictionary of
+        inFile -> error string (None if the transform succeeded). If a transformStats dictionary is passed in, it is
+        filled with inFile -> list of band statistics, for the engines that gather them.
+        With the numpy engine, the jobs run in a pool of up to maxProcesses worker processes, so the run takes about as
+        long as the slowest raster. The arcpy engine always runs in this process, one raster at a time, as each worker
+        would have to import arcpy and check out its own Spatial Analyst license.
+    """
+    numProcesses = max(1, min(maxProcesses, len(transformJobs)))
+    if engineName != "numpy" or numProcesses < 2:
+        results = map(TransformRasterWorker, transformJobs)
+    else:
+        logging.debug("Transforming {0} rasters using {1} processes.".format(len(transformJobs), numProcesses))
+        pool = multiprocessing.Pool(numProcesses)
+        try:
+            results = pool.map(TransformRasterWorker, transformJobs)
+        finally:
+            pool.close()
+            pool.join()
+
+    transformErrors = {}
+    for inFile, err, elapsedSeconds, rasterStats in results:
+        transformErrors[inFile] = err
+        if transformStats is not None and rasterStats is not None:
+            transformStats[inFile] = rasterStats
+        if rasterStats is not None:
+            for bandStats in rasterStats:
+                runMetrics.increment("pixels_total", bandStats["totalCount"])
+                runMetrics.increment("pixels_masked", bandStats["totalCount"] - bandStats["validCount"])
+        runMetrics.addFileTime("transform", os.path.basename(inFile), elapsedSeconds)
+        logging.info("\t=== PERFORMANCE ===>: Transform of {0} took: {1}".format(
+            os.path.basename(inFile), format_Elapsed_Seconds(elapsedSeconds)))
+    return transformErrors
+
+
+def BuildRasterLoadObject(parsedFile, targetDatasets):
+    """
+        Builds and returns a RasterLoadObject for an accumulation raster file, using the IMERGFilename parsed from its
+        filename and the dictionary of product name -> mosaic dataset passed in as the target for each product.
+    """
+    # Start deriving info (start_datetime, end_datetime, and target datastet) from the raster
+    # being processed. Build a 'raster load object' to hold the information about each raster
+    # that we need to keep track of.
+    rasLoadObj = RasterLoadObject()
+
+    # 1.) save the original file name
+    rasLoadObj.origFile = parsedFile.fileName
+
+    # 2.) the date and start time portion (20180801-S083000) of the raster filename is used to set
+    #     the end_datetime attribute value on the loaded raster.  Save that here...
+    rasLoadObj.endDate = parsedFile.startDateTime
+
+    # From the filename: ex. 3B-HHR-L.MS.MRG.3IMERG.20150802-S083000-E085959.0510.V05B.1day.tif
+    # 3.) the target dataset and the raster load file are identified by the product (i.e. 1Day, 3Day, or 7Day)
+    # 4.) the start_datetime attribute value is calculated based on the end_datetime and the accumulation period
+    #     of the product - by subtracting the proper amount of days from the end_datetime.
+    rasLoadObj.productName = parsedFile.product
+    rasLoadObj.startDate = parsedFile.startDateTime - parsedFile.accumulationPeriod
+    rasLoadObj.loadFile = GetProductRegistry().byName(parsedFile.product).loadFile()
+    rasLoadObj.targetDataset = targetDatasets[parsedFile.product]
+
+    return rasLoadObj
+
+
+def SplitSupersededRasters(rasObjList):
+    """
+        Returns a tuple of (latest, superseded) lists of RasterLoadObjects - the latest holds the newest raster (by end
+        date) of each product, the superseded the rest. Every raster of a product is saved to the same load file, so
+        only one of them can be transformed and loaded - i.e. when a stale file left by a failed run is still in the
+        extract folder next to today's.
+    """
+    latestByProduct = {}
+    for rasLoadObj in rasObjList:
+        latest = latestByProduct.get(rasLoadObj.productName)
+        if latest is None or rasLoadObj.endDate > latest.endDate:
+            latestByProduct[rasLoadObj.productName] = rasLoadObj
+    latestRasters = [r for r in rasObjList if latestByProduct[r.productName] is r]
+    supersededRasters = [r for r in rasObjList if latestByProduct[r.productName] is not r]
+    return latestRasters, supersededRasters
+
+
+def WriteTransformReport(loadResult, transformStats, sourceFolder):
+    """
+        Writes the statistics gathered by the transform (see RasterBandStatistics) for each loaded raster to the run
+        report json file (the 'transform_ReportFile' setting). Each run replaces the previous report.
+    """
+    reportFile = GetConfigValue("transform_ReportFile",
+                                os.path.join(GetConfigString("logFileDir"), "IMERG_TransformReport.json"))
+    reportRasters = []
+    for rasterLoaded in loadResult.loadedRasters:
+        rasterStats = transformStats.get(os.path.join(sourceFolder, rasterLoaded.origFile))
+        if rasterStats is None:
+            continue
+        loadResult.rasterStatistics[rasterLoaded.loadFile] = rasterStats
+        reportRasters.append({"sourceFile": rasterLoaded.origFile,
+                              "loadFile": rasterLoaded.loadFile,
+                              "product": rasterLoaded.productName,
+                              "bands": rasterStats})
+    if len(reportRasters) == 0:
+        return
+
+    try:
+        with open(reportFile + ".tmp", "w") as outFile:
+            json.dump({"generated": datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+                       "rasters": reportRasters}, outFile, indent=2)
+        ReplaceFile(reportFile + ".tmp", reportFile, False)
+        for reportRaster in reportRasters:
+            for bandStats in reportRaster["bands"]:
+                logging.info("\t{0}: valid pixels {1} ({2:.2f}%), min {3}, max {4}, mean {5:.3f}".format(
+                    reportRaster["loadFile"], bandStats["validCount"], bandStats["validPercent"],
+                    bandStats["min"], bandStats["max"], bandStats["mean"]))
+    except:
+        logging.warning("Unable to write the transform report {0}: {1}".format(reportFile, capture_exception()))
+
+
+def GetMosaicLoadBuildOptions(engineName):
+    """
+        Returns the (build_pyramids, calculate_statistics) options for AddRastersToMosaicDataset. The 'numpy' engine
+        stores the statistics it gathered on each raster, and COGs also have their own internal overviews, so the
+        mosaic load doesn't have to read the rasters again to build them.
+    """
+    buildPyramids = "BUILD_PYRAMIDS"
+    calculateStatistics = "CALCULATE_STATISTICS"
+    if engineName == "numpy":
+        calculateStatistics = "NO_STATISTICS"
+        if GetRasterOutputFormat(engineName) == "cog":
+            buildPyramids = "NO_PYRAMIDS"
+    return buildPyramids, calculateStatistics
+
+
+# The available mosaic stores, selected with the 'mosaic_Store' config setting.
+MosaicStores = {"filegdb": FileGDBMosaicStore,
+                "gdal": GDALMosaicStore}
+mosaicStore = None
+
+
+def GetMosaicStore():
+    """
+        Returns the MosaicStore the rasters are loaded into - created on first use from the 'mosaic_Store' setting
+        ('filegdb' by default).
+    """
+    global mosaicStore
+    if mosaicStore is None:
+        storeName = str(GetConfigValue("mosaic_Store", "filegdb")).lower()
+        if storeName not in MosaicStores:
+            logging.warning("Unknown mosaic_Store '{0}', using 'filegdb'.".format(storeName))
+            storeName = "filegdb"
+        mosaicStore = MosaicStores[storeName]()
+    return mosaicStore
+
+
+def GetLoadMode():
+    """
+        Returns the 'load_Mode' setting - how the latest rasters replace the previous ones in the mosaic datasets:
+          'overwrite' - (default) the product's file (i.e. IMERG1Day.tif) is overwritten and reloaded into the mosaic
+                        with OVERWRITE_DUPLICATES, and the services are restarted.
+          'swap'      - each raster is written under a new versioned name and added next to the old one, the old
+                        mosaic item is then removed, and its file is deleted later (see CollectRetiredRasterFiles()).
+                        The services never have to be restarted.
+    """
+    loadMode = str(GetConfigValue("load_Mode", "overwrite")).lower()
+    if loadMode not in ["overwrite", "swap"]:
+        logging.warning("Unknown load_Mode '{0}', using 'overwrite'.".format(loadMode))
+        loadMode = "overwrite"
+    return loadMode
+
+
+def GetVersionedLoadFile(rasLoadObj, oLoadDateTime):
+    # Swap mode file name - i.e. IMERG1Day_201808012330_20180802011502.tif (source date + load time), so a reload
+    # of the same source file still gets a new name.
+    return "{0}_{1}_{2}.tif".format(GetProductRegistry().byName(rasLoadObj.productName).loadName,
+                                    rasLoadObj.endDate.strftime('%Y%m%d%H%M'), oLoadDateTime.strftime('%Y%m%d%H%M%S'))
+
+
+def RetireMosaicRasters(targetDataset, productName, currentName_minusExt):
+    """
+        Swap mode - removes every item of the product from the mosaic dataset, other than the one just loaded
+        (currentName_minusExt). Only the mosaic items are removed, the files are left for CollectRetiredRasterFiles().
+    """
+    wClause = "Name LIKE '" + GetProductRegistry().byName(productName).loadName + "%' AND Name <> '" + \
+              currentName_minusExt + "'"
+    GetMosaicStore().removeRasters(targetDataset, wClause)
+
+
+def GetRetiredRastersFile():
+    # Returns the swap mode state file recording when each retired raster file was retired. Defaults to a file next
+    # to the download manifest.
+    return GetConfigValue("load_SwapStateFile",
+                          os.path.join(os.path.dirname(GetManifestFile()), "IMERG_Accumulations_RetiredRasters.json"))
+
+
+def ReadRetiredRasters(stateFile):
+    # Reads the swap mode state file (json) - a dictionary of retired file name -> when it was retired
+    # ('%Y-%m-%dT%H:%M:%S'). Returns an empty dictionary if the file does not exist or cannot be read.
+    readableFile = GetReadableFile(stateFile)
+    if os.path.isfile(readableFile):
+        try:
+            with open(readableFile, "r") as inFile:
+                return json.load(inFile)
+        except:
+            logging.warning("Unable to read retired rasters file {0}, starting a new one: {1}".format(
+                stateFile, capture_exception()))
+    return {}
+
+
+def WriteRetiredRasters(stateFile, retiredRasters):
+    # Writes the swap mode state to a temp file first, so a failed write can't corrupt the existing state file.
+    with open(stateFile + ".tmp", "w") as outFile:
+        json.dump(retiredRasters, outFile, indent=2, sort_keys=True)
+    ReplaceFile(stateFile + ".tmp", stateFile)
+
+
+def CollectRetiredRasterFiles(rasterFolder, productName, currentLoadFile, keepMinutes, retiredRasters, oNow):
+    """
+        Swap mode - deletes the versioned files of a product (other than currentLoadFile) that were retired more than
+        keepMinutes ago. The delay gives requests that started against the old mosaic item time to finish.
+        retiredRasters is the dictionary of file name -> retired time kept in the swap mode state file (see
+        ReadRetiredRasters()). This is called right after the product's old mosaic items were removed, so a file that
+        isn't in it yet was retired now (oNow) - it is recorded, and kept for another keepMinutes. Deleted files are
+        removed from retiredRasters. Returns the number of files deleted.
+    """
+    deletedCount = 0
+    sCutoff = (oNow - datetime.timedelta(minutes=keepMinutes)).strftime('%Y-%m-%dT%H:%M:%S')
+    versionedPattern = re.compile("^" + re.escape(GetProductRegistry().byName(productName).loadName) +
+                                  r"_\d{12}_\d{14}\.tif$")
+    for fileName in os.listdir(rasterFolder):
+        if fileName == currentLoadFile or versionedPattern.match(fileName) is None:
+            continue
+        if fileName not in retiredRasters:
+            retiredRasters[fileName] = oNow.strftime('%Y-%m-%dT%H:%M:%S')
+        if retiredRasters[fileName] > sCutoff:
+            continue
+        retiredFile = os.path.join(rasterFolder, fileName)
+        try:
+            GetMosaicStore().deleteFile(retiredFile)
+            del retiredRasters[fileName]
+            deletedCount += 1
+        except:
+            logging.warning("Unable to delete retired raster {0}: {1}".format(retiredFile, capture_exception()))
+    return deletedCount
 
 
 def LoadAccumulationRasters(temp_workspace):
     """
         This function accepts a temp workspace (folder) and:
-        1 - Grabs each raster file (1day, 3day, and 7day) in the workspace folder and saves info from each one - storing
-            the info into a list of class objects.
+        1 - Grabs each raster file (i.e. 1day, 3day, and 7day) in the workspace folder and saves info from each one -
+            storing the info into a list of class objects.
         2 - processes through the list of stored raster objects and extracts each raster from the temp folder into
             the final mosaic dataset folder(as it's respective file name), and then loads the raster to the mosaic
             dataset - overwriting any previous entries.
         3 - Uses info from the original source file to populate the start time and end time on each raster after
             it is loaded to the mosaic dataset.
         4 - deletes the temp_workspace original raster file after it is successfully added/moved to the mosaic dataset.
+        In 'swap' load mode (see GetLoadMode()) each raster gets a new versioned file name in step 2 and is added
+        alongside the previous one, and the previous mosaic item is only removed once the new one has its attributes.
+        Returns an AccumulationLoadResult listing which rasters (and so which products) were loaded.
     """
+    loadResult = AccumulationLoadResult()
     try:
-        arcpy.CheckOutExtension("Spatial")
         # We do not want the zero values and we also do not want the "NoData" value of 29999.
         # So let's extract only the values above 0 and less than 29999.
-        inSQLClause = "VALUE > 0 AND VALUE < 29999"
-        arcpy.env.workspace = temp_workspace
-        arcpy.env.overwriteOutput = True
+        minValue = GetConfigValue("transform_MinValue", 0)
+        maxValue = GetConfigValue("transform_MaxValue", 29999)
+        transformEngineName = GetRasterTransformEngineName()
+        logging.debug("Using the '{0}' raster transform engine.".format(transformEngineName))
+        if transformEngineName == "arcpy":
+            CheckOutSpatialAnalyst()
+        buildPyramids, calculateStatistics = GetMosaicLoadBuildOptions(transformEngineName)
+        store = GetMosaicStore()
 
         # Grab some config settings that will be needed...
         final_RasterSourceFolder = GetConfigString('final_Folder')
-        target_mosaic1Day = os.path.join(GetConfigString("GDBPath"), GetConfigString("1DayDSName"))
-        target_mosaic3Day = os.path.join(GetConfigString("GDBPath"), GetConfigString("3DayDSName"))
-        target_mosaic7Day = os.path.join(GetConfigString("GDBPath"), GetConfigString("7DayDSName"))
-        RegEx_StartDatePattern = GetConfigString("RegEx_StartDateFilterString")
-        Filename_StartDateFormat = GetConfigString("Filename_StartDateFormat")
+        targetDatasets = dict((product.name, store.getDatasetPath(product.dsName))
+                              for product in GetProductRegistry().products)
 
         # Build attribute name list for updates
         attrNameList = [GetConfigString('rasterStartTimeProperty'), GetConfigString('rasterEndTimeProperty')]
 
+        loadMode = GetLoadMode()
+        oLoadDateTime = datetime.datetime.now()
+        duplicatesAction = "ALLOW_DUPLICATES" if loadMode == "swap" else "OVERWRITE_DUPLICATES"
+        retiredProducts = []
+        attributeWriter = MosaicAttributeWriter(attrNameList)
+
+        # The manifest tells us which files have already been loaded, and is updated as each file is loaded.
+        manifestFile = GetManifestFile()
+        manifest = ReadDownloadManifest(manifestFile)
+
         rasObjList = []
 
         # List all raster in the temp_workspace
-        rasters = arcpy.ListRasters()
+        rasters = store.listRasters(temp_workspace)
         for raster in rasters:
 
             # Check to see if this is a valid 1, 3, or 7 day raster file...  just in case there are other files
-            if ValidAccumulationRaster(raster):
-
-                keyDate = Get_StartDateTime_FromString(raster, RegEx_StartDatePattern, Filename_StartDateFormat)
-                if keyDate is not None:
-
-                    # Start deriving info (start_datetime, end_datetime, and target datastet) from the raster
-                    # being processed. Build a 'raster load object' to hold the information about each raster
-                    # that we need to keep track of.
-                    rasLoadObj = RasterLoadObject()
-
-                    # 1.) save the original file name
-                    rasLoadObj.origFile = raster
-
-                    # 2.) the date and start time portion (20180801-S083000) of the raster filename is used to set
-                    #     the end_datetime attribute value on the loaded raster.  Save that here...
-                    rasLoadObj.endDate = keyDate
-
-                    # From the filename: ex. 3B-HHR-L.MS.MRG.3IMERG.20150802-S083000-E085959.0510.V05B.1day.tif
-                    # 3.) the target dataset can be identified based on the occurrence of a string sequence
-                    #     ".1day.tif" present means the target is the 1DayDSName
-                    #     ".3day.tif" present means the target is the 3DayDSName
-                    #     ".7day.tif" present means the target is the 7DayDSName
-                    # 4.) the raster load file can also be set based on the occurrence of a string sequence
-                    # 5.) the start_datetime attribute value is calculated based on the end_datetime and depending
-                    #     on whether we are processing a 1, 3, or 7 day file, the start_datetime will be
-                    #     calculated by subtracting the proper amount of days from the end_datetime.
-                    if ".1day.tif" in raster:
-                        rasLoadObj.targetDataset = target_mosaic1Day
-                        rasLoadObj.loadFile = "IMERG1Day.tif"
-                        rasLoadObj.startDate = keyDate - datetime.timedelta(days=1)
-                    elif ".3day.tif" in raster:
-                        rasLoadObj.targetDataset = target_mosaic3Day
-                        rasLoadObj.loadFile = "IMERG3Day.tif"
-                        rasLoadObj.startDate = keyDate - datetime.timedelta(days=3)
-                    elif ".7day.tif" in raster:
-                        rasLoadObj.targetDataset = target_mosaic7Day
-                        rasLoadObj.loadFile = "IMERG7Day.tif"
-                        rasLoadObj.startDate = keyDate - datetime.timedelta(days=7)
+            if ValidAccumulationRaster(raster) and IsFileAlreadyIngested(manifest, raster):
+                # Left over copy of a file that is already in the mosaic - no need to load it again.
+                logging.info('\t\tRaster {0} already loaded, removing from extract folder.'.format(raster))
+                store.deleteFile(os.path.join(temp_workspace, raster))
+
+            elif ValidAccumulationRaster(raster):
+
+                parsedFile = ParseIMERGFilename(raster)
+                if parsedFile is not None:
+
+                    rasLoadObj = BuildRasterLoadObject(parsedFile, targetDatasets)
+                    if loadMode == "swap":
+                        rasLoadObj.loadFile = GetVersionedLoadFile(rasLoadObj, oLoadDateTime)
 
                     # At this point, we have built a raster load object that we can use later, add it to
                     # a list and continue looping through the rasters.
@@ -665,6 +3293,37 @@ def LoadAccumulationRasters(temp_workspace):
 
         del rasters
 
+        # Only the newest raster of each product is loaded - the older ones would be written to the same file.
+        rasObjList, supersededRasters = SplitSupersededRasters(rasObjList)
+        for rasterSuperseded in supersededRasters:
+            logging.info('\t\tRaster {0} superseded by a newer {1} raster, removing from extract folder.'.format(
+                rasterSuperseded.origFile, rasterSuperseded.productName))
+            try:
+                store.deleteFile(os.path.join(temp_workspace, rasterSuperseded.origFile))
+                UpdateDownloadManifest(manifest, rasterSuperseded.origFile, status="skipped")
+            except:
+                logging.warning("Unable to remove superseded raster {0}: {1}".format(rasterSuperseded.origFile,
+                                                                                    capture_exception()))
+
+        # Transform all of the rasters into the final source folder first. The rasters are independent of each other
+        # so this can be done in parallel. Each worker gets an equal share of the memory ceiling.
+        maxProcesses = int(GetConfigValue("transform_MaxProcesses", 3))
+        memoryCeilingMB = float(GetConfigValue("transform_MemoryCeilingMB", 64)) / max(1, min(maxProcesses,
+                                                                                               len(rasObjList)))
+        transformJobs = []
+        for rasterToLoad in rasObjList:
+            transformJobs.append((transformEngineName,
+                                  os.path.join(temp_workspace, rasterToLoad.origFile),
+                                  os.path.join(final_RasterSourceFolder, rasterToLoad.loadFile),
+                                  minValue, maxValue, memoryCeilingMB))
+        time_Transform = get_NewStart_Time()
+        transformStats = {}
+        with MetricsTimer("transform"):
+            transformErrors = TransformRasters(transformJobs, transformEngineName, maxProcesses, transformStats)
+        logging.info("\t=== PERFORMANCE ===>: Transforming {0} rasters took: {1}".format(
+            len(transformJobs), get_Elapsed_Time_As_String(time_Transform)))
+
+        # Writes to the GDB (mosaic loads and attribute updates) are done one raster at a time.
         logging.info('Loading {0} raster files to folder {1}'.format(str(len(rasObjList)), final_RasterSourceFolder))
         for rasterToLoad in rasObjList:
             try:  # valid raster
@@ -678,24 +3337,14 @@ def LoadAccumulationRasters(temp_workspace):
                 #  III.) delete the original raster from the temp extract folder
                 #  IV.) populate the loaded raster's attributes
 
-                # Save the file to the final source folder and load it into the mosaic dataset
-                # extract = arcpy.sa.ExtractByAttributes(raster, inSQLClause)
-                extract = arcpy.sa.ExtractByAttributes(rasterToLoad.origFile, inSQLClause)
+                # The file was saved to the final source folder above, now load it into the mosaic dataset
                 loadRaster = os.path.join(final_RasterSourceFolder, rasterToLoad.loadFile)
-                extract.save(loadRaster)
-                # ----------
-                #  For some reason, the extract is causing the raster attribute table (.tif.vat.dbf file) to be created
-                # which is being locked (with a ...tif.vat.dbf.lock file) as users access the WMS service. The problem
-                # is that the lock file is never released and future updates to the raster are failing. Therefore, here
-                # we will just try to delete the raster attribute table right after it is created.
-                arcpy.DeleteRasterAttributeTable_management(loadRaster)
-                # ----------
-                arcpy.AddRastersToMosaicDataset_management(rasterToLoad.targetDataset, "Raster Dataset", loadRaster,
-                                                           "UPDATE_CELL_SIZES", "NO_BOUNDARY", "NO_OVERVIEWS",
-                                                           "2", "#", "#", "#", "#", "NO_SUBFOLDERS",
-                                                           "OVERWRITE_DUPLICATES", "BUILD_PYRAMIDS",
-                                                           "CALCULATE_STATISTICS", "NO_THUMBNAILS",
-                                                           "Add Raster Datasets", "#")
+                transformError = transformErrors.get(os.path.join(temp_workspace, rasterToLoad.origFile))
+                if transformError is not None:
+                    raise RuntimeError("Transform failed: {0}".format(transformError))
+                with MetricsTimer("mosaic_add", rasterToLoad.loadFile):
+                    store.addRasters(rasterToLoad.targetDataset, [loadRaster], duplicatesAction, buildPyramids,
+                                     calculateStatistics)
                 # arcpy.AddRastersToMosaicDataset_management(in_mosaic_dataset=rasterToLoad.targetDataset,
                 #                                            raster_type="Raster Dataset",
                 #                                            input_path=loadRaster,
@@ -719,140 +3368,356 @@ def LoadAccumulationRasters(temp_workspace):
 
                 # If we get here, we have successfully added the raster to the mosaic and saved it to its final
                 # source location, so lets go ahead and remove it from the temp extract folder now...
-                arcpy.Delete_management(rasterToLoad.origFile)
-
-                try:  # Set Attributes
-                    # Update the attributes on the raster that was just added to the mosaic dataset
-
-                    # Initialize and build attribute expression list
-                    attrExprList = [rasterToLoad.startDate, rasterToLoad.endDate]
+                store.deleteFile(os.path.join(temp_workspace, rasterToLoad.origFile))
+                UpdateDownloadManifest(manifest, rasterToLoad.origFile, status="loaded")
+                loadResult.loadedRasters.append(rasterToLoad)
 
-                    # Get the raster name minus the .tif extension
-                    rasterName_minusExt = os.path.splitext(rasterToLoad.loadFile)[0]
-                    wClause = "Name = '" + rasterName_minusExt + "'"
-
-                    with arcpy.da.UpdateCursor(rasterToLoad.targetDataset, attrNameList, wClause) as cursor:
-                        for row in cursor:
-                            for idx in range(len(attrNameList)):
-                                row[idx] = attrExprList[idx]
-                            cursor.updateRow(row)
-
-                    del cursor
-
-                except:  # Set Attributes
-                    err = capture_exception()
-                    logging.warning("\t...Raster attributes not set for raster {0}. Error = {1}".format(
-                        rasterToLoad.origFile, err))
+                # Queue the attributes of the raster that was just added to the mosaic dataset. They are all set
+                # together once every raster is loaded. (The raster name is the load file minus the .tif extension.)
+                attributeWriter.add(rasterToLoad.targetDataset, os.path.splitext(rasterToLoad.loadFile)[0],
+                                    [rasterToLoad.startDate, rasterToLoad.endDate])
 
             except:  # valid raster
                 err = capture_exception()
                 logging.warning('\t...Raster {0} not loaded into mosaic! Error = {1}'.format(
                     rasterToLoad.origFile, err))
-
+                loadResult.failedRasters.append(rasterToLoad)
+
+        # Set Attributes - one cursor per mosaic dataset
+        with MetricsTimer("attributes"):
+            updatedRasters = attributeWriter.apply()
+
+        if loadMode == "swap":
+            # The new items are in place with their times set - now retire the previous one(s).
+            for rasterLoaded in loadResult.loadedRasters:
+                rasterName_minusExt = os.path.splitext(rasterLoaded.loadFile)[0]
+                if (rasterLoaded.targetDataset, rasterName_minusExt) not in updatedRasters:
+                    continue
+                try:
+                    RetireMosaicRasters(rasterLoaded.targetDataset, rasterLoaded.productName, rasterName_minusExt)
+                    retiredProducts.append(rasterLoaded.productName)
+                except:
+                    err = capture_exception()
+                    logging.warning("\t...Previous {0} rasters not retired. Error = {1}".format(
+                        rasterLoaded.productName, err))
+
+        if loadMode == "swap":
+            # Clean up the files of items retired by this, or an earlier, run. (Only for the products whose old
+            # mosaic items were removed - otherwise the files may still be in use.)
+            keepMinutes = float(GetConfigValue("load_SwapKeepMinutes", 60))
+            retiredRastersFile = GetRetiredRastersFile()
+            retiredRasters = ReadRetiredRasters(retiredRastersFile)
+            for rasterLoaded in [r for r in loadResult.loadedRasters if r.productName in retiredProducts]:
+                deletedCount = CollectRetiredRasterFiles(final_RasterSourceFolder, rasterLoaded.productName,
+                                                         rasterLoaded.loadFile, keepMinutes, retiredRasters,
+                                                         oLoadDateTime)
+                if deletedCount > 0:
+                    logging.info("Deleted {0} retired {1} raster file(s).".format(deletedCount,
+                                                                                rasterLoaded.productName))
+            # Forget the files that are gone (i.e. deleted by hand)
+            for fileName in retiredRasters.keys():
+                if not os.path.exists(os.path.join(final_RasterSourceFolder, fileName)):
+                    del retiredRasters[fileName]
+            WriteRetiredRasters(retiredRastersFile, retiredRasters)
+
+        WriteTransformReport(loadResult, transformStats, temp_workspace)
         del rasObjList[:]
+        WriteDownloadManifest(manifestFile, manifest)
 
     except:
         err = capture_exception()
         logging.error(err)
 
+    return loadResult
 
-def refreshService(clsSvc):
+
+def ProcessBackfill(oStartDate, oEndDate):
     """
-        Restart the ArcGIS Service (Stop and Start) using the URL token service and class object passed in.
+        Backfill mode - loads every accumulation file (of each registered product) whose date falls between
+        oStartDate and oEndDate (inclusive) into time enabled mosaic datasets. Used to rebuild history after an outage.
+        1 - Lists each <base>/<year>/<month> source folder in the range once, and selects every matching file.
+        2 - Downloads the selected files in parallel into the backfill extract folder (skipping files the backfill
+            manifest shows are already loaded - see GetBackfillManifestFile()).
+        3 - Transforms the downloaded files in parallel into the backfill folder. Each file keeps its original unique
+            name, so nothing is overwritten.
+        4 - Bulk loads the files into their mosaic datasets (one load per mosaic) and sets their start/end times.
+        Returns an AccumulationLoadResult listing the rasters that were loaded, or None if a product has no backfill
+        mosaic dataset of its own (see GetBackfillDatasetErrors()) - nothing is loaded then.
     """
+    datasetErrors = GetBackfillDatasetErrors(GetProductRegistry())
+    if datasetErrors:
+        for theError in datasetErrors:
+            logging.error(theError)
+        logging.error("Backfill was not run.")
+        return None
 
-    # Try and stop the service
+    loadResult = AccumulationLoadResult()
     try:
-        # Get a token from the Administrator Directory
-        tokenParams = urllib.urlencode({"f": "json", "username": clsSvc.username,
-                                        "password": clsSvc.password, "client": "requestip"})
-        tokenResponse = urllib.urlopen(clsSvc.adminURL + "/generateToken?", tokenParams).read()
-        tokenResponseJSON = json.loads(tokenResponse)
-        token = tokenResponseJSON["token"]
+        ftpHost = "ftp://" + GetConfigString("ftp_host")
+        extractFolder = GetConfigValue("backfill_ExtractFolder",
+                                       os.path.join(GetConfigString("extract_AccumulationsFolder"), "Backfill"))
+        backfillFolder = GetConfigValue("backfill_Folder", GetConfigString("final_Folder"))
+        store = GetMosaicStore()
+        targetDatasets = dict((product.name, store.getDatasetPath(product.backfillDSName))
+                              for product in GetProductRegistry().products)
+        attrNameList = [GetConfigString('rasterStartTimeProperty'), GetConfigString('rasterEndTimeProperty')]
 
-        # Attempt to stop the service
-        stopParams = urllib.urlencode({"token": token, "f": "json"})
-        stopResponse = urllib.urlopen(clsSvc.adminURL + "/services/" + clsSvc.folder + "/" + clsSvc.svcName + "." +
-                                      clsSvc.svcType + "/stop?", stopParams).read()
-        stopResponseJSON = json.loads(stopResponse)
-        stopStatus = stopResponseJSON["status"]
+        for theFolder in [extractFolder, backfillFolder]:
+            if not create_folder(theFolder):
+                logging.error("Could not create folder: {0}. Try to create manually and run again!".format(theFolder))
+                return loadResult
 
-        if "success" not in stopStatus:
-            logging.warning("UNABLE TO STOP SERVICE " + clsSvc.folder + "/" + clsSvc.svcName +
-                            "/" + clsSvc.svcType + " STATUS = " + stopStatus)
-        else:
-            logging.info("Service: " + clsSvc.svcName + " has been stopped.")
+        # Include the whole end day
+        oRangeEnd = datetime.datetime(oEndDate.year, oEndDate.month, oEndDate.day) + datetime.timedelta(days=1)
+        logging.info("Backfilling accumulation files from {0} to {1}".format(oStartDate.strftime('%Y-%m-%d'),
+                                                                            oEndDate.strftime('%Y-%m-%d')))
 
-    except Exception, e:
-        logging.error("### ERROR ### - Stop Service failed for " + clsSvc.svcName + ", System Error Message: " + str(e))
+        manifestFile = GetBackfillManifestFile(extractFolder)
+        manifest = ReadDownloadManifest(manifestFile)
 
-    # Try and start the service
-    try:
-        # Get a token from the Administrator Directory
-        tokenParams = urllib.urlencode({"f": "json", "username": clsSvc.username,
-                                        "password": clsSvc.password, "client": "requestip"})
-        tokenResponse = urllib.urlopen(clsSvc.adminURL + "/generateToken?", tokenParams).read()
-        tokenResponseJSON = json.loads(tokenResponse)
-        token = tokenResponseJSON["token"]
+        # 1.) List each month folder in the range once and select every matching file
+        time_Listing = get_NewStart_Time()
+        downloadList = []
+        rasObjList = []
+        oYear, oMonth = oStartDate.year, oStartDate.month
+        while (oYear, oMonth) <= (oEndDate.year, oEndDate.month):
+            ftpFolder = GetSourceMonthFolder(oYear, oMonth)
+            try:
+                folderList = GetMonthFolderListing(oYear, oMonth, datetime.datetime.now(), ListProxyFolder)
+            except:
+                logging.warning("Unable to list source folder {0}: {1}".format(ftpFolder, capture_exception()))
+                folderList = []
+
+            for parsedFile in IMERGFilenameIndex(folderList).inRange(oStartDate, oRangeEnd):
+                ftpFile = parsedFile.fileName
+                if IsFileAlreadyIngested(manifest, ftpFile):
+                    continue
+
+                rasLoadObj = BuildRasterLoadObject(parsedFile, targetDatasets)
+                # Backfilled rasters keep their unique source name so they can live side by side in the mosaic.
+                rasLoadObj.loadFile = ftpFile
+                rasObjList.append(rasLoadObj)
+
+                targetExtractFile = os.path.join(extractFolder, ftpFile)
+                if not IsFileAlreadyDownloaded(manifest, ftpFile, targetExtractFile):
+                    downloadList.append(DownloadItem(ProxyFileURL + ftpHost + ftpFolder + "/" + ftpFile,
+                                                     targetExtractFile, rasLoadObj.productName))
+
+            # Next month
+            oMonth += 1
+            if oMonth > 12:
+                oYear, oMonth = oYear + 1, 1
+
+        logging.info("Selected {0} files to backfill ({1} to download).".format(len(rasObjList), len(downloadList)))
+        logging.info("\t=== PERFORMANCE ===>: Backfill listing took: " + get_Elapsed_Time_As_String(time_Listing))
+
+        # 2.) Download the selected files in parallel
+        time_Download = get_NewStart_Time()
+        with MetricsTimer("download"):
+            DownloadFilesConcurrently(downloadList, int(GetConfigValue("download_MaxConcurrent", 3)))
+        for dlItem in downloadList:
+            if dlItem.succeeded:
+                RecordDownloadedFile(manifest, os.path.basename(dlItem.targetFile), dlItem.targetFile,
+                                     dlItem.remoteModified)
+        WriteDownloadManifest(manifestFile, manifest)
+        logging.info("\t=== PERFORMANCE ===>: Backfill download took: " + get_Elapsed_Time_As_String(time_Download))
+
+        # 3.) Transform the downloaded files in parallel
+        rasObjList = [r for r in rasObjList if os.path.isfile(os.path.join(extractFolder, r.origFile))]
+        transformEngineName = GetRasterTransformEngineName()
+        if transformEngineName == "arcpy":
+            CheckOutSpatialAnalyst()
+        buildPyramids, calculateStatistics = GetMosaicLoadBuildOptions(transformEngineName)
+        maxProcesses = int(GetConfigValue("transform_MaxProcesses", 3))
+        memoryCeilingMB = float(GetConfigValue("transform_MemoryCeilingMB", 64)) / max(1, min(maxProcesses,
+                                                                                               len(rasObjList)))
+        transformJobs = [(transformEngineName,
+                          os.path.join(extractFolder, r.origFile),
+                          os.path.join(backfillFolder, r.loadFile),
+                          GetConfigValue("transform_MinValue", 0),
+                          GetConfigValue("transform_MaxValue", 29999),
+                          memoryCeilingMB) for r in rasObjList]
+        time_Transform = get_NewStart_Time()
+        transformStats = {}
+        with MetricsTimer("transform"):
+            transformErrors = TransformRasters(transformJobs, transformEngineName, maxProcesses, transformStats)
+        logging.info("\t=== PERFORMANCE ===>: Backfill transform of {0} rasters took: {1}".format(
+            len(transformJobs), get_Elapsed_Time_As_String(time_Transform)))
+
+        # 4.) Bulk load - one AddRastersToMosaicDataset call per mosaic dataset
+        time_Load = get_NewStart_Time()
+        attributeWriter = MosaicAttributeWriter(attrNameList)
+        # (Products may share a mosaic dataset - each one is loaded once.)
+        backfillDatasets = []
+        for product in GetProductRegistry().products:
+            if targetDatasets[product.name] not in backfillDatasets:
+                backfillDatasets.append(targetDatasets[product.name])
+        for targetDataset in backfillDatasets:
+            mosaicRasters = []
+            for rasterToLoad in rasObjList:
+                if rasterToLoad.targetDataset != targetDataset:
+                    continue
+                transformError = transformErrors.get(os.path.join(extractFolder, rasterToLoad.origFile))
+                if transformError is not None:
+                    logging.warning('\t...Raster {0} not transformed! Error = {1}'.format(rasterToLoad.origFile,
+                                                                                         transformError))
+                    loadResult.failedRasters.append(rasterToLoad)
+                else:
+                    mosaicRasters.append(rasterToLoad)
+            if len(mosaicRasters) == 0:
+                continue
 
-        # Attempt to stop the current service
-        startParams = urllib.urlencode({"token": token, "f": "json"})
-        startResponse = urllib.urlopen(clsSvc.adminURL + "/services/" + clsSvc.folder + "/" + clsSvc.svcName + "." +
-                                       clsSvc.svcType + "/start?", startParams).read()
-        startResponseJSON = json.loads(startResponse)
-        startStatus = startResponseJSON["status"]
+            try:
+                logging.info("Loading {0} rasters into {1}".format(len(mosaicRasters), targetDataset))
+                inputPaths = [os.path.join(backfillFolder, r.loadFile) for r in mosaicRasters]
+                with MetricsTimer("mosaic_add", os.path.basename(targetDataset)):
+                    store.addRasters(targetDataset, inputPaths, "EXCLUDE_DUPLICATES", buildPyramids,
+                                     calculateStatistics, "UPDATE_BOUNDARY")
+            except:
+                err = capture_exception()
+                logging.warning('\t...Rasters not loaded into mosaic {0}! Error = {1}'.format(targetDataset, err))
+                loadResult.failedRasters.extend(mosaicRasters)
+                continue
+
+            for rasterToLoad in mosaicRasters:
+                store.deleteFile(os.path.join(extractFolder, rasterToLoad.origFile))
+                UpdateDownloadManifest(manifest, rasterToLoad.origFile, status="loaded")
+                loadResult.loadedRasters.append(rasterToLoad)
+                attributeWriter.add(rasterToLoad.targetDataset, os.path.splitext(rasterToLoad.loadFile)[0],
+                                    [rasterToLoad.startDate, rasterToLoad.endDate])
+
+        # Set the start/end times of all of the loaded rasters - one cursor per mosaic dataset
+        with MetricsTimer("attributes"):
+            attributeWriter.apply()
+        WriteTransformReport(loadResult, transformStats, extractFolder)
+        WriteDownloadManifest(manifestFile, manifest)
+        logging.info("\t=== PERFORMANCE ===>: Backfill load took: " + get_Elapsed_Time_As_String(time_Load))
 
-        if "success" in startStatus:
-            logging.info("Started service: " + clsSvc.folder + "/" + clsSvc.svcName + "/" + clsSvc.svcType)
-        else:
-            logging.warning("UNABLE TO START SERVICE " + clsSvc.folder + "/" + clsSvc.svcName +
-                            "/" + clsSvc.svcType + " STATUS = " + startStatus)
-    except Exception, e:
-        logging.error("### ERROR ### - Start Service failed for " + clsSvc.svcName + ", System Error Message: " + str(e))
+    except:
+        err = capture_exception()
+        logging.error(err)
 
+    return loadResult
 
-def main():
+
+def PostServiceAdminRequest(clsSvc, operation):
+    """
+        Sends an admin operation (i.e. "stop" or "start") for the service using a cached admin token, and returns the
+        json response as a dictionary. If the token has been rejected (expired or invalidated on the server), a new
+        one is requested and the operation is tried once more.
+    """
+    svcURL = clsSvc.adminURL + "/services/" + clsSvc.folder + "/" + clsSvc.svcName + "." + clsSvc.svcType
+    for bForceNew in [False, True]:
+        token = GetAdminToken(clsSvc, bForceNew)
+        params = urllib.urlencode({"token": token, "f": "json"})
+        responseJSON = json.loads(OpenURL(svcURL + "/" + operation + "?", params).read())
+        if responseJSON.get("code") not in (498, 499):
+            return responseJSON
+    return responseJSON
+
+
+def SendServiceOperation(serviceOperation):
+    """
+        Worker for RefreshServices(). Sends one admin operation ("stop" or "start") for one service, and returns a
+        (clsSvc, operation, succeeded) tuple. Never raises, so one failed service doesn't stop the others.
+    """
+    clsSvc, operation = serviceOperation
+    svcLabel = clsSvc.folder + "/" + clsSvc.svcName + "/" + clsSvc.svcType
     try:
+        responseJSON = PostServiceAdminRequest(clsSvc, operation)
+        status = responseJSON.get("status", "")
+        if "success" in status:
+            logging.info("Service: " + svcLabel + " '" + operation + "' succeeded.")
+            return clsSvc, operation, True
+        logging.warning("UNABLE TO " + operation.upper() + " SERVICE " + svcLabel + " STATUS = " + str(status))
+    except Exception, e:
+        logging.error("### ERROR ### - " + operation.capitalize() + " Service failed for " + clsSvc.svcName +
+                      ", System Error Message: " + str(e))
+    return clsSvc, operation, False
 
-        # Setup any required and/or optional arguments to be passed in.
-        args = setupArgs()
 
-        # Check if the user passed in a log level argument, either DEBUG, INFO, or WARNING. Otherwise, default to INFO.
-        if args.logging:
-            log_level = args.logging
-        else:
-            log_level = "INFO"    # Available values are: DEBUG, INFO, WARNING, ERROR
+def WaitForServicesStarted(serviceList, timeoutSeconds, pollSeconds):
+    """
+        Polls the '/status' of each service until its realTimeState is STARTED or timeoutSeconds has passed.
+        Returns a dictionary of svcName: True/False (started).
+    """
+    serviceStarted = dict((clsSvc.svcName, False) for clsSvc in serviceList)
+    pending = list(serviceList)
+    deadline = time.time() + timeoutSeconds
+    while len(pending) > 0:
+        for clsSvc in list(pending):
+            try:
+                statusJSON = PostServiceAdminRequest(clsSvc, "status")
+                if statusJSON.get("realTimeState") == "STARTED":
+                    serviceStarted[clsSvc.svcName] = True
+                    pending.remove(clsSvc)
+            except Exception, e:
+                logging.debug("Status check failed for " + clsSvc.svcName + ": " + str(e))
+        if len(pending) == 0 or time.time() + pollSeconds > deadline:
+            break
+        time.sleep(pollSeconds)
+
+    for clsSvc in pending:
+        logging.warning("Service: " + clsSvc.folder + "/" + clsSvc.svcName + "/" + clsSvc.svcType +
+                        " did not report STARTED within " + str(timeoutSeconds) + " seconds.")
+    return serviceStarted
+
+
+def RefreshServices(serviceList):
+    """
+        Restarts (Stop and Start) all of the ArcGIS Services passed in at once. The admin token is fetched once up
+        front, the stop requests for all of the services are sent in parallel, then the start requests, and then each
+        service's status is polled until it reports STARTED (or the 'svc_StatusTimeoutSeconds' timeout is reached).
+        Returns a dictionary of svcName: True/False (running again).
+    """
+    if len(serviceList) == 0:
+        return {}
+
+    maxConcurrent = int(GetConfigValue("svc_MaxConcurrent", 4))
+    timeoutSeconds = int(GetConfigValue("svc_StatusTimeoutSeconds", 120))
+    pollSeconds = float(GetConfigValue("svc_StatusPollSeconds", 2))
+
+    # Get the token(s) once, before any of the workers need one. A service whose server can't hand out a token is
+    # left out, so the others are still refreshed.
+    tokenList = []
+    for clsSvc in serviceList:
+        try:
+            GetAdminToken(clsSvc)
+            tokenList.append(clsSvc)
+        except Exception, e:
+            logging.error("### ERROR ### - Unable to get an admin token for " + clsSvc.svcName +
+                          ", System Error Message: " + str(e))
+
+    startResults = []
+    if len(tokenList) > 0:
+        pool = ThreadPool(max(1, min(maxConcurrent, len(tokenList))))
+        try:
+            pool.map(SendServiceOperation, [(clsSvc, "stop") for clsSvc in tokenList])
+            startResults = pool.map(SendServiceOperation, [(clsSvc, "start") for clsSvc in tokenList])
+        finally:
+            pool.close()
+            pool.join()
+
+    # Only wait on the services that accepted the start request
+    startedList = [clsSvc for clsSvc, operation, succeeded in startResults if succeeded]
+    serviceStarted = dict((clsSvc.svcName, False) for clsSvc in serviceList)
+    serviceStarted.update(WaitForServicesStarted(startedList, timeoutSeconds, pollSeconds))
+    return serviceStarted
 
-        # Setup logfile
-        logDir = GetConfigString("logFileDir")
-        logPrefix = GetConfigString("logFilePrefix")
-        logFilename = logPrefix + "_" + datetime.date.today().strftime('%Y-%m-%d') + '.log'
-        FullLogFile = os.path.join(logDir, logFilename)
-        logging.basicConfig(filename=FullLogFile,
-                            level=log_level,
-                            format='%(asctime)s: %(levelname)s --- %(message)s',
-                            datefmt='%m/%d/%Y %I:%M:%S %p')
-
-        logging.info('====================================== SESSION START ===========================================')
-        logging.info("\t\t\t" + getScriptName())
-
-        # Get a start time for the entire script run process.
-        time_TotalScriptRun = get_NewStart_Time()
-
-        GDB_mosaic1Day = os.path.join(GetConfigString("GDBPath"), GetConfigString("1DayDSName"))
-        GDB_mosaic3Day = os.path.join(GetConfigString("GDBPath"), GetConfigString("3DayDSName"))
-        GDB_mosaic7Day = os.path.join(GetConfigString("GDBPath"), GetConfigString("7DayDSName"))
-        DateTimeFormat = GetConfigString("GDB_DateFormat")
-
-        # Get datetime for right now
-        o_today_DateTime = datetime.datetime.strptime(datetime.datetime.now().strftime(DateTimeFormat), DateTimeFormat)
-
-        # Create the Extract folder
-        extractFolder = GetConfigString("extract_AccumulationsFolder")
-        if not create_folder(extractFolder):
-            logging.error("Could not create folder: {0}. Try to create manually and run again!".format(extractFolder))
-            return
 
+def refreshService(clsSvc):
+    """
+        Restart the ArcGIS Service (Stop and Start) using the URL token service and class object passed in.
+    """
+    return RefreshServices([clsSvc])[clsSvc.svcName]
+
+
+def ProcessLatestAccumulations(oTodaysDateTime, extractFolder):
+    """
+        The normal (scheduled) run: downloads the latest 1, 3, and 7 day files into the extract folder and loads them
+        into their respective mosaic datasets. Returns the AccumulationLoadResult, or None if the download step failed.
+    """
+    try:
         logging.info("-----------------------------------------------------")
         logging.info("Getting Latest Accumulation Files from FTP (proxy)...")
         logging.info("-----------------------------------------------------")
@@ -861,14 +3726,20 @@ def main():
         time_ftpProcess = get_NewStart_Time()
 
         # Download the latest 1, 3, and 7 Day files from the FTP site into the Extract folder.
-        logging.info("...using date {0} to determine source FTP folder.".format(o_today_DateTime.strftime('%m/%d/%Y %I:%M:%S %p')))
-        # bGoodSoFar = ProcessAccumulationFiles(o_today_DateTime)
-        bGoodSoFar = ProcessAccumulationFiles_FromProxy(o_today_DateTime)
+        logging.info("...using date {0} to determine source FTP folder.".format(oTodaysDateTime.strftime('%m/%d/%Y %I:%M:%S %p')))
+        # bGoodSoFar = ProcessAccumulationFiles(oTodaysDateTime)
+        # (With the 'halfhourly' source, the 1, 3, and 7 day files are built from the half hourly files instead.)
+        if GetAccumulationSource() == "halfhourly":
+            retrieveFunc = ProcessHalfHourlyAccumulations
+        else:
+            retrieveFunc = ProcessAccumulationFiles_FromProxy
+        with MetricsTimer("retrieve"):
+            bGoodSoFar = retrieveFunc(oTodaysDateTime)
         if not bGoodSoFar:
-            logging.error("General Status: ProcessAccumulationFiles_FromProxy() returned an invalid status code.")
-            return
-        logging.info("\t=== PERFORMANCE ===>: ProcessAccumulationFiles_FromProxy took: " +
-                     get_Elapsed_Time_As_String(time_ftpProcess))
+            logging.error("General Status: {0}() returned an invalid status code.".format(retrieveFunc.__name__))
+            return None
+        logging.info("\t=== PERFORMANCE ===>: {0} took: {1}".format(retrieveFunc.__name__,
+                                                                  get_Elapsed_Time_As_String(time_ftpProcess)))
 
         # At this point, the 1, 3, and 7 day raster files should be downloaded from the FTP site into the
         # extract folder and be ready to load into their respective mosaic dataset.
@@ -880,10 +3751,166 @@ def main():
         time_loadProcess = get_NewStart_Time()
 
         # Load the 1, 3, and 7 Day files from the Extract folder to their respective mosaic dataset.
-        LoadAccumulationRasters(extractFolder)
+        # (Nothing to do if every latest file was already loaded on a previous run.)
+        if len(GetPendingAccumulationRasters(extractFolder)) > 0:
+            with MetricsTimer("load"):
+                loadResult = LoadAccumulationRasters(extractFolder)
+        else:
+            logging.info("No new accumulation rasters to load.")
+            loadResult = AccumulationLoadResult()
         logging.info("\t=== PERFORMANCE ===>: LoadingAccumulationFiles took: " +
                      get_Elapsed_Time_As_String(time_loadProcess))
 
+        return loadResult
+
+    except:
+        err = capture_exception()
+        logging.error(err)
+        return None
+
+
+def ReadMaintenanceState(stateFile):
+    """
+        Reads the compaction state file (json). Returns a dictionary with the keys:
+          'lastCompact':      when the store was last compacted ('%Y-%m-%dT%H:%M:%S'), or None.
+          'sizeAfterCompact': total size (bytes) of the store right after that compact.
+          'churnBytes':       bytes written and deleted (the sum of the file size changes) since then.
+          'fileSizes':        file name -> size (bytes), as of the previous run.
+    """
+    state = {"lastCompact": None, "sizeAfterCompact": 0, "churnBytes": 0, "fileSizes": {}}
+    readableFile = GetReadableFile(stateFile)
+    if os.path.isfile(readableFile):
+        try:
+            with open(readableFile, "r") as inFile:
+                state.update(json.load(inFile))
+        except:
+            logging.warning("Unable to read maintenance state file {0}, starting a new one: {1}".format(
+                stateFile, capture_exception()))
+    return state
+
+
+def WriteMaintenanceState(stateFile, state):
+    # Writes the compaction state to a temp file first, so a failed write can't corrupt the existing state file.
+    with open(stateFile + ".tmp", "w") as outFile:
+        json.dump(state, outFile, indent=2)
+    ReplaceFile(stateFile + ".tmp", stateFile)
+
+
+def GetOffPeakWindowStart(oDateTime, offPeakWindow):
+    """
+        If the time of oDateTime falls within offPeakWindow - a 'HH:MM-HH:MM' string (the window may wrap past
+        midnight, i.e. '23:00-02:00') - returns the datetime that this window opened, otherwise None. An empty window
+        is never matched.
+    """
+    if not offPeakWindow:
+        return None
+    windowStart, windowEnd = [datetime.datetime.strptime(t.strip(), "%H:%M").time() for t in offPeakWindow.split("-")]
+    timeOfDay = oDateTime.time()
+    if windowStart <= windowEnd:
+        bInWindow = windowStart <= timeOfDay < windowEnd
+    else:
+        bInWindow = timeOfDay >= windowStart or timeOfDay < windowEnd
+    if not bInWindow:
+        return None
+    oWindowStart = datetime.datetime.combine(oDateTime.date(), windowStart)
+    if timeOfDay < windowStart:
+        oWindowStart -= datetime.timedelta(days=1)
+    return oWindowStart
+
+
+def RunScheduledCompaction(oTodaysDateTime, bChanged=True):
+    """
+        Compacts the mosaic store only when it is worth it. The file sizes of the store are recorded in a state file
+        (the 'maintenance_StateFile' setting) on each run, and the size changes add up to the bytes written and
+        deleted since the last compact. The store is compacted when that churn passes 'maintenance_CompactThreshold'
+        (a fraction of the store's size after the last compact), or during the 'maintenance_OffPeakWindow' (once per
+        window, and only if anything changed). The time taken and space reclaimed are logged.
+        bChanged is False when this pass loaded nothing - the store's files can't have changed then, so unless an
+        off-peak compact is due for the churn already recorded, it returns without opening the store (or importing
+        arcpy).
+        Returns True if the store was compacted.
+    """
+    stateFile = GetConfigValue("maintenance_StateFile",
+                               os.path.join(GetConfigString("logFileDir"), "IMERG_MaintenanceState.json"))
+    threshold = float(GetConfigValue("maintenance_CompactThreshold", 0.2))
+    offPeakWindow = GetConfigValue("maintenance_OffPeakWindow", "")
+
+    state = ReadMaintenanceState(stateFile)
+    oWindowStart = GetOffPeakWindowStart(oTodaysDateTime, offPeakWindow)
+    if not bChanged:
+        bOffPeakDue = (state["lastCompact"] is not None and state["churnBytes"] > 0 and oWindowStart is not None and
+                       datetime.datetime.strptime(state["lastCompact"], '%Y-%m-%dT%H:%M:%S') < oWindowStart)
+        if not bOffPeakDue:
+            logging.info("Skipping compact - nothing was loaded.")
+            return False
+
+    store = GetMosaicStore()
+    fileSizes = store.getFileSizes()
+    previousSizes = state["fileSizes"]
+    for fileName in set(fileSizes) | set(previousSizes):
+        state["churnBytes"] += abs(fileSizes.get(fileName, 0) - previousSizes.get(fileName, 0))
+    state["fileSizes"] = fileSizes
+    currentSize = sum(fileSizes.values())
+
+    if state["lastCompact"] is None:
+        # First run - nothing to compare against yet
+        state["lastCompact"] = oTodaysDateTime.strftime('%Y-%m-%dT%H:%M:%S')
+        state["sizeAfterCompact"] = currentSize
+        state["churnBytes"] = 0
+    churnRatio = float(state["churnBytes"]) / max(1, state["sizeAfterCompact"])
+
+    oLastCompact = datetime.datetime.strptime(state["lastCompact"], '%Y-%m-%dT%H:%M:%S')
+    bOffPeak = state["churnBytes"] > 0 and oWindowStart is not None and oLastCompact < oWindowStart
+    bCompacted = False
+    if churnRatio >= threshold or bOffPeak:
+        logging.info("Compacting the mosaic store ({0} bytes changed since the last compact, {1:.1%}{2})...".format(
+            state["churnBytes"], churnRatio, ", off-peak window" if bOffPeak else ""))
+        time_Compact = get_NewStart_Time()
+        with MetricsTimer("compact"):
+            store.compact()
+        fileSizes = store.getFileSizes()
+        sizeAfterCompact = sum(fileSizes.values())
+        logging.info("\t=== PERFORMANCE ===>: Compact took: {0}, reclaimed {1} bytes ({2} -> {3} bytes)".format(
+            get_Elapsed_Time_As_String(time_Compact), currentSize - sizeAfterCompact, currentSize, sizeAfterCompact))
+        runMetrics.increment("compact_reclaimed_bytes", currentSize - sizeAfterCompact)
+        state.update({"lastCompact": oTodaysDateTime.strftime('%Y-%m-%dT%H:%M:%S'),
+                      "sizeAfterCompact": sizeAfterCompact,
+                      "churnBytes": 0,
+                      "fileSizes": fileSizes})
+        bCompacted = True
+    else:
+        logging.info("Skipping compact - {0} bytes changed since the last compact ({1:.1%}, threshold {2:.1%}).".format(
+            state["churnBytes"], churnRatio, threshold))
+
+    try:
+        WriteMaintenanceState(stateFile, state)
+    except:
+        logging.warning("Unable to write maintenance state file {0}: {1}".format(stateFile, capture_exception()))
+    return bCompacted
+
+
+def BuildMapService(svcName, svcType):
+    # Returns a MapService for a service on the ArcGIS server (and folder) given by the 'svc_' config settings.
+    clsSvc = MapService()
+    clsSvc.adminURL = GetConfigString('svc_adminURL')
+    clsSvc.username = GetConfigString('svc_username')
+    clsSvc.password = GetConfigString('svc_password')
+    clsSvc.folder = GetConfigString('svc_folder')
+    clsSvc.svcType = svcType
+    clsSvc.svcName = svcName
+    return clsSvc
+
+
+def UpdateChangedProducts(loadResult, oTodaysDateTime):
+    """
+        Runs the stages that follow a mosaic load (GDB maintenance, services JSON file updates, and service refresh) for
+        only the products listed as changed in the AccumulationLoadResult passed in.
+    """
+    try:
+        changedProducts = loadResult.changedProducts()
+        if loadResult.hasChanges():
+            logging.info("Products changed: {0}".format(", ".join(changedProducts)))
+
         logging.info("-------------------------------------")
         logging.info("Performing geodatabase maintenance...")
         logging.info("-------------------------------------")
@@ -894,92 +3921,333 @@ def main():
         # Do some routine maintenance on the GDB mosaic datasets...
         # No since in calculating statistics as this is now done as rasters are loaded into the mosaic dataset
         # logging.info("Calculating statistics...")
-        # arcpy.CalculateStatistics_management(GDB_mosaic1Day, "1", "1", "#", "OVERWRITE", "#")
-        # arcpy.CalculateStatistics_management(GDB_mosaic3Day, "1", "1", "#", "OVERWRITE", "#")
-        # arcpy.CalculateStatistics_management(GDB_mosaic7Day, "1", "1", "#", "OVERWRITE", "#")
-        logging.info("Compacting file geodatabase...")
-        arcpy.Compact_management(GetConfigString("GDBPath"))
-        logging.info("\t=== PERFORMANCE ===>: GDB Maintenance (Calc Stats and Compact) took: " +
+        # for product in GetProductRegistry().products:
+        #     arcpy.CalculateStatistics_management(GetMosaicStore().getDatasetPath(product.dsName), "1", "1", "#",
+        #                                          "OVERWRITE", "#")
+        # The compact only runs when enough has changed since the last one, or in the off-peak window.
+        with MetricsTimer("maintenance"):
+            RunScheduledCompaction(oTodaysDateTime, loadResult.hasChanges())
+        logging.info("\t=== PERFORMANCE ===>: GDB Maintenance took: " +
                      get_Elapsed_Time_As_String(time_GDBMaintenanceProcess))
 
-        logging.info("-----------------------------")
-        logging.info("Refreshing the WMS service...")
-        logging.info("-----------------------------")
+        # If nothing was loaded, there is no service to refresh.
+        if not loadResult.hasChanges():
+            logging.info("No mosaic datasets were changed - skipping the service refresh.")
+        else:
+            logging.info("-----------------------------")
+            logging.info("Refreshing the WMS service...")
+            logging.info("-----------------------------")
+
+            # Grab a timer reference
+            time_RefreshServiceProcess = get_NewStart_Time()
+
+            logging.info("Refreshing the services...")
+
+            # Only the image services whose product changed need to be refreshed. The combined map service shows all
+            # of the products, so it is refreshed whenever any of them changed.
+            changedServices = []
+            for productName in changedProducts:
+                product = GetProductRegistry().byName(productName)
+                if product is None or product.svcName == "":
+                    logging.warning("No image service is set for the {0} product.".format(productName))
+                else:
+                    changedServices.append(BuildMapService(product.svcName, 'ImageServer'))
+            changedServices.append(BuildMapService(GetConfigString('svc_Name_All'), 'MapServer'))
+
+            # Note the arcpy.PublishingTools.RefreshService() call must only be available at ArcGIS 10.6 and later
+            # as it doesn't seem to work at 10.4
+            ### arcpy.ImportToolbox(r'C:\temp\arcgis_localhost_siteadmin_USE_THIS_ONE.ags;System/Publishing Tools')
+            ### for changedSvc in changedServices:
+            ###     arcpy.PublishingTools.RefreshService(changedSvc.svcName, changedSvc.svcType, changedSvc.folder, "#")
+            # Restart the changed services all at once (only when enabled in the config). In swap load mode the
+            # services already see the new mosaic items, so they are left running.
+            if GetLoadMode() == "swap":
+                logging.info("Load mode is 'swap' - the services do not need to be restarted.")
+            elif GetConfigValue("svc_RefreshServices", False):
+                with MetricsTimer("refresh"):
+                    serviceStarted = RefreshServices(changedServices)
+                failedServices = [svcName for svcName, bStarted in serviceStarted.items() if not bStarted]
+                if len(failedServices) > 0:
+                    logging.warning("Services not confirmed as running: {0}".format(", ".join(failedServices)))
+            # Update the JSON file used to verify service updates...
+            jsonFile = GetConfigString('JSONFile_ServiceUpdates')
+            for changedSvc in changedServices:
+                UpdateServicesJsonFile(jsonFile, changedSvc.svcName, oTodaysDateTime)
+
+            logging.info("\t=== PERFORMANCE ===>: RefreshServiceProcess took: " +
+                         get_Elapsed_Time_As_String(time_RefreshServiceProcess))
+
+    except:
+        err = capture_exception()
+        logging.error(err)
+
+
+def SetupLogFile(log_level):
+    """
+        Points the log at today's log file (<logFileDir>/<logFilePrefix>_YYYY-MM-DD.log). Called again before each pass
+        in daemon mode, so a resident process still gets one log file per day.
+    """
+    logDir = GetConfigString("logFileDir")
+    logPrefix = GetConfigString("logFilePrefix")
+    logFilename = logPrefix + "_" + datetime.date.today().strftime('%Y-%m-%d') + '.log'
+    FullLogFile = os.path.join(logDir, logFilename)
+
+    rootLogger = logging.getLogger()
+    for handler in list(rootLogger.handlers):
+        if isinstance(handler, logging.FileHandler):
+            if handler.baseFilename == os.path.abspath(FullLogFile):
+                return
+            rootLogger.removeHandler(handler)
+            handler.close()
+    logging.basicConfig(filename=FullLogFile,
+                        level=log_level,
+                        format='%(asctime)s: %(levelname)s --- %(message)s',
+                        datefmt='%m/%d/%Y %I:%M:%S %p')
+
+
+def GetCurrentDateTime():
+    # Returns the datetime for right now, truncated to the 'GDB_DateFormat' precision.
+    DateTimeFormat = GetConfigString("GDB_DateFormat")
+    return datetime.datetime.strptime(datetime.datetime.now().strftime(DateTimeFormat), DateTimeFormat)
+
+
+def RunETLPass(args):
+    """
+        One pass of the ETL - a backfill of the args.start - args.end date range, or (normally) the latest files -
+        followed by the GDB maintenance and service refresh for the products that changed. Returns True if the pass
+        loaded every raster it found.
+    """
+    logging.info('====================================== SESSION START ===========================================')
+    logging.info("\t\t\t" + getScriptName())
+
+    # Get a start time for the entire script run process.
+    time_TotalScriptRun = get_NewStart_Time()
+
+    # Get datetime for right now
+    o_today_DateTime = GetCurrentDateTime()
+
+    # Create the Extract folder
+    extractFolder = GetConfigString("extract_AccumulationsFolder")
+    if not create_folder(extractFolder):
+        logging.error("Could not create folder: {0}. Try to create manually and run again!".format(extractFolder))
+        return False
+
+    if args.start is not None:
+        # Backfill a historical date range instead of loading the latest files
+        oStartDate = datetime.datetime.strptime(args.start, "%Y%m%d")
+        if args.end is not None:
+            oEndDate = datetime.datetime.strptime(args.end, "%Y%m%d")
+        else:
+            oEndDate = o_today_DateTime
+        with MetricsTimer("backfill"):
+            loadResult = ProcessBackfill(oStartDate, oEndDate)
+    else:
+        loadResult = ProcessLatestAccumulations(o_today_DateTime, extractFolder)
+    if loadResult is None:
+        return False
+
+    runMetrics.increment("rasters_loaded", len(loadResult.loadedRasters))
+    runMetrics.increment("rasters_failed", len(loadResult.failedRasters))
+
+    # Compact the GDB and refresh the services - for only the products that changed.
+    UpdateChangedProducts(loadResult, o_today_DateTime)
+
+    # Log the Grand total script execution time...
+    logging.info("------------------------------------------------------------------------------------------------")
+    logging.info("=== PERFORMANCE ===>: Grand Total Processing Time was: " +
+                 get_Elapsed_Time_As_String(time_TotalScriptRun))
+
+    logging.info("====================================== SESSION END =============================================")
+    # Add a few lines so we can tell sessions apart in the log more quickly
+    logging.info("")
+    logging.info("")
+    return len(loadResult.failedRasters) == 0
+
+
+def CheckForNewSourceFiles(oTodaysDateTime):
+    """
+        Daemon mode - the cheap check made on each poll. Lists the source folder(s) (see ListSourceFiles(), so the
+        listing cache applies) and returns the latest filename of each product that the manifest doesn't show as
+        already loaded or downloaded - along with any rasters still waiting in the extract folder from a failed pass.
+        (With the 'halfhourly' accumulation source, it returns the latest half hourly file instead, if it is new.)
+        Raises an exception if no source folder could be listed.
+    """
+    fileFolders = ListSourceFiles(oTodaysDateTime, ListProxyFolder)
+    if len(fileFolders) == 0:
+        raise IOError("No files listed in the source folder(s) - the source may be unreachable.")
+
+    manifest = ReadDownloadManifest(GetManifestFile())
+    extractFolder = GetConfigString("extract_AccumulationsFolder")
+    newFiles = []
+    if GetAccumulationSource() == "halfhourly":
+        # The latest half hourly file is new unless the accumulator already holds it (daemon mode), or the
+        # accumulations built up to it are already loaded.
+        latestFile = GetLatestHalfHourlyFile(fileFolders.keys())
+        if latestFile is not None and (rollingAccumulator is None or
+                                       rollingAccumulator.slotStore.getSlot(latestFile.startDateTime) is None):
+            builtFiles = [GetHalfHourlyAccumulationFileName(latestFile.fileName, period)
+                          for period in [product.period for product in GetProductRegistry().products]]
+            if not all(IsFileAlreadyIngested(manifest, builtFile) for builtFile in builtFiles):
+                newFiles.append(latestFile.fileName)
+        return sorted(newFiles + GetPendingAccumulationRasters(extractFolder))
+    for latestFile in IMERGFilenameIndex(fileFolders.keys()).latestPerProduct().values():
+        if not (IsFileAlreadyIngested(manifest, latestFile.fileName) or
+                IsFileAlreadyDownloaded(manifest, latestFile.fileName,
+                                        os.path.join(extractFolder, latestFile.fileName))):
+            newFiles.append(latestFile.fileName)
+    return sorted(newFiles + GetPendingAccumulationRasters(extractFolder))
+
+
+def RunCheckOnly():
+    """
+        --check-only - lists the source folder(s) and compares the latest files with the manifest (see
+        CheckForNewSourceFiles()), without importing arcpy or GDAL or touching the mosaic datasets. Prints the new
+        filenames, and returns the exit code: 0 if there is nothing new, 1 if there are new files to load, or 2 if the
+        check failed. i.e. a scheduler can run the full ETL only when the check doesn't return 0.
+    """
+    try:
+        newFiles = CheckForNewSourceFiles(GetCurrentDateTime())
+    except:
+        err = capture_exception()
+        logging.error(err)
+        return 2
+    finally:
+        CloseTransportSessions()
+
+    for newFile in newFiles:
+        print newFile
+    logging.info("Check only: {0} new source file(s). {1}".format(len(newFiles), ", ".join(newFiles)))
+    return 1 if len(newFiles) > 0 else 0
+
+
+def GetPollDelaySeconds(pollSeconds, consecutiveFailures, maxBackoffSeconds, jitterFraction):
+    """
+        Daemon mode - returns the number of seconds to wait before the next poll: pollSeconds, doubled for each
+        consecutive failed poll (up to maxBackoffSeconds), then spread by +/- jitterFraction at random so retries
+        (and several instances) don't hit the source at the same moment.
+    """
+    delaySeconds = min(pollSeconds * (2 ** min(consecutiveFailures, 16)), max(pollSeconds, maxBackoffSeconds))
+    return max(1.0, delaySeconds * (1.0 + random.uniform(-jitterFraction, jitterFraction)))
+
+
+def IsDaemonStopRequested():
+    # Daemon mode - True once the 'daemon_StopFile' (if one is set) exists.
+    stopFile = GetConfigValue("daemon_StopFile", None)
+    return stopFile is not None and os.path.exists(stopFile)
 
-        # Grab a timer reference
-        time_RefreshServiceProcess = get_NewStart_Time()
-
-        logging.info("Refreshing the services...")
-
-        svc1Day = MapService()
-        svc1Day.adminURL = GetConfigString('svc_adminURL')
-        svc1Day.username = GetConfigString('svc_username')
-        svc1Day.password = GetConfigString('svc_password')
-        svc1Day.folder = GetConfigString('svc_folder')
-        svc1Day.svcType = 'ImageServer'
-        svc1Day.svcName = GetConfigString('svc_Name_1Day')
-
-        svc3Day = MapService()
-        svc3Day.adminURL = GetConfigString('svc_adminURL')
-        svc3Day.username = GetConfigString('svc_username')
-        svc3Day.password = GetConfigString('svc_password')
-        svc3Day.folder = GetConfigString('svc_folder')
-        svc3Day.svcType = 'ImageServer'
-        svc3Day.svcName = GetConfigString('svc_Name_3Day')
-
-        svc7Day = MapService()
-        svc7Day.adminURL = GetConfigString('svc_adminURL')
-        svc7Day.username = GetConfigString('svc_username')
-        svc7Day.password = GetConfigString('svc_password')
-        svc7Day.folder = GetConfigString('svc_folder')
-        svc7Day.svcType = 'ImageServer'
-        svc7Day.svcName = GetConfigString('svc_Name_7Day')
-
-        svcAll = MapService()
-        svcAll.adminURL = GetConfigString('svc_adminURL')
-        svcAll.username = GetConfigString('svc_username')
-        svcAll.password = GetConfigString('svc_password')
-        svcAll.folder = GetConfigString('svc_folder')
-        svcAll.svcType = 'MapServer'
-        svcAll.svcName = GetConfigString('svc_Name_All')
-
-        # Note the arcpy.PublishingTools.RefreshService() call must only be available at ArcGIS 10.6 and later
-        # as it doesn't seem to work at 10.4
-        ### arcpy.ImportToolbox(r'C:\temp\arcgis_localhost_siteadmin_USE_THIS_ONE.ags;System/Publishing Tools')
-        ### arcpy.PublishingTools.RefreshService(svc1Day.svcName, svc1Day.svcType, svc1Day.folder, "#")
-        ### arcpy.PublishingTools.RefreshService(svc3Day.svcName, svc3Day.svcType, svc3Day.folder, "#")
-        ### arcpy.PublishingTools.RefreshService(svc7Day.svcName, svc7Day.svcType, svc7Day.folder, "#")
-        ### arcpy.PublishingTools.RefreshService(svcAll.svcName, svcAll.svcType, svcAll.folder, "#")
-        # ToDo... Enable these calls on the server...
-        # refreshService(svc1Day)
-        # refreshService(svc3Day)
-        # refreshService(svc7Day)
-        # refreshService(svcAll)
-        # Update the JSON file used to verify service updates...
-        jsonFile = GetConfigString('JSONFile_ServiceUpdates')
-        UpdateServicesJsonFile(jsonFile,  svc1Day.svcName, o_today_DateTime)
-        UpdateServicesJsonFile(jsonFile,  svc3Day.svcName, o_today_DateTime)
-        UpdateServicesJsonFile(jsonFile,  svc7Day.svcName, o_today_DateTime)
-        UpdateServicesJsonFile(jsonFile,  svcAll.svcName, o_today_DateTime)
-
-        logging.info("\t=== PERFORMANCE ===>: RefreshServiceProcess took: " +
-                     get_Elapsed_Time_As_String(time_RefreshServiceProcess))
-
-        # Log the Grand total script execution time...
-        logging.info("------------------------------------------------------------------------------------------------")
-        logging.info("=== PERFORMANCE ===>: Grand Total Processing Time was: " +
-                     get_Elapsed_Time_As_String(time_TotalScriptRun))
-
-        logging.info("====================================== SESSION END =============================================")
-        # Add a few lines so we can tell sessions apart in the log more quickly
-        logging.info("")
-        logging.info("")
-        # END
+
+def RunDaemon(args, log_level):
+    """
+        Daemon (watch) mode - stays resident, so python, config.pkl, arcpy, the Spatial Analyst license, the HTTP and
+        ftp sessions, and the admin tokens are only set up once. Every 'daemon_PollSeconds' the source listing is
+        checked (see CheckForNewSourceFiles()), and a full pass (see RunETLPass()) only runs when a newer file shows
+        up. Failed polls and passes back off exponentially (up to 'daemon_MaxBackoffSeconds'), and every wait is
+        jittered by 'daemon_JitterFraction'. Runs until interrupted (Ctrl+C) or the 'daemon_StopFile' appears.
+        Returns True if the last poll (and the pass it started, if any) succeeded.
+    """
+    global runMetrics
+    pollSeconds = float(GetConfigValue("daemon_PollSeconds", 300))
+    maxBackoffSeconds = float(GetConfigValue("daemon_MaxBackoffSeconds", 3600))
+    jitterFraction = float(GetConfigValue("daemon_JitterFraction", 0.1))
+    consecutiveFailures = 0
+    bPollSucceeded = True
+    logging.info("Daemon mode: checking the source every {0} seconds.".format(pollSeconds))
+    try:
+        while not IsDaemonStopRequested():
+            SetupLogFile(log_level)
+            bPollSucceeded = False
+            try:
+                newFiles = CheckForNewSourceFiles(GetCurrentDateTime())
+                if len(newFiles) > 0:
+                    logging.info("Daemon mode: new source file(s) {0}, starting a pass.".format(", ".join(newFiles)))
+                    runMetrics = RunMetrics("daemon")
+                    try:
+                        bPollSucceeded = RunETLPass(args)
+                    finally:
+                        WriteRunMetrics(bPollSucceeded)
+                else:
+                    logging.debug("Daemon mode: no new source files.")
+                    bPollSucceeded = True
+            except:
+                err = capture_exception()
+                logging.error(err)
+
+            consecutiveFailures = 0 if bPollSucceeded else consecutiveFailures + 1
+            delaySeconds = GetPollDelaySeconds(pollSeconds, consecutiveFailures, maxBackoffSeconds, jitterFraction)
+            if consecutiveFailures > 0:
+                logging.warning("Daemon mode: {0} failed poll(s) in a row, next poll in {1:.0f} seconds.".format(
+                    consecutiveFailures, delaySeconds))
+
+            # Sleep in short steps, so a stop request doesn't have to wait out the whole delay
+            oWakeTime = time.time() + delaySeconds
+            while time.time() < oWakeTime and not IsDaemonStopRequested():
+                time.sleep(min(5.0, max(0.0, oWakeTime - time.time())))
+
+        logging.info("Daemon mode: stop file found, stopping.")
+    except KeyboardInterrupt:
+        logging.info("Daemon mode: interrupted, stopping.")
+    finally:
+        CloseTransportSessions()
+    return bPollSucceeded
+
+
+# Main Function
+def main():
+    """
+        Runs the ETL (see setupArgs() for the options). Returns the exit code: 0 if the run succeeded and 1 if it
+        failed - or, with --check-only, the exit code of RunCheckOnly().
+    """
+    global runMetrics
+    bRunSucceeded = False
+    runMetrics = None
+    try:
+        # Read config.pkl up front - without it, nothing else can run. (If it is missing, the error is logged to the
+        # console, as the log file location comes from the config.)
+        GetConfig()
+
+        # Setup any required and/or optional arguments to be passed in.
+        args = setupArgs()
+        runMetrics = RunMetrics("backfill" if args.start is not None else "latest")
+
+        # Check if the user passed in a log level argument, either DEBUG, INFO, or WARNING. Otherwise, default to INFO.
+        if args.logging:
+            log_level = args.logging
+        else:
+            log_level = "INFO"    # Available values are: DEBUG, INFO, WARNING, ERROR
+
+        # Setup logfile
+        SetupLogFile(log_level)
+
+        if args.check_only:
+            # A quick poll - no run record.
+            runMetrics = None
+            return RunCheckOnly()
+
+        if args.daemon:
+            if args.start is not None:
+                logging.error("The --daemon and --start (backfill) options can't be used together.")
+                return 1
+            bDaemonSucceeded = RunDaemon(args, log_level)
+            # Each daemon pass records its own metrics
+            runMetrics = None
+            return 0 if bDaemonSucceeded else 1
+
+        bRunSucceeded = RunETLPass(args)
+        CloseTransportSessions()
 
     except:
         err = capture_exception()
         logging.error(err)
 
+    finally:
+        # Record the run's timings and counters (json run record / Prometheus textfile)
+        if runMetrics is not None:
+            WriteRunMetrics(bRunSucceeded)
+
+    return 0 if bRunSucceeded else 1
+
 
 # Call Main Function
-main()
+# (The guard is required so the transform worker processes can import this script on Windows without running main.)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,7 +25,59 @@ mydict = {'extract_AccumulationsFolder': 'E:\ETLScratch\IMERG_Extract\Accumulati
           'svc_Name_3Day': 'IMERG_Acc_3Day_ImgSvc',
           'svc_Name_7Day': 'IMERG_Acc_7Day_ImgSvc',
           'svc_Name_All': 'IMERG_Accumulations',
-          'JSONFile_ServiceUpdates': 'E:\SERVIR\Data\Global\SERVIRservices.json'}
+          'JSONFile_ServiceUpdates': 'E:\SERVIR\Data\Global\SERVIRservices.json',
+          'download_MaxConcurrent': 3,
+          'download_ChunkSize': 1048576,
+          'download_ManifestFile': 'E:\ETLScratch\IMERG_Extract\IMERG_Accumulations_Manifest.json',
+          'download_ManifestKeepDays': 31,
+          'transform_Engine': 'numpy',
+          'transform_MinValue': 0,
+          'transform_MaxValue': 29999,
+          'transform_MemoryCeilingMB': 64,
+          'transform_MaxProcesses': 3,
+          'transform_OutputFormat': 'cog',
+          'transform_Compression': 'DEFLATE',
+          'transform_HistogramBuckets': 256,
+          'transform_ReportFile': 'E:\Code\IMERG_Accumulations_ETL\Log\IMERG_TransformReport.json',
+          'backfill_ExtractFolder': 'E:\ETLScratch\IMERG_Extract\Accumulations_Backfill',
+          'backfill_ManifestFile': 'E:\ETLScratch\IMERG_Extract\Accumulations_Backfill\IMERG_Accumulations_Backfill_Manifest.json',
+          'backfill_Folder': 'E:\SERVIR\Data\Global\IMERG_Accumulations_Archive',
+          'backfill_1DayDSName': 'IMERG1Day_Archive',
+          'backfill_3DayDSName': 'IMERG3Day_Archive',
+          'backfill_7DayDSName': 'IMERG7Day_Archive',
+          'listing_CacheFolder': 'E:\ETLScratch\IMERG_Extract\ListingCache',
+          'listing_CacheTTLMinutes': 5,
+          'listing_FrozenAfterDays': 3,
+          'listing_PreviousMonthDays': 1,
+          'transport_KeepAlive': True,
+          'transport_MaxIdlePerHost': 4,
+          'transport_TimeoutSeconds': 120,
+          'svc_TokenExpirationMinutes': 60,
+          'svc_RefreshServices': False,
+          'svc_MaxConcurrent': 4,
+          'svc_StatusTimeoutSeconds': 120,
+          'svc_StatusPollSeconds': 2,
+          'load_Mode': 'overwrite',
+          'load_SwapKeepMinutes': 60,
+          'load_SwapStateFile': 'E:\Code\IMERG_Accumulations_ETL\Log\IMERG_RetiredRasters.json',
+          'mosaic_Store': 'filegdb',
+          'mosaic_IndexPath': 'E:\SERVIR\Data\Global\IMERG_Accumulations_Index.sqlite',
+          'maintenance_StateFile': 'E:\Code\IMERG_Accumulations_ETL\Log\IMERG_MaintenanceState.json',
+          'maintenance_CompactThreshold': 0.2,
+          'maintenance_OffPeakWindow': '01:00-04:00',
+          'metrics_RunRecordFile': 'E:\Code\IMERG_Accumulations_ETL\Log\IMERG_RunRecords.jsonl',
+          'metrics_PrometheusFile': '',
+          'daemon_PollSeconds': 300,
+          'daemon_MaxBackoffSeconds': 3600,
+          'daemon_JitterFraction': 0.1,
+          'daemon_StopFile': 'E:\Code\IMERG_Accumulations_ETL\IMERG_Accumulations_ETL.stop',
+          'accumulation_Source': 'pps',
+          'realtime_SlotFolder': 'E:\ETLScratch\IMERG_Extract\HalfHourly',
+          'realtime_SlotScale': 0.5,
+          'realtime_SlotStore': 'memmap',
+          'realtime_StateFolder': 'E:\ETLScratch\IMERG_Extract\AccumulationState',
+          'realtime_MaxMissingSlots': 2,
+          'products_Additional': []}
 
 output = open('config.pkl', 'wb')
 pickle.dump(mydict, output)
@@ -0,0 +1,211 @@
+# -------------------------------------------------------------------------------
+# Tests for the rolling 1/3/7 day sums built from the half hourly slots (RollingAccumulator), checked against a
+# brute force sum of the slots in each window.
+# -------------------------------------------------------------------------------
+
+import datetime
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+PeriodSlots = {"1Day": 48, "3Day": 144, "7Day": 336}
+FirstSlot = datetime.datetime(2018, 8, 1, 0, 0)
+GridShape = (3, 4)
+
+
+def SlotStart(slotNum):
+    return FirstSlot + etl.HalfHourlySlot * slotNum
+
+
+def SlotGrid(slotNum):
+    # A distinct grid for each slot, so a wrong slot in a sum shows up.
+    return (numpy.arange(GridShape[0] * GridShape[1], dtype=numpy.int16).reshape(GridShape) + slotNum % 997 + 1)
+
+
+class RollingAccumulatorTest(unittest.TestCase):
+
+    def setUp(self):
+        etl.numpy = numpy
+        self.accumulator = etl.RollingAccumulator(etl.MemorySlotStore(max(PeriodSlots.values())), PeriodSlots)
+        self.added = set()
+
+    def addSlot(self, slotNum):
+        bAdded = self.accumulator.addSlot(SlotStart(slotNum), SlotGrid(slotNum))
+        if bAdded:
+            self.added.add(slotNum)
+        return bAdded
+
+    def assertSumsMatchBruteForce(self):
+        latestNum = etl.GetSlotNumber(self.accumulator.latestSlot) - etl.GetSlotNumber(FirstSlot)
+        for productName, numSlots in PeriodSlots.items():
+            inWindow = [n for n in self.added if latestNum - numSlots < n <= latestNum]
+            expected = numpy.zeros(GridShape, numpy.int32)
+            for slotNum in inWindow:
+                expected += SlotGrid(slotNum)
+            numpy.testing.assert_array_equal(self.accumulator.sums[productName], expected,
+                                             "{0} sum at slot {1}".format(productName, latestNum))
+            self.assertEqual(self.accumulator.slotCounts[productName], len(inWindow))
+
+    def test_sums_follow_the_latest_slot(self):
+        for slotNum in range(400):
+            self.assertTrue(self.addSlot(slotNum))
+            self.assertSumsMatchBruteForce()
+
+    def test_slots_leave_each_window_at_its_boundary(self):
+        for slotNum in range(48):
+            self.addSlot(slotNum)
+        self.assertTrue(self.accumulator.isWindowComplete("1Day"))
+        self.assertFalse(self.accumulator.isWindowComplete("3Day"))
+        self.assertEqual(self.accumulator.windowStart("1Day"), SlotStart(0))
+
+        # The 49th slot pushes slot 0 out of the 1 day window only
+        self.addSlot(48)
+        self.assertEqual(self.accumulator.windowStart("1Day"), SlotStart(1))
+        self.assertEqual(self.accumulator.slotCounts, {"1Day": 48, "3Day": 49, "7Day": 49})
+        self.assertSumsMatchBruteForce()
+
+        for slotNum in range(49, 336):
+            self.addSlot(slotNum)
+        self.assertTrue(self.accumulator.isWindowComplete("7Day"))
+        self.assertEqual(self.accumulator.slotCounts, {"1Day": 48, "3Day": 144, "7Day": 336})
+
+        # Slot 336 replaces slot 0 in the ring, and pushes it out of the 7 day window
+        self.addSlot(336)
+        self.assertEqual(self.accumulator.slotStore.getSlot(SlotStart(0)), None)
+        self.assertEqual(self.accumulator.slotCounts, {"1Day": 48, "3Day": 144, "7Day": 336})
+        self.assertSumsMatchBruteForce()
+
+    def test_late_slots_are_added_to_the_windows_they_fall_in(self):
+        for slotNum in range(0, 200, 3):
+            self.addSlot(slotNum)
+        self.assertSumsMatchBruteForce()
+        self.assertFalse(self.accumulator.isWindowComplete("1Day"))
+
+        # Fill in the gaps, newest first
+        for slotNum in reversed(range(200)):
+            self.addSlot(slotNum)
+        self.assertSumsMatchBruteForce()
+        self.assertTrue(self.accumulator.isWindowComplete("3Day"))
+
+    def test_duplicate_and_too_old_slots_are_ignored(self):
+        for slotNum in range(340):
+            self.addSlot(slotNum)
+        sums = dict((productName, sumGrid.copy()) for productName, sumGrid in self.accumulator.sums.items())
+
+        self.assertFalse(self.accumulator.addSlot(SlotStart(339), SlotGrid(339)))
+        self.assertFalse(self.accumulator.addSlot(SlotStart(100), SlotGrid(100)))
+        # Slot 3 is older than the longest window (and its ring position holds slot 339)
+        self.assertFalse(self.accumulator.addSlot(SlotStart(3), SlotGrid(3)))
+        for productName, sumGrid in sums.items():
+            numpy.testing.assert_array_equal(self.accumulator.sums[productName], sumGrid)
+
+    def test_gap_longer_than_a_window_starts_it_again(self):
+        for slotNum in range(60):
+            self.addSlot(slotNum)
+        self.addSlot(60 + 48 + 10)
+        self.assertEqual(self.accumulator.slotCounts["1Day"], 1)
+        self.assertSumsMatchBruteForce()
+
+    def test_window_completeness_allows_missing_slots(self):
+        for slotNum in range(48):
+            if slotNum not in (5, 30):
+                self.addSlot(slotNum)
+        self.assertEqual(self.accumulator.slotCounts["1Day"], 46)
+        self.assertFalse(self.accumulator.isWindowComplete("1Day"))
+        self.assertFalse(self.accumulator.isWindowComplete("1Day", 1))
+        self.assertTrue(self.accumulator.isWindowComplete("1Day", 2))
+
+    def test_grid_shape_must_not_change(self):
+        self.addSlot(0)
+        self.assertRaises(ValueError, self.accumulator.addSlot, SlotStart(1), numpy.zeros((2, 2), numpy.int16))
+
+
+class MemoryMappedSlotStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        etl.numpy = numpy
+        etl.myConfig = {"RegEx_StartDateFilterString": r"\d{4}[01]\d[0-3]\d-S[0-2]\d{5}",
+                        "Filename_StartDateFormat": "%Y%m%d-S%H%M%S"}
+        self.stateFolder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        etl.myConfig = None
+        shutil.rmtree(self.stateFolder)
+
+    def openAccumulator(self):
+        return etl.RollingAccumulator(etl.MemoryMappedSlotStore(self.stateFolder, max(PeriodSlots.values())),
+                                      PeriodSlots)
+
+    def assertSameSums(self, accumulator, expected):
+        self.assertEqual(accumulator.latestSlot, expected.latestSlot)
+        self.assertEqual(accumulator.slotCounts, expected.slotCounts)
+        for productName in PeriodSlots:
+            numpy.testing.assert_array_equal(accumulator.sums[productName], expected.sums[productName])
+
+    def addSlots(self, accumulators, slotNums):
+        for slotNum in slotNums:
+            for accumulator in accumulators:
+                accumulator.addSlot(SlotStart(slotNum), SlotGrid(slotNum))
+
+    def test_state_is_restored_after_a_restart(self):
+        accumulator = self.openAccumulator()
+        inMemory = etl.RollingAccumulator(etl.MemorySlotStore(max(PeriodSlots.values())), PeriodSlots)
+        self.addSlots([accumulator, inMemory], range(360))
+        accumulator.save()
+        del accumulator
+
+        reopened = self.openAccumulator()
+        self.assertSameSums(reopened, inMemory)
+
+        # It carries on from where it left off
+        self.addSlots([reopened, inMemory], range(360, 420))
+        self.assertSameSums(reopened, inMemory)
+
+    def test_sums_are_rebuilt_if_the_run_stopped_before_they_were_saved(self):
+        accumulator = self.openAccumulator()
+        inMemory = etl.RollingAccumulator(etl.MemorySlotStore(max(PeriodSlots.values())), PeriodSlots)
+        self.addSlots([accumulator, inMemory], range(100))
+        accumulator.save()
+        self.addSlots([accumulator, inMemory], range(100, 150))
+        del accumulator   # (not saved - the store is left dirty)
+
+        self.assertSameSums(self.openAccumulator(), inMemory)
+
+    def test_slot_replaced_part_way_is_dropped(self):
+        accumulator = self.openAccumulator()
+        self.addSlots([accumulator], range(50))
+        accumulator.save()
+        del accumulator
+        # As if the process stopped while slot 49's file was being written
+        gridBytes = 2 * GridShape[0] * GridShape[1]
+        with open(os.path.join(self.stateFolder, "Slot_{0:03d}.grid".format(
+                etl.GetSlotNumber(SlotStart(49)) % 336)), "r+b") as sf:
+            sf.seek(gridBytes)
+            sf.write(struct.pack("<q", -1))
+
+        reopened = self.openAccumulator()
+        self.assertEqual(reopened.slotStore.getSlot(SlotStart(49)), None)
+        self.assertEqual(reopened.latestSlot, SlotStart(48))
+        self.assertEqual(reopened.slotCounts["1Day"], 48)
+
+    def test_index_is_written_once_per_slot(self):
+        store = etl.MemoryMappedSlotStore(self.stateFolder, 4)
+        writes = []
+        store.writeIndex = lambda: writes.append(sorted(store.positions))
+        for slotNum in range(6):
+            store.putSlot(SlotStart(slotNum), SlotGrid(slotNum))
+        self.assertEqual(len(writes), 6)
+        self.assertEqual(writes[-1], [SlotStart(n) for n in range(2, 6)])
+        numpy.testing.assert_array_equal(store.getSlot(SlotStart(5)), SlotGrid(5))
+
+
+if __name__ == "__main__":
+    unittest.main()
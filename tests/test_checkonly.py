@@ -0,0 +1,160 @@
+# -------------------------------------------------------------------------------
+# Tests for the exit codes of --check-only (RunCheckOnly) and of main().
+# -------------------------------------------------------------------------------
+
+import logging
+import os
+import pickle
+import shutil
+import StringIO
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+
+def LatestSourceFiles():
+    # Today's 1, 3, and 7 day files - what the source lists as the latest.
+    sDate = etl.GetCurrentDateTime().strftime("%Y%m%d")
+    return ["3B-HHR-L.MS.MRG.3IMERG.{0}-S000000-E002959.0000.V05B.{1}.tif".format(sDate, sPeriod)
+            for sPeriod in ["1day", "3day", "7day"]]
+
+
+class RecordingHandler(logging.Handler):
+    # Keeps the messages logged at ERROR and above.
+
+    def __init__(self):
+        logging.Handler.__init__(self, logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class CheckOnlyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+        self.config = {"logFileDir": self.tempFolder, "logFilePrefix": "IMERG_Accumulations",
+                       "GDB_DateFormat": "%Y%m%d%H%M",
+                       "ftp_host": "localhost", "ftp_baseLateFolder": "/data/imerg/gis",
+                       "extract_AccumulationsFolder": self.tempFolder, "listing_CacheTTLMinutes": 0,
+                       "download_ManifestFile": os.path.join(self.tempFolder, "Manifest.json"),
+                       "daemon_StopFile": os.path.join(self.tempFolder, "IMERG_Accumulations_ETL.stop"),
+                       "1DayDSName": "IMERG1Day", "3DayDSName": "IMERG3Day", "7DayDSName": "IMERG7Day"}
+        etl.myConfig = self.config
+        etl.productRegistry = None
+        self.savedListProxyFolder = etl.ListProxyFolder
+        self.sourceFiles = []
+        etl.ListProxyFolder = self.listSource
+        self.savedStdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.savedStdout
+        etl.ListProxyFolder = self.savedListProxyFolder
+        etl.myConfig = None
+        etl.productRegistry = None
+        etl.runMetrics = etl.RunMetrics()
+        shutil.rmtree(self.tempFolder)
+
+    def listSource(self, ftpFolder):
+        if self.sourceFiles is None:
+            raise IOError("source site is offline")
+        return list(self.sourceFiles)
+
+
+class RunCheckOnlyTest(CheckOnlyTestCase):
+
+    def test_new_files_exit_with_1(self):
+        self.sourceFiles = LatestSourceFiles()
+
+        self.assertEqual(etl.RunCheckOnly(), 1)
+        self.assertEqual(sys.stdout.getvalue().split(), sorted(self.sourceFiles))
+
+    def test_loaded_files_exit_with_0(self):
+        self.sourceFiles = LatestSourceFiles()
+        manifest = etl.ReadDownloadManifest(self.config["download_ManifestFile"])
+        for fileName in self.sourceFiles:
+            etl.UpdateDownloadManifest(manifest, fileName, status="loaded")
+        etl.WriteDownloadManifest(self.config["download_ManifestFile"], manifest)
+
+        self.assertEqual(etl.RunCheckOnly(), 0)
+        self.assertEqual(sys.stdout.getvalue(), "")
+
+    def test_unreachable_source_exits_with_2(self):
+        self.sourceFiles = None
+        self.assertEqual(etl.RunCheckOnly(), 2)
+
+    def test_arcpy_is_not_imported(self):
+        self.sourceFiles = LatestSourceFiles()
+        etl.RunCheckOnly()
+        self.assertEqual(etl.arcpy, None)
+        self.assertFalse("arcpy" in sys.modules)
+
+
+class MainExitCodeTest(CheckOnlyTestCase):
+
+    def setUp(self):
+        CheckOnlyTestCase.setUp(self)
+        self.savedFolder = os.getcwd()
+        self.savedArgv = sys.argv
+        self.rootLogger = logging.getLogger()
+        self.savedHandlers = list(self.rootLogger.handlers)
+        self.recorder = RecordingHandler()
+        self.rootLogger.addHandler(self.recorder)
+        os.chdir(self.tempFolder)
+
+    def tearDown(self):
+        os.chdir(self.savedFolder)
+        sys.argv = self.savedArgv
+        for handler in list(self.rootLogger.handlers):
+            if handler not in self.savedHandlers:
+                self.rootLogger.removeHandler(handler)
+                handler.close()
+        CheckOnlyTestCase.tearDown(self)
+
+    def runMain(self, args):
+        # Runs main() with a config.pkl (made from self.config) in the current folder, as the scheduled task does.
+        with open("config.pkl", "wb") as outFile:
+            pickle.dump(self.config, outFile)
+        etl.myConfig = None
+        sys.argv = ["IMERG_Accumulations_ETL.py"] + args
+        return etl.main()
+
+    def test_missing_config_is_logged(self):
+        etl.myConfig = None
+        sys.argv = ["IMERG_Accumulations_ETL.py"]
+
+        self.assertEqual(etl.main(), 1)
+        self.assertTrue(any("config.pkl" in message for message in self.recorder.messages))
+
+    def test_check_only_returns_its_exit_code(self):
+        # (Offline first - once the source has been listed, its cached listing would be used instead.)
+        self.sourceFiles = None
+        self.assertEqual(self.runMain(["--check-only"]), 2)
+        self.sourceFiles = LatestSourceFiles()
+        self.assertEqual(self.runMain(["--check-only"]), 1)
+
+    def test_daemon_with_backfill_fails(self):
+        self.assertEqual(self.runMain(["--daemon", "--start", "20190101"]), 1)
+
+    def test_daemon_fails_when_its_last_poll_failed(self):
+        stopFile = self.config["daemon_StopFile"]
+
+        def FailedPoll(ftpFolder):
+            # Ask the daemon to stop, and fail this poll
+            open(stopFile, "w").close()
+            raise IOError("source site is offline")
+
+        etl.ListProxyFolder = FailedPoll
+        self.assertEqual(self.runMain(["--daemon"]), 1)
+
+        # Stopped before the first poll - nothing failed
+        self.assertEqual(self.runMain(["--daemon"]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+# -------------------------------------------------------------------------------
+# Tests for the daemon mode poll delay (GetPollDelaySeconds) - backoff, cap, and jitter.
+# -------------------------------------------------------------------------------
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+
+class PollDelayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.savedState = random.getstate()
+        random.seed(20190305)
+
+    def tearDown(self):
+        random.setstate(self.savedState)
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        delays = [etl.GetPollDelaySeconds(300, failures, 3600, 0) for failures in range(8)]
+        self.assertEqual(delays, [300, 600, 1200, 2400, 3600, 3600, 3600, 3600])
+        # A very long failure streak still stops at the cap
+        self.assertEqual(etl.GetPollDelaySeconds(300, 1000, 3600, 0), 3600)
+        # A cap below the poll interval never shortens the poll
+        self.assertEqual(etl.GetPollDelaySeconds(300, 3, 60, 0), 300)
+
+    def test_jitter_stays_within_bounds(self):
+        for failures in [0, 1, 2, 10]:
+            baseSeconds = min(300 * 2 ** failures, 3600)
+            delays = [etl.GetPollDelaySeconds(300, failures, 3600, 0.1) for i in range(500)]
+            self.assertTrue(min(delays) >= baseSeconds * 0.9, (failures, min(delays)))
+            self.assertTrue(max(delays) <= baseSeconds * 1.1, (failures, max(delays)))
+            # ... and actually spreads the polls out
+            self.assertTrue(max(delays) - min(delays) > baseSeconds * 0.15, (failures, delays))
+
+    def test_jitter_is_repeatable_with_a_seed(self):
+        delays = [etl.GetPollDelaySeconds(300, 2, 3600, 0.1) for i in range(5)]
+        random.seed(20190305)
+        self.assertEqual([etl.GetPollDelaySeconds(300, 2, 3600, 0.1) for i in range(5)], delays)
+
+    def test_delay_resets_after_a_success(self):
+        consecutiveFailures = 0
+        delays = []
+        for bPollSucceeded in [False, False, False, True, False]:
+            consecutiveFailures = 0 if bPollSucceeded else consecutiveFailures + 1
+            delays.append(etl.GetPollDelaySeconds(60, consecutiveFailures, 3600, 0))
+        self.assertEqual(delays, [120, 240, 480, 60, 120])
+
+    def test_delay_is_at_least_one_second(self):
+        self.assertTrue(etl.GetPollDelaySeconds(0.1, 0, 0, 0.5) >= 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,229 @@
+# -------------------------------------------------------------------------------
+# Tests for the streamed downloads and their resume paths, against a stand-in HTTP file server and a stand-in ftp
+# connection.
+# -------------------------------------------------------------------------------
+
+import BaseHTTPServer
+import SocketServer
+import ftplib
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+Payload = "".join(chr(i % 251) for i in range(20000))
+
+
+class StubFileServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+        Serves Payload for every GET, with keep-alive. rangeMode is 'honor' (206 for a Range request), 'ignore' (always
+        200 with the whole file), or 'reject' (416 for any Range request). With closeAfterResponse the connection is
+        dropped after each response without telling the client, like a server whose idle keep-alive timed out.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), StubFileHandler)
+        self.rangeMode = "honor"
+        self.closeAfterResponse = False
+        self.requests = []      # (path, Range header)
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    def url(self, path):
+        return "http://127.0.0.1:{0}{1}".format(self.server_address[1], path)
+
+
+class StubFileHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def sendBody(self, code, body, extraHeaders=None):
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Last-Modified", "Thu, 09 Aug 2018 23:59:59 GMT")
+        for key, value in (extraHeaders or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        if self.server.closeAfterResponse:
+            self.close_connection = 1
+
+    def do_GET(self):
+        rangeHeader = self.headers.getheader("Range")
+        with self.server.lock:
+            self.server.requests.append((self.path, rangeHeader))
+            self.server.connections.add(self.client_address)
+        if rangeHeader is None or self.server.rangeMode == "ignore":
+            self.sendBody(200, Payload)
+        elif self.server.rangeMode == "reject":
+            self.sendBody(416, "")
+        else:
+            resumeFrom = int(rangeHeader.split("=")[1].rstrip("-"))
+            self.sendBody(206, Payload[resumeFrom:],
+                          {"Content-Range": "bytes {0}-{1}/{2}".format(resumeFrom, len(Payload) - 1, len(Payload))})
+
+
+class StubFTPConnection(object):
+    # Stands in for an ftplib.FTP connection holding one file - records the REST offset of each RETR.
+    def __init__(self, data, bSupportsSize=True):
+        self.data = data
+        self.bSupportsSize = bSupportsSize
+        self.restOffsets = []
+
+    def voidcmd(self, cmd):
+        return "200 OK"
+
+    def size(self, remoteFile):
+        if not self.bSupportsSize:
+            raise ftplib.error_perm("502 SIZE not implemented")
+        return len(self.data)
+
+    def retrbinary(self, cmd, callback, blocksize=8192, rest=None):
+        self.restOffsets.append(rest)
+        for i in range(rest or 0, len(self.data), blocksize):
+            callback(self.data[i:i + blocksize])
+
+
+class DownloadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        etl.myConfig = {}
+        etl.httpTransport = None
+        self.tempFolder = tempfile.mkdtemp()
+        self.targetFile = os.path.join(self.tempFolder, "3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.1day.tif")
+        self.server = StubFileServer()
+        self.serverThread = threading.Thread(target=self.server.serve_forever)
+        self.serverThread.daemon = True
+        self.serverThread.start()
+
+    def tearDown(self):
+        etl.CloseTransportSessions()
+        etl.httpTransport = None
+        etl.myConfig = None
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tempFolder)
+
+    def writePartFile(self, data):
+        with open(self.targetFile + ".part", "wb") as f:
+            f.write(data)
+
+    def readTargetFile(self):
+        self.assertFalse(os.path.exists(self.targetFile + ".part"))
+        with open(self.targetFile, "rb") as f:
+            return f.read()
+
+
+class StreamDownloadFromURLTest(DownloadTestCase):
+
+    def test_new_download(self):
+        remoteModified = etl.StreamDownloadFromURL(self.server.url("/file.tif"), self.targetFile, 4096)
+        self.assertEqual(self.readTargetFile(), Payload)
+        self.assertEqual(remoteModified, "Thu, 09 Aug 2018 23:59:59 GMT")
+        self.assertEqual(self.server.requests, [("/file.tif", None)])
+
+    def test_resumes_a_part_file_with_a_range_request(self):
+        self.writePartFile(Payload[:7000])
+        etl.StreamDownloadFromURL(self.server.url("/file.tif"), self.targetFile, 4096)
+        self.assertEqual(self.readTargetFile(), Payload)
+        self.assertEqual(self.server.requests, [("/file.tif", "bytes=7000-")])
+
+    def test_starts_over_when_the_server_ignores_the_range(self):
+        self.server.rangeMode = "ignore"
+        self.writePartFile("x" * 7000)
+        etl.StreamDownloadFromURL(self.server.url("/file.tif"), self.targetFile, 4096)
+        self.assertEqual(self.readTargetFile(), Payload)
+
+    def test_starts_over_when_the_range_is_rejected(self):
+        self.server.rangeMode = "reject"
+        self.writePartFile("x" * 25000)
+        etl.StreamDownloadFromURL(self.server.url("/file.tif"), self.targetFile, 4096)
+        self.assertEqual(self.readTargetFile(), Payload)
+        self.assertEqual(self.server.requests, [("/file.tif", "bytes=25000-"), ("/file.tif", None)])
+
+    def test_replaces_an_existing_target_file(self):
+        with open(self.targetFile, "wb") as f:
+            f.write("old")
+        etl.StreamDownloadFromURL(self.server.url("/file.tif"), self.targetFile, 4096)
+        self.assertEqual(self.readTargetFile(), Payload)
+
+
+class StreamDownloadFromFTPTest(DownloadTestCase):
+
+    def test_new_download(self):
+        ftpConnection = StubFTPConnection(Payload)
+        etl.StreamDownloadFromFTP(ftpConnection, "file.tif", self.targetFile, 4096)
+        self.assertEqual(self.readTargetFile(), Payload)
+        self.assertEqual(ftpConnection.restOffsets, [None])
+
+    def test_resumes_a_part_file_with_rest(self):
+        self.writePartFile(Payload[:12345])
+        ftpConnection = StubFTPConnection(Payload)
+        etl.StreamDownloadFromFTP(ftpConnection, "file.tif", self.targetFile, 4096)
+        self.assertEqual(self.readTargetFile(), Payload)
+        self.assertEqual(ftpConnection.restOffsets, [12345])
+
+    def test_starts_over_when_the_part_file_is_larger_than_the_source(self):
+        self.writePartFile("x" * 30000)
+        ftpConnection = StubFTPConnection(Payload)
+        etl.StreamDownloadFromFTP(ftpConnection, "file.tif", self.targetFile, 4096)
+        self.assertEqual(self.readTargetFile(), Payload)
+        self.assertEqual(ftpConnection.restOffsets, [None])
+
+    def test_resumes_without_size_support(self):
+        self.writePartFile(Payload[:5000])
+        ftpConnection = StubFTPConnection(Payload, bSupportsSize=False)
+        etl.StreamDownloadFromFTP(ftpConnection, "file.tif", self.targetFile, 4096)
+        self.assertEqual(self.readTargetFile(), Payload)
+
+
+
+class HTTPConnectionPoolTest(DownloadTestCase):
+
+    def fetch(self, pool, path):
+        response = pool.open(self.server.url(path))
+        try:
+            return response.read()
+        finally:
+            response.close()
+
+    def test_requests_reuse_one_connection(self):
+        pool = etl.HTTPConnectionPool()
+        for path in ["/a.tif", "/b.tif", "/c.tif"]:
+            self.assertEqual(self.fetch(pool, path), Payload)
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertEqual(len(self.server.requests), 3)
+        pool.closeAll()
+
+    def test_retries_on_a_new_connection_after_a_dropped_keep_alive(self):
+        # The server closes every connection after its response, so each pooled connection is stale by the time
+        # it is reused - the request fails on it (BadStatusLine / socket error) and is sent again on a new one.
+        self.server.closeAfterResponse = True
+        pool = etl.HTTPConnectionPool()
+        for path in ["/a.tif", "/b.tif", "/c.tif"]:
+            self.assertEqual(self.fetch(pool, path), Payload)
+        self.assertEqual(len(self.server.connections), 3)
+        self.assertEqual([request[0] for request in self.server.requests], ["/a.tif", "/b.tif", "/c.tif"])
+        pool.closeAll()
+
+    def test_a_new_connection_is_not_retried(self):
+        # Nothing listens on the port - a failed new connection is not worth a retry.
+        closedSocket = socket.socket()
+        closedSocket.bind(("127.0.0.1", 0))
+        closedPort = closedSocket.getsockname()[1]
+        closedSocket.close()
+        pool = etl.HTTPConnectionPool(timeout=5)
+        self.assertRaises(IOError, pool.open, "http://127.0.0.1:{0}/a.tif".format(closedPort))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+# -------------------------------------------------------------------------------
+# Tests for the 'gdal' mosaic store (GDALMosaicStore) - its SQLite index and the VRT of the latest raster. GDAL itself
+# is stubbed, so they run without it.
+# -------------------------------------------------------------------------------
+
+import datetime
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+
+class StubVRTDataset(object):
+    # Writes the VRT (just the source paths, one per line) when it is flushed, like a GDAL VRT dataset.
+
+    def __init__(self, vrtFile, sourceFiles):
+        self.vrtFile = vrtFile
+        self.sourceFiles = sourceFiles
+
+    def FlushCache(self):
+        with open(self.vrtFile, "w") as outFile:
+            outFile.write("\n".join(self.sourceFiles))
+
+
+class StubGDAL(object):
+    # Stands in for the osgeo.gdal module - records each BuildVRT call as (vrt file, source files).
+    GA_ReadOnly = 0
+
+    def __init__(self):
+        self.builtVRTs = []
+
+    def BuildVRT(self, vrtFile, sourceFiles):
+        self.builtVRTs.append((vrtFile, list(sourceFiles)))
+        return StubVRTDataset(vrtFile, sourceFiles)
+
+
+class GDALMosaicStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+        self.savedModules = (etl.numpy, etl.gdal)
+        etl.numpy = object()
+        etl.gdal = StubGDAL()
+        etl.myConfig = {"mosaic_IndexPath": os.path.join(self.tempFolder, "Mosaics.sqlite"),
+                        "rasterStartTimeProperty": "start_datetime", "rasterEndTimeProperty": "end_datetime"}
+        self.store = etl.GDALMosaicStore()
+        self.dataset = self.store.getDatasetPath("IMERG1Day")
+        self.vrtFile = os.path.join(self.tempFolder, "IMERG1Day.vrt")
+
+    def tearDown(self):
+        etl.numpy, etl.gdal = self.savedModules
+        etl.myConfig = None
+        shutil.rmtree(self.tempFolder)
+
+    def rasterFile(self, rasterName):
+        return os.path.join(self.tempFolder, rasterName + ".tif")
+
+    def addRasters(self, rasterNames, duplicatesAction="ALLOW_DUPLICATES"):
+        self.store.addRasters(self.dataset, [self.rasterFile(n) for n in rasterNames], duplicatesAction,
+                              "NO_PYRAMIDS", "NO_STATISTICS")
+
+    def setEndTimes(self, endTimes):
+        # endTimes is raster name -> end time, set through the store's update cursor like the load does.
+        with self.store.openUpdateCursor(self.dataset, ["Name", "start_datetime", "end_datetime"]) as cursor:
+            for row in cursor:
+                if row[0] in endTimes:
+                    oEnd = endTimes[row[0]]
+                    cursor.updateRow([row[0], oEnd - datetime.timedelta(days=1), oEnd])
+
+    def readNames(self):
+        connection = sqlite3.connect(self.store.indexPath)
+        try:
+            return [row[0] for row in connection.execute("SELECT Name FROM IMERG1Day ORDER BY rowid")]
+        finally:
+            connection.close()
+
+    def readVRT(self):
+        with open(self.vrtFile, "r") as inFile:
+            return inFile.read()
+
+    def test_added_rasters_are_indexed(self):
+        self.addRasters(["IMERG1Day_a", "IMERG1Day_b"])
+        self.addRasters(["IMERG1Day_a"], "EXCLUDE_DUPLICATES")
+        self.assertEqual(self.readNames(), ["IMERG1Day_a", "IMERG1Day_b"])
+
+        self.addRasters(["IMERG1Day_a"], "OVERWRITE_DUPLICATES")
+        self.assertEqual(self.readNames(), ["IMERG1Day_b", "IMERG1Day_a"])
+        self.assertEqual(etl.gdal.builtVRTs[-1], (self.vrtFile, [self.rasterFile("IMERG1Day_a")]))
+
+    def test_vrt_points_at_the_latest_raster(self):
+        oEnd = datetime.datetime(2019, 3, 5, 23, 59, 59)
+        self.addRasters(["IMERG1Day_old", "IMERG1Day_latest"])
+        self.setEndTimes({"IMERG1Day_old": oEnd - datetime.timedelta(days=1), "IMERG1Day_latest": oEnd})
+        self.assertEqual(self.readVRT(), self.rasterFile("IMERG1Day_latest"))
+
+        # A raster without times yet was just added, so it counts as the latest - ahead of every end time
+        self.addRasters(["IMERG1Day_new"])
+        self.assertEqual(self.readVRT(), self.rasterFile("IMERG1Day_new"))
+
+        # Once its times are set, the latest end time wins - even when it was added earlier
+        self.setEndTimes({"IMERG1Day_new": oEnd - datetime.timedelta(days=2)})
+        self.assertEqual(self.readVRT(), self.rasterFile("IMERG1Day_latest"))
+
+    def test_removed_rasters_leave_the_index(self):
+        oEnd = datetime.datetime(2019, 3, 5, 23, 59, 59)
+        self.addRasters(["IMERG1Day_old", "IMERG1Day_latest"])
+        self.setEndTimes({"IMERG1Day_old": oEnd - datetime.timedelta(days=1), "IMERG1Day_latest": oEnd})
+
+        self.store.removeRasters(self.dataset, "Name IN ('IMERG1Day_latest')")
+        self.assertEqual(self.readNames(), ["IMERG1Day_old"])
+        self.assertEqual(self.readVRT(), self.rasterFile("IMERG1Day_old"))
+
+        # An empty mosaic has no VRT
+        nBuilt = len(etl.gdal.builtVRTs)
+        self.store.removeRasters(self.dataset, "Name LIKE 'IMERG1Day%'")
+        self.assertEqual(self.readNames(), [])
+        self.assertFalse(os.path.exists(self.vrtFile))
+        self.assertEqual(len(etl.gdal.builtVRTs), nBuilt)
+
+    def test_compact_and_file_sizes(self):
+        self.assertEqual(self.store.getFileSizes(), {})
+        self.addRasters(["IMERG1Day_%d" % i for i in range(200)])
+        self.store.removeRasters(self.dataset, "Name <> 'IMERG1Day_0'")
+        sizeBefore = self.store.getFileSizes()["Mosaics.sqlite"]
+
+        self.store.compact()
+
+        self.assertTrue(self.store.getFileSizes()["Mosaics.sqlite"] < sizeBefore)
+        self.assertEqual(self.readNames(), ["IMERG1Day_0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
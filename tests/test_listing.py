@@ -0,0 +1,144 @@
+# -------------------------------------------------------------------------------
+# Tests for the cached source folder listings (GetMonthFolderListing and ListSourceFiles).
+# -------------------------------------------------------------------------------
+
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+
+def SourceFileName(oEnd, sPeriod):
+    # i.e. 3B-HHR-L.MS.MRG.3IMERG.20181231-S233000-E235959.1410.V05B.1day.tif
+    return "3B-HHR-L.MS.MRG.3IMERG.{0}-S233000-E235959.1410.V05B.{1}.tif".format(oEnd.strftime("%Y%m%d"), sPeriod)
+
+
+class StubSourceFolders(object):
+    # A listFolderFunc over a dictionary of folder -> filenames, which records the folders listed.
+
+    def __init__(self, folders):
+        self.folders = folders
+        self.listed = []
+        self.bOffline = False
+
+    def __call__(self, ftpFolder):
+        self.listed.append(ftpFolder)
+        if self.bOffline:
+            raise IOError("source site is offline")
+        if ftpFolder not in self.folders:
+            raise IOError("no such folder: " + ftpFolder)
+        return list(self.folders[ftpFolder])
+
+
+class ListingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+        etl.myConfig = {"ftp_baseLateFolder": "/data/imerg/gis",
+                        "extract_AccumulationsFolder": self.tempFolder,
+                        "listing_CacheFolder": self.tempFolder,
+                        "1DayDSName": "IMERG1Day", "3DayDSName": "IMERG3Day", "7DayDSName": "IMERG7Day"}
+        etl.productRegistry = None
+
+    def tearDown(self):
+        etl.myConfig = None
+        etl.productRegistry = None
+        shutil.rmtree(self.tempFolder)
+
+
+class MonthFolderListingTest(ListingTestCase):
+
+    def test_listing_is_cached_for_the_ttl(self):
+        source = StubSourceFolders({"/data/imerg/gis/2019/03": ["a.tif", " ", "b.tif"]})
+        oNow = datetime.datetime(2019, 3, 15, 12)
+
+        self.assertEqual(etl.GetMonthFolderListing(2019, 3, oNow, source), ["a.tif", "b.tif"])
+        source.folders["/data/imerg/gis/2019/03"].append("c.tif")
+        self.assertEqual(etl.GetMonthFolderListing(2019, 3, oNow + datetime.timedelta(minutes=4, seconds=59), source),
+                         ["a.tif", "b.tif"])
+        self.assertEqual(len(source.listed), 1)
+
+        self.assertEqual(etl.GetMonthFolderListing(2019, 3, oNow + datetime.timedelta(minutes=5), source),
+                         ["a.tif", "b.tif", "c.tif"])
+        self.assertEqual(len(source.listed), 2)
+
+    def test_frozen_month_listing_is_kept(self):
+        source = StubSourceFolders({"/data/imerg/gis/2019/02": ["a.tif"]})
+
+        # Listed 3 days after the month ended - it is frozen, so it is never listed again
+        etl.GetMonthFolderListing(2019, 2, datetime.datetime(2019, 3, 4), source)
+        source.folders["/data/imerg/gis/2019/02"].append("late.tif")
+        self.assertEqual(etl.GetMonthFolderListing(2019, 2, datetime.datetime(2020, 1, 1), source), ["a.tif"])
+        self.assertEqual(len(source.listed), 1)
+
+    def test_listing_taken_before_the_month_froze_expires(self):
+        source = StubSourceFolders({"/data/imerg/gis/2019/02": ["a.tif"]})
+
+        etl.GetMonthFolderListing(2019, 2, datetime.datetime(2019, 3, 2), source)
+        source.folders["/data/imerg/gis/2019/02"].append("late.tif")
+        self.assertEqual(etl.GetMonthFolderListing(2019, 2, datetime.datetime(2019, 3, 10), source),
+                         ["a.tif", "late.tif"])
+        etl.GetMonthFolderListing(2019, 2, datetime.datetime(2019, 4, 10), source)
+        self.assertEqual(len(source.listed), 2)
+
+    def test_december_freezes_in_january(self):
+        self.assertFalse(etl.IsMonthFolderFrozen(2018, 12, datetime.datetime(2019, 1, 3, 23, 59)))
+        self.assertTrue(etl.IsMonthFolderFrozen(2018, 12, datetime.datetime(2019, 1, 4)))
+
+    def test_failed_listing_uses_the_stale_cache(self):
+        source = StubSourceFolders({"/data/imerg/gis/2019/03": ["a.tif"]})
+        oNow = datetime.datetime(2019, 3, 15, 12)
+        etl.GetMonthFolderListing(2019, 3, oNow, source)
+
+        source.bOffline = True
+        self.assertEqual(etl.GetMonthFolderListing(2019, 3, oNow + datetime.timedelta(hours=1), source), ["a.tif"])
+        self.assertRaises(IOError, etl.GetMonthFolderListing, 2019, 4, datetime.datetime(2019, 4, 15), source)
+
+
+class ListSourceFilesTest(ListingTestCase):
+
+    def allProducts(self, oEnd):
+        return [SourceFileName(oEnd, sPeriod) for sPeriod in ["1day", "3day", "7day"]]
+
+    def test_previous_month_is_listed_on_the_first_of_january(self):
+        december = self.allProducts(datetime.datetime(2018, 12, 31))
+        source = StubSourceFolders({"/data/imerg/gis/2019/01": [], "/data/imerg/gis/2018/12": december})
+
+        fileFolders = etl.ListSourceFiles(datetime.datetime(2019, 1, 1, 0, 30), source)
+
+        self.assertEqual(source.listed, ["/data/imerg/gis/2019/01", "/data/imerg/gis/2018/12"])
+        self.assertEqual(fileFolders, dict((f, "/data/imerg/gis/2018/12") for f in december))
+
+    def test_missing_current_month_folder_falls_back_to_the_previous_month(self):
+        december = self.allProducts(datetime.datetime(2018, 12, 31))
+        source = StubSourceFolders({"/data/imerg/gis/2018/12": december})
+
+        fileFolders = etl.ListSourceFiles(datetime.datetime(2019, 1, 2, 6), source)
+
+        self.assertEqual(sorted(fileFolders), sorted(december))
+
+    def test_previous_month_is_only_listed_when_a_product_is_missing(self):
+        oNow = datetime.datetime(2019, 3, 15, 12)
+        march = self.allProducts(datetime.datetime(2019, 3, 14))
+        source = StubSourceFolders({"/data/imerg/gis/2019/03": march[:2],
+                                    "/data/imerg/gis/2019/02": self.allProducts(datetime.datetime(2019, 2, 28))})
+
+        fileFolders = etl.ListSourceFiles(oNow, source)
+        self.assertEqual(source.listed, ["/data/imerg/gis/2019/03", "/data/imerg/gis/2019/02"])
+        self.assertEqual(fileFolders[march[0]], "/data/imerg/gis/2019/03")
+        self.assertEqual(len(fileFolders), 5)
+
+        source.folders["/data/imerg/gis/2019/03"] = march
+        source.listed = []
+        fileFolders = etl.ListSourceFiles(oNow + datetime.timedelta(minutes=10), source)
+        self.assertEqual(source.listed, ["/data/imerg/gis/2019/03"])
+        self.assertEqual(sorted(fileFolders), sorted(march))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+# -------------------------------------------------------------------------------
+# Tests for the load step helpers that run without arcpy.
+# -------------------------------------------------------------------------------
+
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+
+def MakeLoadObject(fileName, productName, endDate):
+    return etl.RasterLoadObject(oFile=fileName, eDate=endDate, pName=productName)
+
+
+class SplitSupersededRastersTest(unittest.TestCase):
+
+    def test_keeps_the_newest_raster_of_each_product(self):
+        stale1Day = MakeLoadObject("stale.1day.tif", "1Day", datetime.datetime(2018, 8, 8, 23, 30))
+        today1Day = MakeLoadObject("today.1day.tif", "1Day", datetime.datetime(2018, 8, 9, 23, 30))
+        today3Day = MakeLoadObject("today.3day.tif", "3Day", datetime.datetime(2018, 8, 9, 23, 30))
+
+        latest, superseded = etl.SplitSupersededRasters([today1Day, stale1Day, today3Day])
+
+        self.assertEqual(latest, [today1Day, today3Day])
+        self.assertEqual(superseded, [stale1Day])
+
+    def test_nothing_superseded_with_one_raster_per_product(self):
+        rasters = [MakeLoadObject("a.1day.tif", "1Day", datetime.datetime(2018, 8, 9)),
+                   MakeLoadObject("a.7day.tif", "7Day", datetime.datetime(2018, 8, 9))]
+        self.assertEqual(etl.SplitSupersededRasters(rasters), (rasters, []))
+
+
+class FileDeletingStore(etl.MosaicStore):
+    # Mosaic store stand-in that only deletes files.
+
+    def deleteFile(self, rasterFile):
+        os.remove(rasterFile)
+
+
+class CollectRetiredRasterFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rasterFolder = tempfile.mkdtemp()
+        etl.myConfig = {"1DayDSName": "IMERG1Day", "3DayDSName": "IMERG3Day", "7DayDSName": "IMERG7Day"}
+        etl.productRegistry = None
+        etl.mosaicStore = FileDeletingStore()
+        for fileName in ["IMERG1Day_201808072330_20180808011502.tif", "IMERG1Day_201808082330_20180809011502.tif",
+                         "IMERG1Day_201808092330_20180810011502.tif", "IMERG3Day_201808082330_20180809011502.tif"]:
+            open(os.path.join(self.rasterFolder, fileName), "w").close()
+        # Written long before they were retired
+        for fileName in os.listdir(self.rasterFolder):
+            os.utime(os.path.join(self.rasterFolder, fileName), (0, 0))
+
+    def tearDown(self):
+        etl.myConfig = None
+        etl.productRegistry = None
+        etl.mosaicStore = None
+        shutil.rmtree(self.rasterFolder)
+
+    def collect(self, retiredRasters, oNow):
+        return etl.CollectRetiredRasterFiles(self.rasterFolder, "1Day", "IMERG1Day_201808092330_20180810011502.tif",
+                                             60, retiredRasters, oNow)
+
+    def test_files_are_kept_for_keep_minutes_after_they_are_retired(self):
+        retiredRasters = {"IMERG1Day_201808072330_20180808011502.tif": "2018-08-10T00:10:00"}
+        oNow = datetime.datetime(2018, 8, 10, 1, 15, 2)
+
+        self.assertEqual(self.collect(retiredRasters, oNow), 1)
+
+        # The file retired over an hour ago is deleted, the one retired by this run is only recorded.
+        self.assertEqual(sorted(os.listdir(self.rasterFolder)),
+                         ["IMERG1Day_201808082330_20180809011502.tif", "IMERG1Day_201808092330_20180810011502.tif",
+                          "IMERG3Day_201808082330_20180809011502.tif"])
+        self.assertEqual(retiredRasters, {"IMERG1Day_201808082330_20180809011502.tif": "2018-08-10T01:15:02"})
+
+        # Still there 59 minutes later, gone after an hour
+        self.assertEqual(self.collect(retiredRasters, oNow + datetime.timedelta(minutes=59)), 0)
+        self.assertEqual(self.collect(retiredRasters, oNow + datetime.timedelta(minutes=60)), 1)
+        self.assertEqual(retiredRasters, {})
+
+    def test_retired_rasters_file_round_trip(self):
+        stateFile = os.path.join(self.rasterFolder, "RetiredRasters.json")
+        self.assertEqual(etl.ReadRetiredRasters(stateFile), {})
+        etl.WriteRetiredRasters(stateFile, {"IMERG1Day_201808072330_20180808011502.tif": "2018-08-10T00:10:00"})
+        self.assertEqual(etl.ReadRetiredRasters(stateFile),
+                         {"IMERG1Day_201808072330_20180808011502.tif": "2018-08-10T00:10:00"})
+
+
+if __name__ == "__main__":
+    unittest.main()
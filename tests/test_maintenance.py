@@ -0,0 +1,148 @@
+# -------------------------------------------------------------------------------
+# Tests for the scheduled compaction of the mosaic store (RunScheduledCompaction and the off-peak window).
+# -------------------------------------------------------------------------------
+
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+
+class StubMosaicStore(etl.MosaicStore):
+    # A store made of named file sizes - compact() shrinks every file to its live size.
+
+    def __init__(self, fileSizes):
+        self.fileSizes = dict(fileSizes)
+        self.liveSizes = dict(fileSizes)
+        self.compactCount = 0
+
+    def write(self, fileName, nBytes):
+        # Adds nBytes of rows and deletes as many again - the file grows, but its live data stays the same.
+        self.fileSizes[fileName] = self.fileSizes.get(fileName, 0) + nBytes
+
+    def compact(self):
+        self.compactCount += 1
+        self.fileSizes = dict(self.liveSizes)
+
+    def getFileSizes(self):
+        return dict(self.fileSizes)
+
+
+class OffPeakWindowTest(unittest.TestCase):
+
+    def test_window_within_one_day(self):
+        oDay = datetime.datetime(2019, 3, 5)
+        self.assertEqual(etl.GetOffPeakWindowStart(oDay.replace(hour=2, minute=30), "01:00-03:00"),
+                         oDay.replace(hour=1))
+        self.assertEqual(etl.GetOffPeakWindowStart(oDay.replace(hour=3), "01:00-03:00"), None)
+        self.assertEqual(etl.GetOffPeakWindowStart(oDay.replace(hour=0, minute=59), "01:00-03:00"), None)
+
+    def test_window_across_midnight(self):
+        oDay = datetime.datetime(2019, 3, 5)
+        self.assertEqual(etl.GetOffPeakWindowStart(oDay.replace(hour=23, minute=30), "23:00-02:00"),
+                         oDay.replace(hour=23))
+        # After midnight the window opened the day before - including across a year end
+        self.assertEqual(etl.GetOffPeakWindowStart(oDay.replace(hour=1, minute=59), "23:00-02:00"),
+                         datetime.datetime(2019, 3, 4, 23))
+        self.assertEqual(etl.GetOffPeakWindowStart(datetime.datetime(2019, 1, 1, 0, 30), "23:00 - 02:00"),
+                         datetime.datetime(2018, 12, 31, 23))
+        self.assertEqual(etl.GetOffPeakWindowStart(oDay.replace(hour=2), "23:00-02:00"), None)
+        self.assertEqual(etl.GetOffPeakWindowStart(oDay.replace(hour=12), "23:00-02:00"), None)
+
+    def test_empty_window_never_matches(self):
+        self.assertEqual(etl.GetOffPeakWindowStart(datetime.datetime(2019, 3, 5, 1), ""), None)
+
+
+class ScheduledCompactionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+        self.stateFile = os.path.join(self.tempFolder, "IMERG_MaintenanceState.json")
+        etl.myConfig = {"logFileDir": self.tempFolder, "maintenance_StateFile": self.stateFile,
+                        "maintenance_CompactThreshold": 0.2}
+        self.store = StubMosaicStore({"a00000001.gdbtable": 600, "a00000002.gdbtable": 400})
+        etl.mosaicStore = self.store
+
+    def tearDown(self):
+        etl.myConfig = None
+        etl.mosaicStore = None
+        shutil.rmtree(self.tempFolder)
+
+    def readState(self):
+        with open(self.stateFile, "r") as inFile:
+            return json.load(inFile)
+
+    def test_first_run_records_the_store_without_compacting(self):
+        oNow = datetime.datetime(2019, 3, 5, 12)
+
+        self.assertFalse(etl.RunScheduledCompaction(oNow))
+
+        state = self.readState()
+        self.assertEqual(self.store.compactCount, 0)
+        self.assertEqual(state["lastCompact"], "2019-03-05T12:00:00")
+        self.assertEqual(state["sizeAfterCompact"], 1000)
+        self.assertEqual(state["churnBytes"], 0)
+
+    def test_compacts_when_the_churn_reaches_the_threshold(self):
+        oNow = datetime.datetime(2019, 3, 5, 12)
+        etl.RunScheduledCompaction(oNow)
+
+        self.store.write("a00000001.gdbtable", 150)
+        self.assertFalse(etl.RunScheduledCompaction(oNow + datetime.timedelta(hours=1)))
+        self.assertEqual(self.readState()["churnBytes"], 150)
+
+        # 150 + 50 bytes is 20% of the 1000 bytes after the last compact
+        self.store.write("a00000002.gdbtable", 50)
+        self.assertTrue(etl.RunScheduledCompaction(oNow + datetime.timedelta(hours=2)))
+
+        state = self.readState()
+        self.assertEqual(self.store.compactCount, 1)
+        self.assertEqual(state["lastCompact"], "2019-03-05T14:00:00")
+        self.assertEqual(state["sizeAfterCompact"], 1000)
+        self.assertEqual(state["churnBytes"], 0)
+
+    def test_compacts_once_per_off_peak_window(self):
+        etl.myConfig["maintenance_OffPeakWindow"] = "23:00-02:00"
+        etl.RunScheduledCompaction(datetime.datetime(2019, 3, 5, 12))
+
+        # Any churn at all is compacted in the window - but only on the first pass of that window
+        self.store.write("a00000001.gdbtable", 10)
+        self.assertTrue(etl.RunScheduledCompaction(datetime.datetime(2019, 3, 5, 23, 30)))
+        self.store.write("a00000001.gdbtable", 10)
+        self.assertFalse(etl.RunScheduledCompaction(datetime.datetime(2019, 3, 6, 1, 30)))
+        self.assertEqual(self.store.compactCount, 1)
+
+        # The next night's window compacts the churn left over from the last one
+        self.assertTrue(etl.RunScheduledCompaction(datetime.datetime(2019, 3, 6, 23, 0), False))
+        self.assertEqual(self.store.compactCount, 2)
+
+        # Nothing changed since then, so the window has nothing to do
+        self.assertFalse(etl.RunScheduledCompaction(datetime.datetime(2019, 3, 7, 23, 30)))
+        self.assertEqual(self.store.compactCount, 2)
+
+    def test_a_pass_that_loaded_nothing_does_not_open_the_store(self):
+        etl.RunScheduledCompaction(datetime.datetime(2019, 3, 5, 12))
+        self.store.write("a00000001.gdbtable", 10)
+        etl.RunScheduledCompaction(datetime.datetime(2019, 3, 5, 13))
+        etl.mosaicStore = None
+
+        # Outside the off-peak window, and then inside a window that has already compacted
+        self.assertFalse(etl.RunScheduledCompaction(datetime.datetime(2019, 3, 5, 14), False))
+        etl.myConfig["maintenance_OffPeakWindow"] = "11:00-15:00"
+        self.assertFalse(etl.RunScheduledCompaction(datetime.datetime(2019, 3, 5, 12, 30), False))
+        self.assertEqual(etl.mosaicStore, None)
+
+        # Once the window opens again, the churn already recorded is compacted
+        etl.mosaicStore = self.store
+        self.assertTrue(etl.RunScheduledCompaction(datetime.datetime(2019, 3, 6, 11, 0), False))
+        self.assertEqual(self.store.compactCount, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
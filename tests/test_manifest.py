@@ -0,0 +1,70 @@
+# -------------------------------------------------------------------------------
+# Tests for the download manifest and the file replace it (and the other state files) are written with.
+# -------------------------------------------------------------------------------
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+FileName = "3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.1day.tif"
+
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        etl.myConfig = {}
+        self.tempFolder = tempfile.mkdtemp()
+        self.manifestFile = os.path.join(self.tempFolder, "Manifest.json")
+
+    def tearDown(self):
+        etl.myConfig = None
+        shutil.rmtree(self.tempFolder)
+
+    def writeManifest(self, status):
+        manifest = etl.ReadDownloadManifest(self.manifestFile)
+        etl.UpdateDownloadManifest(manifest, FileName, status=status)
+        etl.WriteDownloadManifest(self.manifestFile, manifest)
+
+    def test_replace_keeps_the_previous_copy(self):
+        self.writeManifest("downloaded")
+        self.writeManifest("loaded")
+        self.assertEqual(sorted(os.listdir(self.tempFolder)), ["Manifest.json", "Manifest.json.bak"])
+        self.assertEqual(etl.ReadDownloadManifest(self.manifestFile)["Files"][FileName]["status"], "loaded")
+        self.assertEqual(etl.ReadDownloadManifest(self.manifestFile + ".bak")["Files"][FileName]["status"],
+                         "downloaded")
+
+    def test_backup_is_read_when_the_manifest_is_missing(self):
+        self.writeManifest("loaded")
+        self.writeManifest("loaded")
+        # As if the process stopped between the two renames of ReplaceFile()
+        os.remove(self.manifestFile)
+        self.assertTrue(etl.IsFileAlreadyIngested(etl.ReadDownloadManifest(self.manifestFile), FileName))
+
+    def test_backup_is_read_when_the_manifest_is_corrupt(self):
+        self.writeManifest("loaded")
+        self.writeManifest("loaded")
+        with open(self.manifestFile, "w") as mf:
+            mf.write('{"Files": {')
+        self.assertTrue(etl.IsFileAlreadyIngested(etl.ReadDownloadManifest(self.manifestFile), FileName))
+
+    def test_empty_manifest_without_a_file(self):
+        self.assertEqual(etl.ReadDownloadManifest(self.manifestFile), {"Files": {}})
+
+    def test_replace_without_backup(self):
+        targetFile = os.path.join(self.tempFolder, "IMERG1Day.tif")
+        for content in ["old", "new"]:
+            with open(targetFile + ".part", "w") as f:
+                f.write(content)
+            etl.FinalizePartFile(targetFile + ".part", targetFile)
+        self.assertEqual(os.listdir(self.tempFolder), ["IMERG1Day.tif"])
+        with open(targetFile) as f:
+            self.assertEqual(f.read(), "new")
+
+
+if __name__ == "__main__":
+    unittest.main()
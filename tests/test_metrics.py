@@ -0,0 +1,102 @@
+# -------------------------------------------------------------------------------
+# Tests for the Prometheus textfile written with the run metrics (WritePrometheusMetrics).
+# -------------------------------------------------------------------------------
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+# The Prometheus text format, as read by the node_exporter textfile collector
+MetricNamePattern = r"[a-zA-Z_:][a-zA-Z0-9_:]*"
+CommentPattern = re.compile(r"^# (HELP|TYPE) ({0}) (.*)$".format(MetricNamePattern))
+SamplePattern = re.compile(r"^({0})(?:\{{(.*)\}})? (\S+)$".format(MetricNamePattern))
+LabelPattern = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\\n]|\\[\\"n])*)"(?:,|$)')
+ValuePattern = re.compile(r"^(NaN|[+-]Inf|[-+]?[0-9.]+(?:e[-+]?[0-9]+)?)$")
+
+
+def ParsePrometheusFile(promFile):
+    """
+        Parses a Prometheus textfile strictly - raises ValueError on any line that doesn't follow the text format.
+        Returns (help texts, samples): metric name -> help text, and a list of (metric name, labels, value).
+    """
+    helpTexts = {}
+    samples = []
+    with open(promFile, "r") as inFile:
+        for line in inFile.read().splitlines():
+            comment = CommentPattern.match(line)
+            if comment is not None:
+                if comment.group(1) == "HELP":
+                    helpTexts[comment.group(2)] = comment.group(3).replace("\\n", "\n").replace("\\\\", "\\")
+                continue
+            sample = SamplePattern.match(line)
+            if sample is None or ValuePattern.match(sample.group(3)) is None:
+                raise ValueError("Not a Prometheus sample line: " + line)
+            labels = {}
+            labelText = sample.group(2) or ""
+            position = 0
+            while position < len(labelText):
+                label = LabelPattern.match(labelText, position)
+                if label is None:
+                    raise ValueError("Bad labels in line: " + line)
+                labels[label.group(1)] = re.sub(r"\\(.)", lambda m: "\n" if m.group(1) == "n" else m.group(1),
+                                                label.group(2))
+                position = label.end()
+            samples.append((sample.group(1), labels, float(sample.group(3))))
+    return helpTexts, samples
+
+
+class PrometheusMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+        self.promFile = os.path.join(self.tempFolder, "imerg_etl.prom")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempFolder)
+
+    def test_written_file_parses(self):
+        metrics = etl.RunMetrics('back"fill\\')
+        metrics.addStageTime("download", 12.5)
+        metrics.addStageTime("transform\nmask", 3.0)
+        metrics.addFileTime("download", "IMERG1Day.tif", 4.0)
+        metrics.addFileTime("download", "IMERG3Day.tif", 6.0)
+        metrics.increment("rasters_loaded", 3)
+        metrics.increment("download-bytes/1day", 2048)
+        metrics.increment("3day.pixels masked", 7)
+        metrics.increment("empty_ratio", float("nan"))
+
+        etl.WritePrometheusMetrics(self.promFile, metrics.toDict(True))
+        helpTexts, samples = ParsePrometheusFile(self.promFile)
+
+        values = dict(((name, tuple(sorted(labels.items()))), value) for name, labels, value in samples)
+        self.assertEqual(values[("imerg_etl_run_success", (("mode", 'back"fill\\'),))], 1)
+        self.assertEqual(values[("imerg_etl_stage_duration_seconds", (("stage", "transform\nmask"),))], 3.0)
+        self.assertEqual(values[("imerg_etl_files", (("stage", "download"),))], 2)
+        self.assertEqual(values[("imerg_etl_file_duration_seconds_max", (("stage", "download"),))], 6.0)
+        self.assertEqual(values[("imerg_etl_rasters_loaded", ())], 3)
+        self.assertEqual(values[("imerg_etl_download_bytes_1day", ())], 2048)
+        self.assertEqual(values[("imerg_etl_3day_pixels_masked", ())], 7)
+        self.assertNotEqual(values[("imerg_etl_empty_ratio", ())], values[("imerg_etl_empty_ratio", ())])
+        self.assertEqual(helpTexts["imerg_etl_download_bytes_1day"], "download-bytes/1day in the last run.")
+        # The download rate is added from the download stage time
+        self.assertEqual(values[("imerg_etl_download_bytes_per_second", ())], 0)
+
+    def test_names_are_made_valid(self):
+        self.assertEqual(etl.GetPrometheusName("imerg_etl_download:rate"), "imerg_etl_download:rate")
+        self.assertEqual(etl.GetPrometheusName("1day bytes"), "_1day_bytes")
+        self.assertEqual(etl.GetPrometheusName("stage:name", True), "stage_name")
+        self.assertEqual(etl.GetPrometheusName(""), "_")
+
+    def test_special_values(self):
+        self.assertEqual([etl.FormatPrometheusValue(v) for v in [float("inf"), float("-inf"), 2]],
+                         ["+Inf", "-Inf", "2.0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# -------------------------------------------------------------------------------
+# Tests for the batched mosaic attribute updates (MosaicAttributeWriter with the SQLiteUpdateCursor backend).
+# -------------------------------------------------------------------------------
+
+import datetime
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+
+class CountingUpdateCursor(etl.SQLiteUpdateCursor):
+    # Records every cursor opened, as (targetDataset, whereClause).
+    opened = []
+
+    def __init__(self, targetDataset, fieldNames, whereClause=None):
+        CountingUpdateCursor.opened.append((targetDataset, whereClause))
+        etl.SQLiteUpdateCursor.__init__(self, targetDataset, fieldNames, whereClause)
+
+
+class MosaicAttributeWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+        self.dbFile = os.path.join(self.tempFolder, "Mosaics.sqlite")
+        connection = sqlite3.connect(self.dbFile)
+        for tableName, rasterNames in [("IMERG1Day", ["IMERG1Day", "IMERG1Day_old", "Other"]),
+                                       ("IMERG3Day", ["IMERG3Day"])]:
+            connection.execute("CREATE TABLE {0} (Name TEXT, start_datetime TEXT, end_datetime TEXT)".format(tableName))
+            connection.executemany("INSERT INTO {0} (Name) VALUES (?)".format(tableName), [(n,) for n in rasterNames])
+        connection.commit()
+        connection.close()
+        CountingUpdateCursor.opened = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tempFolder)
+
+    def readRows(self, tableName):
+        connection = sqlite3.connect(self.dbFile)
+        try:
+            return dict((row[0], list(row[1:])) for row in connection.execute(
+                "SELECT Name, start_datetime, end_datetime FROM {0}".format(tableName)))
+        finally:
+            connection.close()
+
+    def test_sets_every_raster_with_one_cursor_per_mosaic(self):
+        dataset1Day = os.path.join(self.dbFile, "IMERG1Day")
+        dataset3Day = os.path.join(self.dbFile, "IMERG3Day")
+        oEnd = datetime.datetime(2018, 8, 9, 23, 30)
+        writer = etl.MosaicAttributeWriter(["start_datetime", "end_datetime"], CountingUpdateCursor)
+        writer.add(dataset1Day, "IMERG1Day", [oEnd - datetime.timedelta(days=1), oEnd])
+        writer.add(dataset1Day, "IMERG1Day_old", [oEnd - datetime.timedelta(days=2), oEnd - datetime.timedelta(days=1)])
+        writer.add(dataset3Day, "IMERG3Day", [oEnd - datetime.timedelta(days=3), oEnd])
+        writer.add(dataset3Day, "Missing", [oEnd, oEnd])
+
+        updatedRasters = writer.apply()
+
+        self.assertEqual(updatedRasters, set([(dataset1Day, "IMERG1Day"), (dataset1Day, "IMERG1Day_old"),
+                                              (dataset3Day, "IMERG3Day")]))
+        self.assertEqual(sorted(d for d, w in CountingUpdateCursor.opened), [dataset1Day, dataset3Day])
+        self.assertEqual(self.readRows("IMERG1Day"),
+                         {"IMERG1Day": ["2018-08-08 23:30:00", "2018-08-09 23:30:00"],
+                          "IMERG1Day_old": ["2018-08-07 23:30:00", "2018-08-08 23:30:00"],
+                          "Other": [None, None]})
+        self.assertEqual(self.readRows("IMERG3Day"), {"IMERG3Day": ["2018-08-06 23:30:00", "2018-08-09 23:30:00"]})
+        # Nothing is left pending
+        self.assertEqual(writer.apply(), set())
+        self.assertEqual(len(CountingUpdateCursor.opened), 2)
+
+    def test_failed_mosaic_does_not_stop_the_others(self):
+        writer = etl.MosaicAttributeWriter(["start_datetime", "end_datetime"], CountingUpdateCursor)
+        writer.add(os.path.join(self.dbFile, "NoSuchMosaic"), "IMERG7Day", ["a", "b"])
+        writer.add(os.path.join(self.dbFile, "IMERG3Day"), "IMERG3Day", ["c", "d"])
+
+        self.assertEqual(writer.apply(), set([(os.path.join(self.dbFile, "IMERG3Day"), "IMERG3Day")]))
+        self.assertEqual(self.readRows("IMERG3Day"), {"IMERG3Day": ["c", "d"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# -------------------------------------------------------------------------------
+# Tests for the accumulation product registry built from the config settings.
+# -------------------------------------------------------------------------------
+
+import datetime
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+
+class ProductRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        etl.myConfig = {"1DayDSName": "IMERG1Day", "3DayDSName": "IMERG3Day", "7DayDSName": "IMERG7Day"}
+        etl.productRegistry = None
+
+    def tearDown(self):
+        etl.myConfig = None
+        etl.productRegistry = None
+
+    def test_additional_products_are_registered_by_period(self):
+        etl.myConfig["products_Additional"] = [
+            {"name": "10Day", "period": "10day", "days": 10, "dsName": "IMERG10Day", "svcName": "IMERG_Acc_10Day"},
+            {"name": "6Hour", "period": "6hr", "minutes": 360, "dsName": "IMERG6Hour"}]
+
+        registry = etl.GetProductRegistry()
+
+        self.assertEqual([p.name for p in registry.products], ["6Hour", "1Day", "3Day", "7Day", "10Day"])
+        self.assertEqual(registry.byPeriod("10day").accumulationPeriod, datetime.timedelta(days=10))
+        self.assertEqual(registry.byName("10Day").loadFile(), "IMERG10Day.tif")
+        parsed = etl.ParseIMERGFilename("3B-HHR-L.MS.MRG.3IMERG.20180809-S233000-E235959.1410.V05B.6hr.tif")
+        self.assertEqual(parsed.product, "6Hour")
+
+    def test_calendar_month_periods_are_rejected(self):
+        etl.myConfig["products_Additional"] = [
+            {"name": "1Month", "period": "1month", "months": 1, "dsName": "IMERG1Month"},
+            {"name": "NoPeriod", "period": "x", "dsName": "IMERGX"}]
+
+        registry = etl.GetProductRegistry()
+
+        self.assertEqual([p.name for p in registry.products], ["1Day", "3Day", "7Day"])
+        self.assertEqual(registry.byPeriod("1month"), None)
+
+    def test_backfill_needs_its_own_mosaic_datasets(self):
+        etl.myConfig.update({"backfill_1DayDSName": "IMERG1Day_Archive", "backfill_3DayDSName": "imerg7day"})
+
+        errors = etl.GetBackfillDatasetErrors(etl.GetProductRegistry())
+
+        self.assertEqual(len(errors), 2)
+        self.assertIn("3Day product (imerg7day) is a live mosaic dataset", errors[0])
+        self.assertIn("'backfill_7DayDSName'", errors[1])
+        self.assertEqual(etl.ProcessBackfill(datetime.datetime(2019, 1, 1), datetime.datetime(2019, 1, 2)), None)
+
+        etl.myConfig.update({"backfill_3DayDSName": "IMERG3Day_Archive", "backfill_7DayDSName": "IMERG7Day_Archive"})
+        etl.productRegistry = None
+        self.assertEqual(etl.GetBackfillDatasetErrors(etl.GetProductRegistry()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
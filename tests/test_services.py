@@ -0,0 +1,129 @@
+# -------------------------------------------------------------------------------
+# Tests for RefreshServices() against a stand-in ArcGIS admin server (parallel stop/start, status polling, the
+# status timeout, and a server that can't hand out a token).
+# -------------------------------------------------------------------------------
+
+import BaseHTTPServer
+import SocketServer
+import json
+import os
+import sys
+import threading
+import unittest
+import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+
+class StubAdminServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+        Answers generateToken, and the stop, start, and status operations of the services under /arcgis/admin.
+        Services named in neverStarts stay STOPPED, and every request under /broken/admin fails.
+    """
+    daemon_threads = True
+
+    def __init__(self, neverStarts):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), StubAdminHandler)
+        self.neverStarts = neverStarts
+        self.states = {}
+        self.requests = []
+        self.lock = threading.Lock()
+
+
+class StubAdminHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def sendJSON(self, code, response):
+        body = json.dumps(response)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        params = urlparse.parse_qs(self.rfile.read(int(self.headers.getheader("Content-Length", 0))))
+        path = urlparse.urlsplit(self.path).path
+        with self.server.lock:
+            self.server.requests.append(path)
+        if path.startswith("/broken/"):
+            self.sendJSON(500, {"status": "error"})
+        elif path.endswith("/generateToken"):
+            self.sendJSON(200, {"token": "stub-token"})
+        elif params.get("token") != ["stub-token"]:
+            self.sendJSON(200, {"status": "error", "code": 498})
+        else:
+            svcPath, operation = path.rsplit("/", 1)
+            svcName = svcPath.rsplit("/", 1)[1].split(".")[0]
+            with self.server.lock:
+                if operation == "stop":
+                    self.server.states[svcName] = "STOPPED"
+                elif operation == "start" and svcName not in self.server.neverStarts:
+                    self.server.states[svcName] = "STARTED"
+                state = self.server.states.get(svcName, "STOPPED")
+            if operation == "status":
+                self.sendJSON(200, {"realTimeState": state})
+            else:
+                self.sendJSON(200, {"status": "success"})
+
+
+class RefreshServicesTest(unittest.TestCase):
+
+    def setUp(self):
+        etl.myConfig = {"svc_MaxConcurrent": 4, "svc_StatusTimeoutSeconds": 1, "svc_StatusPollSeconds": 0.05}
+        etl.httpTransport = None
+        etl.adminTokenCache.clear()
+        self.server = StubAdminServer(["IMERG7Day"])
+        self.serverThread = threading.Thread(target=self.server.serve_forever)
+        self.serverThread.daemon = True
+        self.serverThread.start()
+        self.baseURL = "http://127.0.0.1:{0}".format(self.server.server_address[1])
+
+    def tearDown(self):
+        etl.CloseTransportSessions()
+        etl.httpTransport = None
+        etl.myConfig = None
+        self.server.shutdown()
+        self.server.server_close()
+
+    def buildService(self, svcName, adminPath="/arcgis/admin"):
+        return etl.MapService(self.baseURL + adminPath, "admin", "secret", "Test", svcName, "ImageServer")
+
+    def requestCount(self, suffix):
+        return len([p for p in self.server.requests if p.endswith(suffix)])
+
+    def test_restarts_every_service_with_one_token(self):
+        serviceList = [self.buildService("IMERG1Day"), self.buildService("IMERG3Day")]
+
+        serviceStarted = etl.RefreshServices(serviceList)
+
+        self.assertEqual(serviceStarted, {"IMERG1Day": True, "IMERG3Day": True})
+        self.assertEqual(self.requestCount("/generateToken"), 1)
+        self.assertEqual(self.requestCount("/stop"), 2)
+        self.assertEqual(self.requestCount("/start"), 2)
+        self.assertEqual(self.server.states, {"IMERG1Day": "STARTED", "IMERG3Day": "STARTED"})
+
+    def test_service_that_never_starts_times_out(self):
+        serviceList = [self.buildService("IMERG1Day"), self.buildService("IMERG7Day")]
+
+        serviceStarted = etl.RefreshServices(serviceList)
+
+        self.assertEqual(serviceStarted, {"IMERG1Day": True, "IMERG7Day": False})
+        # The 7 Day status was polled until the timeout, the 1 Day one only until it started.
+        self.assertTrue(len([p for p in self.server.requests if p.endswith("IMERG7Day.ImageServer/status")]) > 1)
+
+    def test_token_failure_only_skips_its_own_service(self):
+        serviceList = [self.buildService("IMERGAll", "/broken/admin"), self.buildService("IMERG1Day")]
+
+        serviceStarted = etl.RefreshServices(serviceList)
+
+        self.assertEqual(serviceStarted, {"IMERGAll": False, "IMERG1Day": True})
+        self.assertEqual([p for p in self.server.requests if p.startswith("/broken/")], ["/broken/admin/generateToken"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+# -------------------------------------------------------------------------------
+# Tests for the 'numpy' raster transform engine (masking, NoData handling, and output data type).
+# The window tests only need numpy; the GeoTIFF round trip is skipped when GDAL is not installed.
+# Run from the repository folder:  python -m unittest discover -s tests
+# -------------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import IMERG_Accumulations_ETL as etl
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+
+class FakeBand(object):
+    # Stands in for a GDAL band - just enough for GenerateRasterWindows() and ReadRasterWindows().
+
+    def __init__(self, data, blockSize):
+        self.data = data
+        self.blockSize = blockSize
+
+    def GetBlockSize(self):
+        return list(self.blockSize)
+
+    def ReadAsArray(self, xOff, yOff, numCols, numRows):
+        return self.data[yOff:yOff + numRows, xOff:xOff + numCols].copy()
+
+
+class MaskRasterWindowsTest(unittest.TestCase):
+
+    def setUp(self):
+        etl.numpy = numpy
+
+    def maskAll(self, data, minValue, maxValue, noData, maxWindowPixels=16, blockSize=(4, 2)):
+        band = FakeBand(data, blockSize)
+        windows = etl.GenerateRasterWindows(band, data.shape[1], data.shape[0], maxWindowPixels)
+        result = numpy.empty_like(data)
+        for window, masked in etl.MaskRasterWindows(etl.ReadRasterWindows(band, windows), minValue, maxValue, noData):
+            xOff, yOff, numCols, numRows = window
+            self.assertEqual(masked.dtype, data.dtype)
+            result[yOff:yOff + numRows, xOff:xOff + numCols] = masked
+        return result
+
+    def test_keeps_only_values_strictly_between_min_and_max(self):
+        data = numpy.array([[-5, 0, 1, 2],
+                            [29998, 29999, 30000, 7]], numpy.int16)
+        result = self.maskAll(data, 0, 29999, 29999.0)
+        expected = numpy.array([[29999, 29999, 1, 2],
+                                [29998, 29999, 29999, 7]], numpy.int16)
+        numpy.testing.assert_array_equal(result, expected)
+
+    def test_nodata_pixels_stay_nodata(self):
+        data = numpy.full((6, 10), -9999, numpy.int16)
+        data[2:4, 3:7] = 12
+        result = self.maskAll(data, 0, 29999, -9999.0)
+        numpy.testing.assert_array_equal(result, data)
+
+    def test_float_rasters_keep_their_data_type(self):
+        data = numpy.array([[0.0, 0.25, 29999.0], [3.5, -1.0, 29998.75]], numpy.float32)
+        result = self.maskAll(data, 0, 29999, 29999.0)
+        self.assertEqual(result.dtype, numpy.float32)
+        numpy.testing.assert_array_equal(result, numpy.array([[29999.0, 0.25, 29999.0], [3.5, 29999.0, 29998.75]],
+                                                             numpy.float32))
+
+    def test_windows_cover_the_raster_once(self):
+        data = numpy.arange(11 * 9, dtype=numpy.int16).reshape(9, 11)
+        for maxWindowPixels in [1, 8, 30, 1000]:
+            coverage = numpy.zeros(data.shape, numpy.int32)
+            for xOff, yOff, numCols, numRows in etl.GenerateRasterWindows(FakeBand(data, (4, 2)), 11, 9,
+                                                                          maxWindowPixels):
+                coverage[yOff:yOff + numRows, xOff:xOff + numCols] += 1
+            numpy.testing.assert_array_equal(coverage, numpy.ones(data.shape, numpy.int32))
+
+
+class RasterBandStatisticsTest(unittest.TestCase):
+
+    def setUp(self):
+        etl.numpy = numpy
+
+    def test_window_by_window_statistics_match_numpy(self):
+        randomState = numpy.random.RandomState(42)
+        data = randomState.randint(-100, 30100, size=(37, 53)).astype(numpy.int16)
+        data[:5, :] = 0
+        bandStats = etl.RasterBandStatistics(0, 29999, 64)
+        band = FakeBand(data.copy(), (16, 4))
+        windows = etl.GenerateRasterWindows(band, 53, 37, 200)
+        for window, masked in etl.MaskRasterWindows(etl.ReadRasterWindows(band, windows), 0, 29999, 29999.0,
+                                                    bandStats):
+            pass
+
+        valid = data[(data > 0) & (data < 29999)].astype(numpy.float64)
+        self.assertEqual(bandStats.validCount, valid.size)
+        self.assertEqual(bandStats.totalCount, data.size)
+        self.assertEqual(bandStats.minimum, valid.min())
+        self.assertEqual(bandStats.maximum, valid.max())
+        self.assertAlmostEqual(bandStats.mean, numpy.mean(valid), places=6)
+        self.assertAlmostEqual(bandStats.stdDev(), numpy.std(valid), places=6)
+        numpy.testing.assert_array_equal(bandStats.histogram, numpy.histogram(valid, bins=64, range=(0, 29999))[0])
+
+        statsDict = json.loads(json.dumps(bandStats.toDict()))
+        self.assertEqual(sum(statsDict["histogram"]["buckets"]), valid.size)
+        self.assertAlmostEqual(statsDict["validPercent"], 100.0 * valid.size / data.size)
+
+    def test_no_valid_pixels(self):
+        bandStats = etl.RasterBandStatistics(0, 29999, 8)
+        bandStats.update(numpy.array([], numpy.int16), 100)
+        self.assertEqual(bandStats.toDict()["validCount"], 0)
+        self.assertEqual(bandStats.stdDev(), 0.0)
+
+
+@unittest.skipIf(gdal is not None, "GDAL is installed")
+class EngineFallbackTest(unittest.TestCase):
+
+    def setUp(self):
+        etl.myConfig = {"transform_Engine": "numpy", "transform_OutputFormat": "cog"}
+        etl.bEngineFallbackLogged = False
+
+    def tearDown(self):
+        etl.myConfig = None
+
+    def test_fallback_is_logged_once_with_the_missing_module(self):
+        logged = []
+        originalWarning = etl.logging.warning
+        etl.logging.warning = logged.append
+        try:
+            self.assertEqual(etl.GetRasterTransformEngineName(), "arcpy")
+            self.assertEqual(etl.GetRasterTransformEngineName(), "arcpy")
+        finally:
+            etl.logging.warning = originalWarning
+        self.assertEqual(len(logged), 1)
+        self.assertTrue("osgeo" in logged[0] and "'cog'" in logged[0])
+
+
+@unittest.skipIf(gdal is None, "GDAL is not installed")
+class TransformRasterNumPyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempFolder = tempfile.mkdtemp()
+        etl.myConfig = {"transform_OutputFormat": "gtiff", "transform_HistogramBuckets": 16}
+
+    def tearDown(self):
+        etl.myConfig = None
+        shutil.rmtree(self.tempFolder)
+
+    def writeSourceRaster(self, data, noData):
+        inFile = os.path.join(self.tempFolder, "source.tif")
+        ds = gdal.GetDriverByName("GTiff").Create(inFile, data.shape[1], data.shape[0], 1, gdal.GDT_Int16)
+        ds.SetGeoTransform((-180.0, 0.1, 0.0, 90.0, 0.0, -0.1))
+        ds.GetRasterBand(1).SetNoDataValue(noData)
+        ds.GetRasterBand(1).WriteArray(data)
+        ds = None
+        return inFile
+
+    def test_masks_a_geotiff(self):
+        data = numpy.array([[0, 1, 29998, 29999],
+                            [30000, -1, 500, 29999]], numpy.int16)
+        inFile = self.writeSourceRaster(data, 29999)
+        outFile = os.path.join(self.tempFolder, "IMERG1Day.tif")
+
+        rasterStats = etl.TransformRaster_NumPy(inFile, outFile, 0, 29999, 1)
+
+        ds = gdal.Open(outFile)
+        band = ds.GetRasterBand(1)
+        self.assertEqual(band.DataType, gdal.GDT_Int16)
+        self.assertEqual(band.GetNoDataValue(), 29999)
+        self.assertEqual(ds.GetGeoTransform(), (-180.0, 0.1, 0.0, 90.0, 0.0, -0.1))
+        numpy.testing.assert_array_equal(band.ReadAsArray(), numpy.array([[29999, 1, 29998, 29999],
+                                                                          [29999, 29999, 500, 29999]]))
+        ds = None
+        self.assertEqual(rasterStats[0]["validCount"], 3)
+        self.assertEqual(rasterStats[0]["totalCount"], 8)
+
+
+if __name__ == "__main__":
+    unittest.main()